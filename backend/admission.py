@@ -0,0 +1,127 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+# Weight of the latest call in the moving average of slot hold times
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class AdmissionRejected(HTTPException):
+    """
+    Raised instead of queueing a call that could not start in time; carries a `Retry-After` header.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Cap the concurrent calls to a slow backend and shed the excess early.
+
+    At most `max_concurrency` callers hold a slot; up to `max_queue` more wait for
+    one, each for at most `queue_timeout_seconds`. A caller arriving to a full
+    queue is rejected at once with 429, and one whose expected wait (queue depth
+    times the average slot hold time) already exceeds the deadline with 503, so
+    admitted calls keep a bounded latency instead of everyone timing out.
+
+    Examples:
+        >>> controller = AdmissionController(max_concurrency=2, max_queue=4, queue_timeout_seconds=5)
+        >>> async def call():
+        ...     async with controller.slot():
+        ...         return "done"
+        >>> asyncio.run(call())
+        'done'
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32, queue_timeout_seconds: float = 10):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._service_time = None  # Moving average of slot hold times, in seconds
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+
+    def expected_wait(self):
+        """
+        Seconds until the next caller would get a slot, from the queue depth and average hold time.
+        """
+        queued = self.active + self.waiting - self.max_concurrency
+        if self._service_time is None or queued < 0:
+            return 0.0
+        return (queued // self.max_concurrency + 1) * self._service_time
+
+    def retry_after(self) -> int:
+        """
+        Whole seconds a rejected caller should wait before trying again.
+        """
+        return max(1, math.ceil(self.expected_wait()))
+
+    def _reject(self, status_code: int, detail: str):
+        return AdmissionRejected(status_code, detail, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the `max_concurrency` slots for the duration of the block.
+
+        Raises:
+            AdmissionRejected: 429 if the queue is full, 503 if no slot frees up before the deadline
+        """
+        # Callers still acquiring count as waiting, so a burst within one event loop tick is bounded too
+        if self.active + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected_queue_full += 1
+            raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many analyses queued, retry later")
+        if self.expected_wait() > self.queue_timeout_seconds:
+            self.rejected_deadline += 1
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Analysis capacity exhausted, retry later")
+
+        self.waiting += 1
+        try:
+            if self._semaphore.locked():
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout_seconds)
+            else:
+                await self._semaphore.acquire()  # Returns at once; skips the task wait_for would create
+        except asyncio.TimeoutError:
+            self.rejected_deadline += 1
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Analysis capacity exhausted, retry later")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            elapsed = time.monotonic() - start_time
+            if self._service_time is None:
+                self._service_time = elapsed
+            else:
+                self._service_time += SERVICE_TIME_SMOOTHING * (elapsed - self._service_time)
+
+    def stats(self):
+        """
+        Slot usage, queue depth and rejection counters, for monitoring.
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout_seconds,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "average_service_seconds": self._service_time
+        }
@@ -0,0 +1,477 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from amenity_store import AmenityStore, offset_dtype
+from geo import PointArray, bounding_box, nearest, ring_index
+
+# The nine amenity collections, in the order they are returned by the API
+AMENITY_TYPES = (
+    'parks',
+    'public_art',
+    'community_centers',
+    'libraries',
+    'cultural_spaces',
+    'public_washrooms',
+    'rapid_transit_stations',
+    'schools',
+    'fire_halls',
+)
+
+# Outer radii of the distance rings reported by impact analysis, in kilometers
+AMENITY_RING_RADII_KM = (0.25, 0.5, 1.0, 2.0)
+
+# ~1.1 km of latitude per cell, which keeps a 1-2 km radius query to a few dozen cells
+DEFAULT_CELL_SIZE_DEG = 0.01
+
+# Site x amenity distances computed at once by `AmenityIndex.query_batch`; 8 MB per float64
+# matrix, of which the pass holds a few temporaries
+BATCH_MATRIX_ELEMENTS = 1 << 20
+
+# Written by `AmenityIndex.save` next to the amenity_*.npy arrays
+INDEX_METADATA_FILE = "amenity_index.json"
+
+
+def _load_array(directory, name):
+    return np.load(os.path.join(directory, f"amenity_{name}.npy"), mmap_mode="r")
+
+
+def ring_statistics(types, type_codes, distances, ring_radii_km, k=None, documents_for=None):
+    """
+    Bucket amenities into concentric distance rings and summarize each ring.
+
+    Distances are computed once, by the caller, out to the outer radius; every
+    amenity is then assigned to its ring in one vectorized pass.
+
+    Args:
+        types: Amenity type names, indexed by type code
+        type_codes: Type code of each amenity
+        distances: Distance in km of each amenity, all within the last radius
+        ring_radii_km: Ascending outer radii of the rings
+        k: Nearest amenities listed per ring, across types (None for all of them)
+        documents_for: Function returning new documents for a list of positions into `distances`
+
+    Returns:
+        list: One dict per ring with `min_distance_km`, `max_distance_km`, `total_count`,
+            `cumulative_count` (within `max_distance_km`), `count_by_type` and the `nearest`
+            amenities with `distance_km` and `amenity_type` set, nearest first
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    type_codes = np.asarray(type_codes, dtype=np.int64)
+    # Radius checks and `searchsorted` may disagree in the last bit; such amenities stay in the outer ring
+    rings = np.minimum(ring_index(distances, ring_radii_km), len(ring_radii_km) - 1)
+    counts = np.bincount(
+        rings * len(types) + type_codes, minlength=len(ring_radii_km) * len(types)
+    ).reshape(len(ring_radii_km), len(types))
+
+    selected = [
+        members[nearest(distances[members], k)]
+        for members in (np.flatnonzero(rings == ring) for ring in range(len(ring_radii_km)))
+    ]
+    positions = np.concatenate(selected).tolist()
+    documents = iter(documents_for(positions))
+
+    results = []
+    cumulative_count = 0
+    min_distance_km = 0.0
+    for max_distance_km, ring_counts, members in zip(ring_radii_km, counts.tolist(), selected):
+        nearest_amenities = []
+        for position in members.tolist():
+            amenity = next(documents)
+            amenity["distance_km"] = round(float(distances[position]), 3)
+            amenity["amenity_type"] = types[type_codes[position]]
+            nearest_amenities.append(amenity)
+        cumulative_count += sum(ring_counts)
+        results.append({
+            "min_distance_km": min_distance_km,
+            "max_distance_km": max_distance_km,
+            "total_count": sum(ring_counts),
+            "cumulative_count": cumulative_count,
+            "count_by_type": dict(zip(types, ring_counts)),
+            "nearest": nearest_amenities,
+        })
+        min_distance_km = max_distance_km
+    return results
+
+
+class AmenityIndex:
+    """
+    In-memory uniform grid over every amenity's lon/lat.
+
+    The index is built once from the amenity collections. Amenities are kept in a
+    columnar AmenityStore ordered by grid cell, so a radius query only gathers the
+    array ranges of the cells overlapping the query circle and measures them in one
+    vectorized pass instead of scanning the whole city; documents are only built
+    for the amenities a query returns.
+
+    An index can be saved to a directory and loaded back memory-mapped (see
+    snapshot.py), so several worker processes share one copy of its arrays through
+    the page cache.
+    """
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG):
+        self.cell_size_deg = cell_size_deg
+        self._cell_ranges = {}
+        self._store = AmenityStore.from_documents([], [], AMENITY_TYPES)
+        # Store positions in listing order (type by type, as read from Mongo), and the length of each type's run
+        self._listing_order = np.empty(0, dtype=np.int64)
+        self._type_counts = [0] * len(AMENITY_TYPES)
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def store(self) -> AmenityStore:
+        return self._store
+
+    def _cell_for(self, longitude, latitude):
+        return (
+            math.floor(longitude / self.cell_size_deg),
+            math.floor(latitude / self.cell_size_deg),
+        )
+
+    def build(self, amenities_by_type: dict):
+        """
+        Build the grid from raw amenity documents.
+
+        The documents are encoded into the index's store and not kept.
+
+        Args:
+            amenities_by_type: Dictionary mapping amenity type to an iterable of MongoDB documents
+
+        Returns:
+            AmenityIndex: The index itself, for chaining
+        """
+        amenities = {amenity_type: [] for amenity_type in AMENITY_TYPES}
+        for amenity_type, documents in amenities_by_type.items():
+            amenities.setdefault(amenity_type, []).extend(documents)
+
+        types = tuple(amenities)
+        documents = [amenity for amenity_list in amenities.values() for amenity in amenity_list]
+        type_counts = [len(amenity_list) for amenity_list in amenities.values()]
+        type_codes = np.repeat(np.arange(len(types), dtype=np.int8), type_counts)
+        points = PointArray.from_documents(documents, precompute=False)
+        lons, lats = points.lons, points.lats
+
+        # Amenities without coordinates are listed but never returned by radius queries
+        has_coordinates = ~np.isnan(lons) & ~np.isnan(lats)
+        located = np.flatnonzero(has_coordinates)
+        cell_x = np.floor(lons[located] / self.cell_size_deg).astype(np.int64)
+        cell_y = np.floor(lats[located] / self.cell_size_deg).astype(np.int64)
+
+        # Order points by cell so every cell is one contiguous slice of the arrays;
+        # amenities without coordinates follow the last cell
+        by_cell = np.lexsort((cell_y, cell_x))
+        order = np.concatenate((located[by_cell], np.flatnonzero(~has_coordinates)))
+        cell_x = cell_x[by_cell]
+        cell_y = cell_y[by_cell]
+
+        cell_ranges = {}
+        if len(located):
+            boundaries = np.flatnonzero((np.diff(cell_x) != 0) | (np.diff(cell_y) != 0)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(located)]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                cell_ranges[(int(cell_x[start]), int(cell_y[start]))] = (start, end)
+
+        listing_order = np.empty(len(order), dtype=offset_dtype(len(order)))
+        listing_order[order] = np.arange(len(order))
+
+        self._cell_ranges = cell_ranges
+        self._store = AmenityStore.from_documents(
+            [documents[position] for position in order.tolist()], type_codes[order], types, points.take(order)
+        )
+        self._listing_order = listing_order
+        self._type_counts = type_counts
+
+        return self
+
+    def save(self, directory: str):
+        """
+        Write the index to `directory` as amenity_*.npy arrays plus one buffer of JSON values, for `load`.
+        """
+        cells = np.array(
+            [(x, y, start, end) for (x, y), (start, end) in self._cell_ranges.items()], dtype=np.int64
+        ).reshape(-1, 4)
+        np.save(os.path.join(directory, "amenity_cells.npy"), cells)
+        np.save(os.path.join(directory, "amenity_listing_order.npy"), np.ascontiguousarray(self._listing_order))
+
+        with open(os.path.join(directory, INDEX_METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "cell_size_deg": self.cell_size_deg,
+                "type_counts": list(self._type_counts),
+                "store": self._store.save(directory, "amenity"),
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str):
+        """
+        Attach to an index written by `save`, memory-mapping its arrays and values read-only.
+
+        Returns:
+            AmenityIndex: The loaded index
+        """
+        with open(os.path.join(directory, INDEX_METADATA_FILE), encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        index = cls(metadata["cell_size_deg"])
+        index._cell_ranges = {
+            (x, y): (start, end) for x, y, start, end in _load_array(directory, "cells").tolist()
+        }
+        index._store = AmenityStore.load(directory, "amenity", metadata["store"])
+        index._listing_order = _load_array(directory, "listing_order")
+        index._type_counts = metadata["type_counts"]
+        return index
+
+    def all_amenities(self, limit_per_type: int = None):
+        """
+        Return every indexed amenity grouped by type, in the order they were read.
+
+        Args:
+            limit_per_type: Keep only the first `limit_per_type` amenities of each type (optional)
+
+        Returns:
+            dict: Newly built documents grouped by type
+        """
+        amenities = {}
+        start = 0
+        for amenity_type, count in zip(self._store.types, self._type_counts):
+            positions = self._listing_order[start:start + min(count, limit_per_type or count)]
+            amenities[amenity_type] = self._store.documents(positions.tolist())
+            start += count
+        return amenities
+
+    def _candidates(self, min_lon, min_lat, max_lon, max_lat):
+        """
+        Array positions of every amenity in the grid cells overlapping a lon/lat box.
+        """
+        min_x, min_y = self._cell_for(min_lon, min_lat)
+        max_x, max_y = self._cell_for(max_lon, max_lat)
+
+        ranges = []
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self._cell_ranges):
+            # The query covers more cells than exist; walking the occupied ones is cheaper
+            for (x, y), cell_range in self._cell_ranges.items():
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    ranges.append(cell_range)
+        else:
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    cell_range = self._cell_ranges.get((x, y))
+                    if cell_range:
+                        ranges.append(cell_range)
+
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(start, end) for start, end in ranges])
+
+    def query_radius(self, longitude: float, latitude: float, max_distance_km: float, limit_per_type: int = None):
+        """
+        Find all amenities within a specified distance from given coordinates.
+
+        Args:
+            longitude: Longitude coordinate
+            latitude: Latitude coordinate
+            max_distance_km: Maximum distance in kilometers
+            limit_per_type: Keep only the nearest `limit_per_type` amenities of each type (optional)
+
+        Returns:
+            dict: Amenities grouped by type, each a new document with `distance_km` set and sorted by distance
+        """
+        store = self._store
+        nearby_amenities = {amenity_type: [] for amenity_type in store.types}
+
+        candidates = self._candidates(*bounding_box(longitude, latitude, max_distance_km))
+        hits, hit_distances = store.points.within(longitude, latitude, max_distance_km, candidates)
+
+        if limit_per_type is not None:
+            # Select the k nearest of each type before any document is copied
+            hit_codes = store.type_codes[hits]
+            selected = [
+                members[nearest(hit_distances[members], limit_per_type)]
+                for members in (np.flatnonzero(hit_codes == code) for code in np.unique(hit_codes).tolist())
+            ]
+            if selected:
+                selected = np.concatenate(selected)
+                hits, hit_distances = hits[selected], hit_distances[selected]
+
+        # Visit matches nearest first so every per-type list comes out sorted by distance
+        by_distance = np.argsort(hit_distances, kind='stable')
+        hits = hits[by_distance]
+        for amenity, type_code, distance in zip(
+            store.documents(hits), store.type_codes[hits].tolist(), hit_distances[by_distance].tolist()
+        ):
+            amenity["distance_km"] = round(distance, 3)
+            nearby_amenities[store.types[type_code]].append(amenity)
+
+        return nearby_amenities
+
+    def query_bbox(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        limit: int = None,
+        limit_per_type: int = None,
+        after: tuple = None
+    ):
+        """
+        Find the amenities inside a lon/lat box, in (type, _id) order.
+
+        Args:
+            min_lon, min_lat, max_lon, max_lat: Bounds of the box in decimal degrees, inclusive
+            limit: Return at most `limit` amenities across all types (optional)
+            limit_per_type: Keep only the first `limit_per_type` amenities of each type, across all pages (optional)
+            after: (type position in AMENITY_TYPES, _id) keyset position to resume after (optional)
+
+        Returns:
+            tuple: (amenities grouped by type, whether more than `limit` matched)
+        """
+        store = self._store
+        candidates = self._candidates(min_lon, min_lat, max_lon, max_lat)
+        lons = store.points.lons[candidates]
+        lats = store.points.lats[candidates]
+        hits = candidates[(lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)]
+
+        # Ids are compared as stored, which orders them like their strings
+        hit_codes = store.type_codes[hits].astype(np.int64)
+        hit_ids = store.id_keys(hits)
+        order = np.lexsort((hit_ids, hit_codes))
+        hits, hit_codes, hit_ids = hits[order], hit_codes[order], hit_ids[order]
+
+        if limit_per_type is not None:
+            # Rank of every hit within its type's run, counted from the start so the cap holds across pages
+            run_starts = np.searchsorted(hit_codes, hit_codes, side="left")
+            kept = np.arange(len(hits)) - run_starts < limit_per_type
+            hits, hit_codes, hit_ids = hits[kept], hit_codes[kept], hit_ids[kept]
+
+        if after is not None:
+            # AMENITY_TYPES come first in the store's types, so their positions are their codes
+            after_code, after_id = after
+            resume = (hit_codes > after_code) | ((hit_codes == after_code) & (hit_ids > store.id_key(after_id)))
+            hits, hit_codes = hits[resume], hit_codes[resume]
+
+        truncated = limit is not None and len(hits) > limit
+        if truncated:
+            hits, hit_codes = hits[:limit], hit_codes[:limit]
+
+        amenities = {amenity_type: [] for amenity_type in store.types}
+        for amenity, type_code in zip(store.documents(hits), hit_codes.tolist()):
+            amenities[store.types[type_code]].append(amenity)
+        return amenities, truncated
+
+    def query_batch(self, sites, k: int = 5):
+        """
+        Answer the radius queries of several sites in one vectorized pass.
+
+        The candidates of every site (the grid cells overlapping any of the circles) are
+        gathered once and measured against all sites at once as a distance matrix,
+        computed in blocks of at most BATCH_MATRIX_ELEMENTS site x amenity pairs.
+        Documents are only built for the amenities returned.
+
+        Args:
+            sites: Sequence of (longitude, latitude, max_distance_km) tuples
+            k: Number of nearest amenities returned per site, across all types
+
+        Returns:
+            list: One dict per site, in the order of `sites`, with `total_count`, `count_by_type`,
+                `nearest_distance_km_by_type` (None for types without a match) and the `nearest`
+                amenities: new documents with `distance_km` and `amenity_type` set, nearest first
+        """
+        store = self._store
+        types = store.types
+        sites = np.asarray(sites, dtype=np.float64).reshape(-1, 3)
+
+        candidates = [self._candidates(*bounding_box(*site)) for site in sites.tolist()]
+        candidates = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+        # Grouped by type, so each type's distances are one column slice of the matrix
+        candidates = candidates[np.argsort(store.type_codes[candidates], kind='stable')]
+        type_bounds = np.searchsorted(store.type_codes[candidates], np.arange(len(types) + 1)).tolist()
+
+        counts = np.zeros((len(sites), len(types)), dtype=np.int64)
+        nearest_by_type = np.full((len(sites), len(types)), np.inf)
+        nearest_positions = np.empty((len(sites), 0), dtype=np.int64)
+        nearest_distances = np.empty((len(sites), 0))
+        k = min(k, len(candidates))
+        if k:
+            nearest_positions = np.empty((len(sites), k), dtype=np.int64)
+            nearest_distances = np.empty((len(sites), k))
+
+        block = max(1, BATCH_MATRIX_ELEMENTS // max(len(candidates), 1))
+        for start in range(0, len(sites), block):
+            rows = slice(start, start + block)
+            chunk = sites[rows]
+            distances = store.points.within_each(chunk[:, 0], chunk[:, 1], chunk[:, 2], candidates)
+
+            for code, (first, last) in enumerate(zip(type_bounds, type_bounds[1:])):
+                if first < last:
+                    columns = distances[:, first:last]
+                    counts[rows, code] = np.isfinite(columns).sum(axis=1)
+                    nearest_by_type[rows, code] = columns.min(axis=1)
+
+            if k:
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < len(candidates) else (
+                    np.broadcast_to(np.arange(len(candidates)), distances.shape)
+                )
+                top_distances = np.take_along_axis(distances, top, axis=1)
+                by_distance = np.argsort(top_distances, axis=1, kind='stable')
+                nearest_positions[rows] = np.take_along_axis(top, by_distance, axis=1)
+                nearest_distances[rows] = np.take_along_axis(top_distances, by_distance, axis=1)
+
+        # Build every returned document in one call, then hand them out to their sites
+        found = np.isfinite(nearest_distances)
+        hits = candidates[nearest_positions[found]]
+        documents = iter(store.documents(hits))
+        hit_codes = iter(store.type_codes[hits].tolist())
+        hit_distances = iter(nearest_distances[found].tolist())
+
+        results = []
+        for site_counts, site_nearest, site_found in zip(counts.tolist(), nearest_by_type.tolist(), found.tolist()):
+            nearest_amenities = []
+            for _ in range(sum(site_found)):
+                amenity = next(documents)
+                amenity["distance_km"] = round(next(hit_distances), 3)
+                amenity["amenity_type"] = types[next(hit_codes)]
+                nearest_amenities.append(amenity)
+            results.append({
+                "total_count": sum(site_counts),
+                "count_by_type": dict(zip(types, site_counts)),
+                "nearest_distance_km_by_type": {
+                    amenity_type: round(distance, 3) if math.isfinite(distance) else None
+                    for amenity_type, distance in zip(types, site_nearest)
+                },
+                "nearest": nearest_amenities,
+            })
+        return results
+
+    def query_rings(self, longitude: float, latitude: float, ring_radii_km=AMENITY_RING_RADII_KM, k: int = None):
+        """
+        Summarize the amenities in concentric rings around a location (see `ring_statistics`).
+
+        Distances are measured once, out to the outer radius, instead of one radius query per ring.
+
+        Args:
+            longitude: Longitude coordinate
+            latitude: Latitude coordinate
+            ring_radii_km: Ascending outer radii of the rings in kilometers
+            k: Nearest amenities listed per ring (None for all of them)
+
+        Returns:
+            list: One dict per ring, innermost first
+        """
+        store = self._store
+        outer_radius_km = ring_radii_km[-1]
+        candidates = self._candidates(*bounding_box(longitude, latitude, outer_radius_km))
+        hits, hit_distances = store.points.within(longitude, latitude, outer_radius_km, candidates)
+
+        return ring_statistics(
+            store.types,
+            store.type_codes[hits],
+            hit_distances,
+            ring_radii_km,
+            k,
+            lambda positions: store.documents(hits[positions]),
+        )
@@ -0,0 +1,383 @@
+import os
+
+import numpy as np
+import orjson
+from bson import ObjectId
+
+from geo import PointArray
+from serialization import dumps
+
+# ObjectIds are stored as their 12 raw bytes; other ids as encoded strings
+OBJECT_ID_BYTES = 12
+OBJECT_ID_DTYPE = f"V{OBJECT_ID_BYTES}"
+
+FEATURE_KEYS = ["type", "geometry", "properties"]
+GEOMETRY_KEYS = ["coordinates", "type"]
+
+# The store keeps coordinates only; queries compute the Haversine terms of their candidates
+POINT_ARRAYS = ("lons", "lats")
+
+
+def offset_dtype(largest: int):
+    """
+    int32 for offsets and positions up to `largest` when it fits, else int64.
+
+    Examples:
+        >>> offset_dtype(1_000_000), offset_dtype(1 << 40)
+        (<class 'numpy.int32'>, <class 'numpy.int64'>)
+    """
+    return np.int32 if largest <= np.iinfo(np.int32).max else np.int64
+
+
+class StoredValues:
+    """
+    Read-only sequence of JSON values packed in one buffer, decoded on access.
+
+    A value costs its encoded bytes plus one offset instead of a Python object, and
+    the buffer can be a memory-mapped file. Every access returns a new object, so
+    callers may mutate what they get.
+
+    Examples:
+        >>> values = StoredValues.from_values(["Kitsilano", 3, ["a", "b"]])
+        >>> len(values), values[0], values[2]
+        (3, 'Kitsilano', ['a', 'b'])
+    """
+
+    __slots__ = ("buffer", "offsets", "_view")
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+        self._view = memoryview(buffer)  # Slicing a memoryview does not copy
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [dumps(value) for value in values]
+        lengths = np.array([len(value) for value in encoded], dtype=np.int64)
+        offsets = np.zeros(len(encoded) + 1, dtype=offset_dtype(int(lengths.sum())))
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        return orjson.loads(self._view[self.offsets[position]:self.offsets[position + 1]])
+
+
+def point_feature(longitude, latitude):
+    """
+    The `geom` of a City of Vancouver record located at (longitude, latitude).
+    """
+    return {"type": "Feature", "geometry": {"coordinates": [longitude, latitude], "type": "Point"}, "properties": {}}
+
+
+def _encode_ids(ids):
+    """
+    Pack document ids into an array: 12 bytes per ObjectId, or their encoded strings if any is not one.
+    """
+    if all(isinstance(document_id, ObjectId) for document_id in ids):
+        return np.frombuffer(b"".join(document_id.binary for document_id in ids), dtype=OBJECT_ID_DTYPE)
+    return np.array([str(document_id).encode() for document_id in ids], dtype=np.bytes_)
+
+
+def _is_point_feature(geom, longitude, latitude):
+    # Key order and float coordinates must match as well, so rebuilt documents encode exactly as read
+    if geom != point_feature(longitude, latitude):
+        return False
+    geometry = geom["geometry"]
+    return (
+        list(geom) == FEATURE_KEYS
+        and list(geometry) == GEOMETRY_KEYS
+        and all(type(coordinate) is float for coordinate in geometry["coordinates"])
+    )
+
+
+class AmenityRow:
+    """
+    Lightweight view of one amenity of an AmenityStore; fields are read from the columns on access.
+
+    Examples:
+        >>> store = AmenityStore.from_documents(
+        ...     [{"_id": "a1", "name": "Library", "geom": point_feature(-123.1, 49.2)}], [0], ("libraries",)
+        ... )
+        >>> row = store[0]
+        >>> row.type, row["name"], row.longitude
+        ('libraries', 'Library', -123.1)
+        >>> row.to_document()
+        {'_id': 'a1', 'name': 'Library', 'geom': {'type': 'Feature', 'geometry': {'coordinates': [-123.1, 49.2], 'type': 'Point'}, 'properties': {}}}
+    """
+
+    __slots__ = ("_store", "_position")
+
+    def __init__(self, store, position: int):
+        self._store = store
+        self._position = position
+
+    @property
+    def id(self) -> str:
+        return self._store._decode_id(self._store.ids[self._position].tolist())
+
+    @property
+    def type(self) -> str:
+        return self._store.types[self._store.type_codes[self._position]]
+
+    @property
+    def longitude(self) -> float:
+        return float(self._store.points.lons[self._position])
+
+    @property
+    def latitude(self) -> float:
+        return float(self._store.points.lats[self._position])
+
+    def keys(self):
+        return ("_id",) + self._store._schemas[self._store._schema_codes[self._position]]
+
+    def __getitem__(self, field):
+        if field == "_id":
+            return self.id
+        return self._store._field(self._position, field)
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def to_document(self) -> dict:
+        return self._store.document(self._position)
+
+
+class AmenityStore:
+    """
+    Amenities held column by column instead of as one MongoDB document each.
+
+    Coordinates live in a PointArray that keeps no precomputed terms, types in an int8 code array and ObjectIds in a
+    12-byte array. Every other field value is interned: it is stored once, encoded,
+    in a StoredValues table and rows hold int32 codes into it, laid out like a CSR
+    matrix (`value_offsets` delimits each row's codes). The field names of a row come
+    from one of a few shared schemas, so every record of a dataset costs one int16.
+    A `geom` that only repeats the row's coordinates is not stored at all, not even
+    as a code: the row's schema says it is rebuilt from the coordinate arrays.
+
+    Full documents are built on request, by `document` or `documents`, so a query
+    only pays for the amenities it returns; `store[position]` gives a cheaper
+    `AmenityRow` view.
+
+    Args:
+        types: Amenity type names, indexed by the type codes
+        ids: Document ids as an OBJECT_ID_DTYPE array, or a bytes array of encoded strings
+        type_codes: int8 type code of each row
+        points: PointArray of the rows
+        schemas: (field names excluding `_id`, whether `geom` is rebuilt from the coordinates) of the rows
+        schema_codes: Index into `schemas` of each row
+        value_offsets: int32 (or int64) array; the codes of row i are value_codes[value_offsets[i]:value_offsets[i + 1]]
+        value_codes: int32 codes into `values` of each stored field, in schema order
+        values: StoredValues of the distinct field values
+    """
+
+    def __init__(self, types, ids, type_codes, points, schemas, schema_codes, value_offsets, value_codes, values):
+        self.types = tuple(types)
+        self.ids = ids
+        self.type_codes = type_codes
+        self.points = points
+        self._schemas = [tuple(keys) for keys, _ in schemas]
+        self._point_geoms = [bool(point_geom) for _, point_geom in schemas]
+        # Field names that have a value code, per schema
+        self._stored_keys = [
+            tuple(key for key in keys if not (point_geom and key == "geom")) for keys, point_geom in schemas
+        ]
+        self._schema_codes = schema_codes
+        self._value_offsets = value_offsets
+        self._value_codes = value_codes
+        self._values = values
+        self._decode_id = bytes.hex if ids.dtype == np.dtype(OBJECT_ID_DTYPE) else bytes.decode
+
+    @classmethod
+    def from_documents(cls, documents, type_codes, types, points: PointArray = None):
+        """
+        Encode MongoDB documents into columns, in the order given.
+
+        Args:
+            documents: Sequence of amenity documents; they are not modified or kept
+            type_codes: Type code of each document, indexing `types`
+            types: Amenity type names
+            points: PointArray of the documents' `geom` coordinates (computed, without precomputed terms, if omitted)
+
+        Returns:
+            AmenityStore: The encoded store
+        """
+        if points is None:
+            points = PointArray.from_documents(documents, precompute=False)
+        lons, lats = points.lons.tolist(), points.lats.tolist()
+
+        interned = {}
+        values = []
+        schemas = {}
+        schema_codes = []
+        value_offsets = [0]
+        value_codes = []
+
+        def intern(value):
+            try:
+                # Keyed by type as well, so 1, 1.0 and True stay distinct
+                key = (type(value), value)
+                code = interned.get(key)
+            except TypeError:
+                # Lists and embedded documents are stored once per row
+                values.append(value)
+                return len(values) - 1
+            if code is None:
+                code = interned[key] = len(values)
+                values.append(value)
+            return code
+
+        for position, document in enumerate(documents):
+            keys = tuple(key for key in document if key != "_id")
+            point_geom = "geom" in document and _is_point_feature(document["geom"], lons[position], lats[position])
+            schema_codes.append(schemas.setdefault((keys, point_geom), len(schemas)))
+            for key in keys:
+                if not (point_geom and key == "geom"):
+                    value_codes.append(intern(document[key]))
+            value_offsets.append(len(value_codes))
+
+        return cls(
+            types,
+            _encode_ids([document["_id"] for document in documents]),
+            np.asarray(type_codes, dtype=np.int8),
+            points,
+            list(schemas),
+            np.array(schema_codes, dtype=np.int16),
+            np.array(value_offsets, dtype=offset_dtype(len(value_codes))),
+            np.array(value_codes, dtype=np.int32),
+            StoredValues.from_values(values),
+        )
+
+    def __len__(self):
+        return len(self.type_codes)
+
+    def __getitem__(self, position: int) -> AmenityRow:
+        return AmenityRow(self, position)
+
+    def decode_ids(self, positions) -> list:
+        """
+        The `_id` strings of several rows.
+        """
+        return [self._decode_id(document_id) for document_id in self.ids[np.asarray(positions, dtype=np.int64)].tolist()]
+
+    def id_keys(self, positions):
+        """
+        The stored ids of several rows, as a bytes array that sorts like their `_id` strings.
+        """
+        ids = self.ids[np.asarray(positions, dtype=np.int64)]
+        # Every ObjectId is exactly 12 bytes, so their NUL padding never affects the order
+        return ids.view(f"S{OBJECT_ID_BYTES}") if self._decode_id is bytes.hex else ids
+
+    def id_key(self, document_id: str) -> bytes:
+        """
+        An `_id` string in the form returned by `id_keys`, for comparisons.
+        """
+        return bytes.fromhex(document_id) if self._decode_id is bytes.hex else document_id.encode()
+
+    def _field(self, position, field):
+        schema_code = self._schema_codes[position]
+        if field == "geom" and self._point_geoms[schema_code]:
+            return point_feature(float(self.points.lons[position]), float(self.points.lats[position]))
+        stored_keys = self._stored_keys[schema_code]
+        if field not in stored_keys:
+            raise KeyError(field)
+        return self._values[self._value_codes[self._value_offsets[position] + stored_keys.index(field)]]
+
+    def document(self, position: int) -> dict:
+        """
+        Build the MongoDB document of one row, with its `_id` as a string.
+        """
+        return self.documents([position])[0]
+
+    def documents(self, positions) -> list:
+        """
+        Build the documents of several rows, in the order of `positions`.
+
+        The columns of all rows are gathered in a few vectorized reads first, so the
+        per-row work is only assembling the dict.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self._value_offsets[positions]
+        lengths = self._value_offsets[positions + 1] - starts
+        # Positions of every requested row's codes in value_codes, row after row
+        code_positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        codes = iter(self._value_codes[code_positions].tolist())
+
+        values = self._values
+        schemas = self._schemas
+        point_geoms = self._point_geoms
+        decode_id = self._decode_id
+        documents = []
+        for id_bytes, schema_code, longitude, latitude in zip(
+            self.ids[positions].tolist(),
+            self._schema_codes[positions].tolist(),
+            self.points.lons[positions].tolist(),
+            self.points.lats[positions].tolist(),
+        ):
+            document = {"_id": decode_id(id_bytes)}
+            point_geom = point_geoms[schema_code]
+            for key in schemas[schema_code]:
+                if point_geom and key == "geom":
+                    document[key] = point_feature(longitude, latitude)
+                else:
+                    document[key] = values[next(codes)]
+            documents.append(document)
+        return documents
+
+    def save(self, directory: str, prefix: str):
+        """
+        Write the columns to `directory` as <prefix>_*.npy plus one buffer of JSON values, for `load`.
+
+        Returns:
+            dict: The JSON-compatible metadata `load` needs back
+        """
+        with open(os.path.join(directory, f"{prefix}_values.bin"), "wb") as f:
+            f.write(self._values.buffer)
+
+        arrays = {
+            **self.points.arrays(),
+            "ids": self.ids,
+            "type_codes": self.type_codes,
+            "schema_codes": self._schema_codes,
+            "value_offsets": self._value_offsets,
+            "value_codes": self._value_codes,
+            "stored_value_offsets": self._values.offsets,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{prefix}_{name}.npy"), np.ascontiguousarray(array))
+
+        return {
+            "types": list(self.types),
+            "schemas": [[list(keys), point_geom] for keys, point_geom in zip(self._schemas, self._point_geoms)],
+        }
+
+    @classmethod
+    def load(cls, directory: str, prefix: str, metadata: dict):
+        """
+        Attach to columns written by `save`, memory-mapping them read-only.
+        """
+        def load_array(name):
+            return np.load(os.path.join(directory, f"{prefix}_{name}.npy"), mmap_mode="r")
+
+        values_path = os.path.join(directory, f"{prefix}_values.bin")
+        # A zero-length file cannot be memory-mapped
+        buffer = (
+            np.memmap(values_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(values_path) else np.empty(0, dtype=np.uint8)
+        )
+        return cls(
+            metadata["types"],
+            load_array("ids"),
+            load_array("type_codes"),
+            PointArray.from_arrays({name: load_array(name) for name in POINT_ARRAYS}),
+            metadata["schemas"],
+            load_array("schema_codes"),
+            load_array("value_offsets"),
+            load_array("value_codes"),
+            StoredValues(buffer, load_array("stored_value_offsets")),
+        )
@@ -2,37 +2,379 @@ import os
 from dotenv import load_dotenv
 from typing import Optional, List
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Body, HTTPException, status
-from fastapi.responses import Response
-from pydantic import ConfigDict, BaseModel, Field, EmailStr
+from fastapi import FastAPI, Body, HTTPException, status, Query, Header, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ConfigDict, BaseModel, Field, EmailStr, ValidationError
 from pydantic.functional_validators import BeforeValidator
 
 from typing_extensions import Annotated
 
-from pymongo import MongoClient
-import math
+from pymongo import AsyncMongoClient
+from bson import ObjectId
+from contextlib import asynccontextmanager
 import time
+import math
 import json
+import base64
+import hashlib
+import heapq
 import asyncio
+import numpy as np
 from openai import AsyncOpenAI
 
+from amenity_index import AmenityIndex, AMENITY_TYPES, AMENITY_RING_RADII_KM, ring_statistics
+from geo import GEO_POINT_FIELD, PointArray
+from snapshot import attach_snapshot, PERMIT_ID_DTYPE
+from clusters import ClusterIndex
+from response_cache import ResponseCache
+from payload_cache import PayloadCache
+from data_version import fetch_data_version
+from json_stream import ArrayItemParser
+from prompt_encoding import encode_permit_for_prompt
+from admission import AdmissionController, AdmissionRejected
+from jobs import JobQueue
+from serialization import NegotiatedResponse, NegotiationMiddleware, dumps, wants_msgpack
+from metrics import (
+    MetricsMiddleware,
+    MongoMetricsListener,
+    admission_stats_collector,
+    cache_stats_collector,
+    record_openai_usage,
+    render_metrics,
+    AMENITY_QUERY_DURATION,
+    OPENAI_REQUEST_DURATION,
+    OPENAI_FIRST_TOKEN,
+    OPENAI_FAILURES,
+)
+
 load_dotenv()
 
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError(
-        "OPENAI_API_KEY not found. Set it in a .env file or export it in your environment."
+# Set AMENITY_INDEX_ENABLED=false to answer amenity radius queries with $geoNear instead
+AMENITY_INDEX_ENABLED = os.getenv("AMENITY_INDEX_ENABLED", "true").lower() != "false"
+
+# The GeoJSON point only exists for the 2dsphere index (see script_create_indexes.py)
+# and duplicates `geom`, so it is never sent to clients
+HIDDEN_FIELDS = {GEO_POINT_FIELD: 0}
+
+# Spatial index over all amenities, built once at startup (see `lifespan`)
+amenity_index = AmenityIndex()
+
+# With several workers, set SNAPSHOT_DIR to a directory they share: the first one writes the
+# amenity index and permit coordinates there once per data version and all of them memory-map it
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR")
+snapshot = None
+
+# Map clustering over amenities and listed permits (see clusters.py), rebuilt with the amenity index.
+# Zooms above CLUSTER_MAX_ZOOM get individual points, at most CLUSTER_MAX_POINTS of them
+CLUSTER_MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", "16"))
+CLUSTER_MAX_POINTS = int(os.getenv("CLUSTER_MAX_POINTS", "2000"))
+PERMIT_CLUSTER_TYPE = "development_permits"
+cluster_index = ClusterIndex(CLUSTER_MAX_ZOOM, CLUSTER_MAX_POINTS)
+
+# Connection pool tuning for the async Mongo client (see `lifespan`)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+# Upper bound for the `limit` query parameter of the list endpoints
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Results of a `bbox` query to /development-permits or /amenities without `limit`; the rest is
+# reported with `truncated` and reachable through `next_cursor`
+BBOX_MAX_RESULTS = int(os.getenv("BBOX_MAX_RESULTS", "1000"))
+
+# Meters taken off $geoNear's minDistance when resuming a distance-ordered page (see `geo_near_pipeline`)
+MIN_DISTANCE_SLACK_M = 0.01
+
+# Latitude bound of the $geoWithin polygons built for `bbox` queries (see `geo_within_bbox`)
+MAX_POLYGON_LATITUDE = 89.9
+
+# Permit ids accepted by one POST /impact_reports/batch
+MAX_BATCH_REPORT_IDS = int(os.getenv("MAX_BATCH_REPORT_IDS", "100"))
+
+# Sites accepted by one POST /amenities/nearby/batch
+MAX_BATCH_SITES = int(os.getenv("MAX_BATCH_SITES", "100"))
+
+# Rings accepted by one GET /amenities/rings
+MAX_RINGS = 10
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Hypothetical reports are cached by normalized request (see `hypothetical_cache_key`)
+HYPOTHETICAL_CACHE_MAX_ENTRIES = int(os.getenv("HYPOTHETICAL_CACHE_MAX_ENTRIES", "256"))
+HYPOTHETICAL_CACHE_TTL_SECONDS = float(os.getenv("HYPOTHETICAL_CACHE_TTL_SECONDS", "3600"))
+HYPOTHETICAL_CACHE_COORD_PRECISION = int(os.getenv("HYPOTHETICAL_CACHE_COORD_PRECISION", "4"))  # ~11 m
+
+hypothetical_report_cache = ResponseCache(
+    max_entries=HYPOTHETICAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=HYPOTHETICAL_CACHE_TTL_SECONDS,
+)
+
+# Unfiltered listings are served pre-serialized until the ingest scripts bump the data version
+PAYLOAD_CACHE_MAX_AGE_SECONDS = int(os.getenv("PAYLOAD_CACHE_MAX_AGE_SECONDS", "300"))
+DATA_VERSION_POLL_SECONDS = float(os.getenv("DATA_VERSION_POLL_SECONDS", "30"))
+
+payload_cache = PayloadCache(max_age_seconds=PAYLOAD_CACHE_MAX_AGE_SECONDS)
+
+cache_stats_collector.register("hypothetical_impact_report", hypothetical_report_cache)
+cache_stats_collector.register("payloads", payload_cache)
+
+# Concurrent OpenAI calls per process; LLM_MAX_QUEUE more wait up to LLM_QUEUE_TIMEOUT_SECONDS for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+
+llm_admission = AdmissionController(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_queue=LLM_MAX_QUEUE,
+    queue_timeout_seconds=LLM_QUEUE_TIMEOUT_SECONDS,
+)
+
+admission_stats_collector.register("openai", llm_admission)
+
+# Hypothetical reports submitted as jobs: workers per process, and how long finished jobs stay readable
+HYPOTHETICAL_JOB_WORKERS = int(os.getenv("HYPOTHETICAL_JOB_WORKERS", "4"))
+HYPOTHETICAL_JOB_TTL_SECONDS = float(os.getenv("HYPOTHETICAL_JOB_TTL_SECONDS", "86400"))
+# A job still running after this long is assumed abandoned and may be taken over by another worker
+HYPOTHETICAL_JOB_LEASE_SECONDS = float(os.getenv("HYPOTHETICAL_JOB_LEASE_SECONDS", "300"))
+
+# Build the unfiltered listings during startup so the first requests are served from memory
+WARMUP_PAYLOADS = os.getenv("WARMUP_PAYLOADS", "true").lower() != "false"
+
+# Timeout of the Mongo ping behind /readyz
+READINESS_PING_TIMEOUT_SECONDS = float(os.getenv("READINESS_PING_TIMEOUT_SECONDS", "2"))
+
+# Opened and closed by `lifespan`
+client = None
+db = None
+OpenAIClient = None
+data_version = 0
+
+# Set once startup and warm-up have finished; cleared again when shutdown begins
+ready = False
+warmup_seconds = None
+
+async def load_all_amenities():
+    """
+    Read the nine amenity collections concurrently.
+    
+    Returns:
+        dict: Raw amenity documents grouped by type
+    """
+    results = await asyncio.gather(*(
+        db.get_collection(amenity_type).find({}, HIDDEN_FIELDS).to_list(None)
+        for amenity_type in AMENITY_TYPES
+    ))
+    return dict(zip(AMENITY_TYPES, results))
+
+async def load_listed_permit_points():
+    """
+    Read the coordinates of the permits listed by /development-permits.
+    
+    Returns:
+        tuple: (permit ObjectId strings, PointArray aligned with them)
+    """
+    permits = await db.get_collection("development_permits").find(
+        {"has_impact_report": True}, {GEO_POINT_FIELD: 1}
+    ).to_list(None)
+    coordinates = [
+        (permit.get(GEO_POINT_FIELD) or {}).get("coordinates") or (float("nan"), float("nan"))
+        for permit in permits
+    ]
+    lons = [coordinate[0] for coordinate in coordinates]
+    lats = [coordinate[1] for coordinate in coordinates]
+    return [str(permit["_id"]) for permit in permits], PointArray(lons, lats)
+
+async def build_snapshot_contents():
+    """
+    Read everything a snapshot holds from Mongo (see snapshot.py).
+    """
+    index = AmenityIndex().build(await load_all_amenities())
+    permit_ids, permit_points = await load_listed_permit_points()
+    return index, permit_ids, permit_points
+
+async def load_amenity_index(version: float):
+    """
+    Read the nine amenity collections once and (re)build the in-memory spatial index.
+    
+    With SNAPSHOT_DIR set, attach to the shared snapshot of `version` instead,
+    building it first if no other worker has.
+    """
+    global amenity_index, snapshot
+    
+    if SNAPSHOT_DIR:
+        snapshot = await attach_snapshot(SNAPSHOT_DIR, version, build_snapshot_contents)
+        # Rebinding the name switches every later request to the new snapshot at once
+        amenity_index = snapshot.amenity_index
+        print(
+            f"Attached snapshot {snapshot.path} with {len(amenity_index)} amenities "
+            f"and {len(snapshot.permit_ids)} permits"
+        )
+        return
+    
+    amenity_index.build(await load_all_amenities())
+    print(f"Amenity index built with {len(amenity_index)} amenities")
+
+async def load_cluster_index():
+    """
+    Rebuild the map clustering pyramid over the amenities and the permits with impact reports.
+    
+    Reuses the coordinates of the amenity index and, when attached, of the snapshot.
+    """
+    global cluster_index
+    
+    if AMENITY_INDEX_ENABLED:
+        store = amenity_index.store
+    else:
+        store = AmenityIndex().build(await load_all_amenities()).store
+    
+    if snapshot is not None:
+        permit_ids, permit_points = snapshot.permit_ids, snapshot.permit_points
+    else:
+        permit_ids, permit_points = await load_listed_permit_points()
+    permit_ids = np.asarray(permit_ids, dtype=PERMIT_ID_DTYPE)
+    
+    # Built aside and swapped in, so requests never see a half-built index
+    cluster_index = ClusterIndex(CLUSTER_MAX_ZOOM, CLUSTER_MAX_POINTS).build([
+        (store.types, store.type_codes, store.points.lons, store.points.lats, store.decode_ids),
+        (
+            (PERMIT_CLUSTER_TYPE,),
+            np.zeros(len(permit_points), dtype=np.int8),
+            permit_points.lons,
+            permit_points.lats,
+            lambda positions: [permit_id.decode() for permit_id in permit_ids[positions].tolist()]
+        ),
+    ])
+    print(f"Cluster index built with {len(cluster_index)} points")
+
+async def refresh_data_version():
+    """
+    Pick up data written by the ingest scripts since the last check.
+    
+    Rebuilds the amenity index and drops every cached payload and report when the
+    data version recorded in Mongo has changed.
+    
+    Returns:
+        bool: True if a new version was loaded
+    """
+    global data_version
+    
+    version = await fetch_data_version(db)
+    if version == data_version:
+        return False
+    
+    if AMENITY_INDEX_ENABLED:
+        await load_amenity_index(version)
+    await load_cluster_index()
+    payload_cache.invalidate()
+    hypothetical_report_cache.clear()
+    data_version = version
+    print(f"Loaded data version {version}")
+    
+    if WARMUP_PAYLOADS:
+        await warm_payloads()
+    return True
+
+async def watch_data_version():
+    """
+    Poll the data version every DATA_VERSION_POLL_SECONDS for the lifetime of the app.
+    """
+    while True:
+        await asyncio.sleep(DATA_VERSION_POLL_SECONDS)
+        try:
+            await refresh_data_version()
+        except Exception as e:
+            print(f"Error refreshing data version: {e}")
+
+def require_env(name: str) -> str:
+    """
+    Read a required environment variable.
+    
+    Raises:
+        RuntimeError: If the variable is not set
+    """
+    value = os.getenv(name)
+    if not value:
+        raise RuntimeError(
+            f"{name} not found. Set it in a .env file or export it in your environment."
+        )
+    return value
+
+def create_mongo_client():
+    """
+    Open the pooled async Mongo client. Replaced by tests and the load test harness.
+    """
+    return AsyncMongoClient(
+        require_env("MONGODB_URL"),
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[MongoMetricsListener()],
     )
 
-OpenAIClient = AsyncOpenAI()
+def create_openai_client():
+    """
+    Create the OpenAI client. Replaced by tests and the load test harness.
+    """
+    return AsyncOpenAI(api_key=require_env("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT_SECONDS)
+
+async def warm_up():
+    """
+    Load everything the first requests would otherwise wait for.
+    
+    Radius queries are answered from memory, so the amenity index is built before
+    serving traffic; the unfiltered listings are serialized and compressed once.
+    """
+    global data_version
+    
+    await client.admin.command("ping")
+    
+    data_version = await fetch_data_version(db)
+    if AMENITY_INDEX_ENABLED:
+        await load_amenity_index(data_version)
+    await load_cluster_index()
+    
+    if WARMUP_PAYLOADS:
+        await warm_payloads()
 
-print(os.getenv("MONGODB_URL"))
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, OpenAIClient, ready, warmup_seconds
+    
+    client = create_mongo_client()
+    db = client.stormhacks2025
+    OpenAIClient = create_openai_client()
+    
+    try:
+        start_time = time.perf_counter()
+        await warm_up()
+        warmup_seconds = round(time.perf_counter() - start_time, 3)
+        print(f"Warm-up finished in {warmup_seconds}s")
+        
+        await hypothetical_jobs.start(db.get_collection("hypothetical_jobs"))
+        watcher = asyncio.create_task(watch_data_version())
+        ready = True
+        try:
+            yield
+        finally:
+            # Report not ready while the pools are closing
+            ready = False
+            watcher.cancel()
+            await hypothetical_jobs.stop()
+    finally:
+        await OpenAIClient.close()
+        await client.close()
 
 app = FastAPI(
     title="StormHacks2025 Backend",
     summary="Backend API for StormHacks2025 project",
+    lifespan=lifespan,
+    default_response_class=NegotiatedResponse,
 )
 
+app.add_middleware(NegotiationMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"], 
@@ -41,14 +383,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-mongodb_url = os.getenv("MONGODB_URL")
-if not mongodb_url:
-    raise RuntimeError(
-        "MONGODB_URL not found. Set it in a .env file or export it in your environment."
-    )
-
-client = MongoClient(mongodb_url)
-db = client.stormhacks2025
+# Added last so it wraps everything else and times the whole request
+app.add_middleware(MetricsMiddleware)
 
 # Represents an ObjectId field in the database.
 # It will be represented as a `str` on the model so that it can be serialized to JSON.
@@ -66,6 +402,7 @@ class HypotheticalDevelopmentRequest(BaseModel):
     property_use: Optional[List[str]] = Field(default=[], description="Property use categories")
     specific_use_category: Optional[List[str]] = Field(default=[], description="Specific use categories like 'Multiple Dwelling'")
     max_distance_km: Optional[float] = Field(default=1.0, description="Maximum distance to search for nearby amenities in kilometers")
+    limit_per_type: Optional[int] = Field(default=None, ge=1, description="Only analyze the nearest N amenities of each type")
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -77,290 +414,1030 @@ class HypotheticalDevelopmentRequest(BaseModel):
                 "address": "123 Main Street, Vancouver, BC",
                 "property_use": ["Residential Uses"],
                 "specific_use_category": ["Multiple Dwelling"],
-                "max_distance_km": 1.0
+                "max_distance_km": 1.0,
+                "limit_per_type": 10
+            }
+        }
+    )
+
+class ImpactReportBatchRequest(BaseModel):
+    """
+    Request model for fetching several impact reports at once.
+    """
+    permit_ids: List[str] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_REPORT_IDS, description="Original permit IDs of the reports"
+    )
+    fields: Optional[List[str]] = Field(
+        default=None, description="Only return these top-level report fields, e.g. ['AnalysisSummary']"
+    )
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "permit_ids": ["68e1f303607bd68421537e47", "68e1f303607bd68421537e48"],
+                "fields": ["AnalysisSummary"]
+            }
+        }
+    )
+
+class NearbySite(BaseModel):
+    """
+    One location of a nearby amenities batch.
+    """
+    longitude: float = Field(..., ge=-180, le=180, description="Longitude coordinate of the site")
+    latitude: float = Field(..., ge=-90, le=90, description="Latitude coordinate of the site")
+    max_distance_km: float = Field(default=1.0, gt=0, description="Search radius in kilometers")
+
+class NearbyBatchRequest(BaseModel):
+    """
+    Request model for counting and listing the amenities near several sites at once.
+    """
+    sites: List[NearbySite] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_SITES, description="Candidate sites, answered in this order"
+    )
+    k: int = Field(default=5, ge=0, le=MAX_PAGE_SIZE, description="Nearest amenities returned per site, across types")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "sites": [
+                    {"longitude": -123.1207, "latitude": 49.2827, "max_distance_km": 1.0},
+                    {"longitude": -123.0911, "latitude": 49.2778, "max_distance_km": 0.5}
+                ],
+                "k": 5
             }
         }
     )
 
-def haversine_distance(lon1, lat1, lon2, lat2):
+class AnalysisSummary(BaseModel):
+    """
+    Project-level summary section of an impact analysis.
+    """
+    id: str = Field(..., alias="_id")
+    title: str
+    description: str
+    overallImportance: int = Field(..., ge=1, le=10)
+
+    model_config = ConfigDict(populate_by_name=True, extra="allow")
+
+class AnalyzedInfrastructure(BaseModel):
     """
-    Calculate the great circle distance between two points on Earth using the Haversine formula.
+    Impact of a development on one nearby infrastructure item.
+    """
+    id: str = Field(..., alias="_id")
+    name: str
+    type: str
+    impactScore: int = Field(..., ge=-10, le=10)
+    quantitativeImpact: str
+    justification: str
+
+    model_config = ConfigDict(populate_by_name=True, extra="allow")
+
+class ImpactAnalysis(BaseModel):
+    """
+    Impact analysis produced by the LLM (see IMPACT_ANALYSIS_PROMPT).
+    """
+    summary: AnalysisSummary = Field(..., alias="AnalysisSummary")
+    infrastructure: List[AnalyzedInfrastructure] = Field(default=[], alias="AnalyzedInfrastructure")
+
+    model_config = ConfigDict(populate_by_name=True, extra="allow")
+
+def encode_cursor(position) -> str:
+    """
+    Encode a keyset position as an opaque, URL-safe pagination cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode()
+
+def decode_cursor(cursor: str, by_distance: bool) -> tuple:
+    """
+    Decode a cursor produced by `encode_cursor`.
     
     Args:
-        lon1, lat1: Coordinates of first point in decimal degrees
-        lon2, lat2: Coordinates of second point in decimal degrees
+        cursor: Opaque cursor from a previous page's `next_cursor`
+        by_distance: Whether the listing is ordered by distance, in which case the
+            position starts with a distance in kilometers
         
     Returns:
-        float: Distance in kilometers
+        tuple: The keyset position of the last item of the previous page
+        
+    Raises:
+        HTTPException: 400 if the cursor is malformed or belongs to a different kind of listing
     """
-    if None in [lon1, lat1, lon2, lat2]:
-        return None
+    try:
+        position = tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except (ValueError, TypeError):
+        position = None
+    
+    expected_types = ((int, float),) if by_distance else ()
+    expected_types += (int, str)  # (type index or 0 for permits, _id)
     
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
+    if (
+        position is None
+        or len(position) != len(expected_types)
+        or not all(isinstance(value, types) for value, types in zip(position, expected_types))
+        # json.loads accepts NaN and Infinity, which would resume past every document
+        or (by_distance and not (math.isfinite(position[0]) and position[0] >= 0))
+        or not ObjectId.is_valid(position[-1])
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
     
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
+    return position
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    """
+    Whether the client asked for a newline-delimited JSON stream.
+    """
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+def parse_bbox(bbox: str) -> tuple:
+    """
+    Parse a `min_lon,min_lat,max_lon,max_lat` query parameter.
     
-    # Radius of Earth in kilometers
-    r = 6371
+    Raises:
+        HTTPException: 400 if it is not four numbers describing a valid box
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        min_lon = None
     
-    return c * r
+    if (
+        min_lon is None
+        or not -180 <= min_lon < max_lon <= 180
+        or not -90 <= min_lat < max_lat <= 90
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be min_lon,min_lat,max_lon,max_lat with min < max, in degrees"
+        )
+    return min_lon, min_lat, max_lon, max_lat
 
-def extract_coordinates_from_geom(geom_field):
+def parse_viewport(bbox: Optional[str], lon: Optional[float], lat: Optional[float], distance: Optional[float]):
     """
-    Extract longitude and latitude from a geom field.
+    Parse the optional `bbox` of a listing, which replaces the lon/lat/distance filter.
     
-    Args:
-        geom_field: Can be a dict with geometry.coordinates or a simple dict with lon/lat
-        
     Returns:
-        tuple: (longitude, latitude) or (None, None) if extraction fails
+        tuple: (min_lon, min_lat, max_lon, max_lat), or None without `bbox`
+        
+    Raises:
+        HTTPException: 400 if the box is malformed or combined with a radius filter
     """
-    if not geom_field or not isinstance(geom_field, dict):
-        return None, None
+    if bbox is None:
+        return None
+    if lon is not None or lat is not None or distance is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox cannot be combined with lon, lat and distance"
+        )
+    return parse_bbox(bbox)
+
+def geo_within_bbox(bbox: tuple) -> dict:
+    """
+    Filter for documents whose GEO_POINT_FIELD lies inside a lon/lat box, answered by its 2dsphere index.
     
-    # Handle GeoJSON format: geom.geometry.coordinates
-    if 'geometry' in geom_field and isinstance(geom_field['geometry'], dict):
-        coords = geom_field['geometry'].get('coordinates')
-        if coords and isinstance(coords, list) and len(coords) >= 2:
-            return coords[0], coords[1]  # [lon, lat]
+    Polygon edges are geodesics, which bow slightly away from the lines of latitude
+    (a few meters across a city-sized box). Boxes are split into pieces at most 90
+    degrees wide and kept off the poles, so no piece is degenerate or larger than a
+    hemisphere.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    min_lat, max_lat = max(min_lat, -MAX_POLYGON_LATITUDE), min(max_lat, MAX_POLYGON_LATITUDE)
     
-    return None, None
+    pieces = math.ceil((max_lon - min_lon) / 90)
+    edges = [min_lon + (max_lon - min_lon) * piece / pieces for piece in range(pieces + 1)]
+    boxes = [
+        {GEO_POINT_FIELD: {"$geoWithin": {"$geometry": {
+            "type": "Polygon",
+            "coordinates": [[[west, min_lat], [east, min_lat], [east, max_lat], [west, max_lat], [west, min_lat]]]
+        }}}}
+        for west, east in zip(edges, edges[1:])
+    ]
+    return boxes[0] if len(boxes) == 1 else {"$or": boxes}
 
-async def find_nearby_amenities_for_coordinates(longitude: float, latitude: float, max_distance_km: float = 1.0):
+def geo_near_pipeline(
+    longitude: float,
+    latitude: float,
+    max_distance_km: float,
+    query: Optional[dict] = None,
+    after: Optional[tuple] = None,
+    limit: Optional[int] = None
+):
     """
-    Find all amenities within a specified distance from given coordinates.
+    Build an aggregation pipeline that lets MongoDB filter and sort by distance.
+    
+    Requires the GEO_POINT_FIELD 2dsphere index created by script_create_indexes.py.
+    `distance_km` is returned unrounded so it can be used as a pagination key.
     
     Args:
         longitude: Longitude coordinate
         latitude: Latitude coordinate
         max_distance_km: Maximum distance in kilometers
+        query: Additional filter applied by $geoNear before measuring distance (optional)
+        after: (distance_km, 0, _id) keyset position to resume after (optional)
+        limit: Maximum number of documents to return (optional)
         
     Returns:
-        dict: Dictionary with amenities grouped by type
+        list: Pipeline yielding matching documents sorted by `distance_km`
     """
-    # Get all collection references
-    collections = {
-        'parks': db.get_collection("parks"),
-        'public_art': db.get_collection("public_art"),
-        'community_centers': db.get_collection("community_centers"),
-        'libraries': db.get_collection("libraries"),
-        'cultural_spaces': db.get_collection("cultural_spaces"),
-        'public_washrooms': db.get_collection("public_washrooms"),
-        'rapid_transit_stations': db.get_collection("rapid_transit_stations"),
-        'schools': db.get_collection("schools"),
-        'fire_halls': db.get_collection("fire_halls")
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [longitude, latitude]},
+        "key": GEO_POINT_FIELD,
+        "distanceField": "distance_km",
+        "maxDistance": max_distance_km * 1000,  # meters
+        "distanceMultiplier": 0.001,  # report kilometers
+        "spherical": True
     }
+    if query:
+        geo_near["query"] = query
     
-    nearby_amenities = {
-        'parks': [],
-        'public_art': [],
-        'community_centers': [],
-        'libraries': [],
-        'cultural_spaces': [],
-        'public_washrooms': [],
-        'rapid_transit_stations': [],
-        'schools': [],
-        'fire_halls': []
-    }
+    pipeline = [{"$geoNear": geo_near}]
     
-    # Process each amenity type
-    for amenity_type, collection in collections.items():
-        for amenity in collection.find():
-            # Extract coordinates from amenity geom field
-            amenity_lon, amenity_lat = extract_coordinates_from_geom(amenity.get('geom'))
-            
-            if amenity_lon is not None and amenity_lat is not None:
-                # Calculate distance between given coordinates and amenity location
-                calc_distance = haversine_distance(longitude, latitude, amenity_lon, amenity_lat)
-                
-                if calc_distance is not None and calc_distance <= max_distance_km:
-                    amenity_copy = amenity.copy()
-                    amenity_copy["_id"] = str(amenity_copy["_id"])  # Convert ObjectId to string
-                    amenity_copy["distance_km"] = round(calc_distance, 3)
-                    nearby_amenities[amenity_type].append(amenity_copy)
-    
-    # Sort each amenity type by distance
-    for amenity_type in nearby_amenities:
-        nearby_amenities[amenity_type].sort(key=lambda x: x.get('distance_km', float('inf')))
+    if after is not None:
+        after_distance, _, after_id = after
+        # km -> m can round above the stored distance and skip ties; the $match below does the exact cut
+        geo_near["minDistance"] = max(after_distance * 1000 - MIN_DISTANCE_SLACK_M, 0)
+        pipeline.append({
+            "$match": {
+                "$or": [
+                    {"distance_km": {"$gt": after_distance}},
+                    {"distance_km": after_distance, "_id": {"$gt": ObjectId(after_id)}}
+                ]
+            }
+        })
     
-    return nearby_amenities
-
-@app.get("/")
-async def root():
-    return {"message": "Hello World"}
+    if limit is not None:
+        # Break distance ties on _id so pages never overlap or skip documents
+        pipeline.append({"$sort": {"distance_km": 1, "_id": 1}})
+        pipeline.append({"$limit": limit})
+    
+    pipeline.append({"$project": HIDDEN_FIELDS})
+    pipeline.append({"$set": {"_id": {"$toString": "$_id"}}})
+    
+    return pipeline
 
-@app.get("/development-permits")
-async def get_development_permits(
-    lon: Optional[float] = None,
-    lat: Optional[float] = None, 
-    distance: Optional[float] = None
+async def find_nearby_amenities_in_db(
+    longitude: float,
+    latitude: float,
+    max_distance_km: float = 1.0,
+    limit_per_type: Optional[int] = None,
+    round_distances: bool = True
 ):
     """
-    Get development permits that have corresponding impact reports, optionally filtered by distance from a given coordinate.
+    Find all amenities within a specified distance using $geoNear on each amenity collection.
+    
+    Used when the in-memory amenity index is disabled. With `limit_per_type`, $geoNear
+    walks the 2dsphere index nearest first and stops after k documents per collection.
     
     Args:
-        lon: Longitude coordinate (optional)
-        lat: Latitude coordinate (optional)  
-        distance: Maximum distance in kilometers (optional)
+        round_distances: Round `distance_km` to meters for display; False keeps the raw distance
         
     Returns:
-        JSON response with permits (that have impact reports) and total count
-        
-    Examples:
-        GET /development-permits  # All permits with impact reports
-        GET /development-permits?lon=-123.0911&lat=49.2778&distance=5  # Within 5km with impact reports
+        dict: Dictionary with amenities grouped by type, sorted by distance
     """
-    development_permits_collection = db.get_collection("development_permits")
-    impact_reports_collection = db.get_collection("impact_reports")
+    pipeline = geo_near_pipeline(longitude, latitude, max_distance_km, limit=limit_per_type)
     
-    # Get all permit IDs that have impact reports
-    impact_reports_cursor = impact_reports_collection.find({}, {"original_permit_id": 1})
-    permit_ids_with_reports = set(report.get("original_permit_id") for report in impact_reports_cursor)
+    async def query_collection(amenity_type):
+        cursor = await db.get_collection(amenity_type).aggregate(pipeline)
+        amenities = await cursor.to_list(None)
+        if round_distances:
+            for amenity in amenities:
+                amenity["distance_km"] = round(amenity["distance_km"], 3)
+        return amenities
     
-    permits = []
+    # Query the nine collections concurrently instead of one after another
+    results = await asyncio.gather(*(query_collection(amenity_type) for amenity_type in AMENITY_TYPES))
+    return dict(zip(AMENITY_TYPES, results))
+
+async def find_amenities_in_bbox_db(
+    bbox: tuple,
+    limit: Optional[int],
+    limit_per_type: Optional[int],
+    after: Optional[tuple]
+):
+    """
+    Find the amenities inside a lon/lat box using $geoWithin on each amenity collection.
     
-    # If coordinates and distance are provided, filter by distance
-    if lon is not None and lat is not None and distance is not None:
-        for permit in development_permits_collection.find():
-            # Only include permits that have corresponding impact reports
-            permit_id_str = str(permit.get("_id"))
-            if permit_id_str not in permit_ids_with_reports:
-                continue
-                
-            # Extract coordinates from permit geom field
-            permit_lon, permit_lat = extract_coordinates_from_geom(permit.get('geom'))
-            
-            if permit_lon is not None and permit_lat is not None:
-                # Calculate distance between given coordinates and permit location
-                calc_distance = haversine_distance(lon, lat, permit_lon, permit_lat)
-                
-                if calc_distance is not None and calc_distance <= distance:
-                    permit["_id"] = str(permit["_id"])  # Convert ObjectId to string
-                    permit["distance_km"] = round(calc_distance, 3)  # Add distance to response
-                    permit["has_impact_report"] = True  # Indicate that impact report exists
-                    permits.append(permit)
-    else:
-        # Return all permits that have impact reports if no filtering parameters provided
-        for permit in development_permits_collection.find():
-            permit_id_str = str(permit.get("_id"))
-            # Only include permits that have corresponding impact reports
-            if permit_id_str in permit_ids_with_reports:
-                permit["_id"] = str(permit["_id"])  # Convert ObjectId to string
-                permit["has_impact_report"] = True  # Indicate that impact report exists
-                permits.append(permit)
-    
-    # Sort by distance if distance filtering was applied
-    if lon is not None and lat is not None and distance is not None:
-        permits.sort(key=lambda x: x.get('distance_km', float('inf')))
+    Used when the in-memory amenity index is disabled. Each collection returns at most
+    enough documents, in _id order, to fill the page that starts after `after`.
+    `limit_per_type` counts from the first amenity of each type, so it holds across pages.
     
-    return {
-        "total_count": len(permits),
-        "total_permits_with_reports": len(permit_ids_with_reports),
-        "filters_applied": {
-            "longitude": lon,
-            "latitude": lat,
-            "max_distance_km": distance,
-            "only_with_impact_reports": True
-        },
-        "permits": permits
-    }
+    Returns:
+        dict: Dictionary with amenities grouped by type, sorted by _id
+    """
+    async def query_collection(position, amenity_type):
+        query = geo_within_bbox(bbox)
+        fetch_limits = [value for value in (limit_per_type, limit + 1 if limit is not None else None) if value]
+        after_id = None
+        if after is not None:
+            after_position, after_id = after
+            if position < after_position:
+                return []
+            if position > after_position:
+                after_id = None
+            elif limit_per_type is not None:
+                # The type's first `limit_per_type` are read from its start and cut at the cursor below
+                fetch_limits = [limit_per_type]
+            else:
+                query["_id"] = {"$gt": ObjectId(after_id)}
+        
+        mongo_cursor = db.get_collection(amenity_type).find(query, HIDDEN_FIELDS).sort("_id", 1)
+        if fetch_limits:
+            mongo_cursor = mongo_cursor.limit(min(fetch_limits))
+        amenities = await mongo_cursor.to_list(None)
+        for amenity in amenities:
+            amenity["_id"] = str(amenity["_id"])  # Convert ObjectId to string
+        if after_id is not None:
+            amenities = [amenity for amenity in amenities if amenity["_id"] > after_id]
+        return amenities
     
-@app.get("/amenities")
-async def get_amenities(
-    lon: Optional[float] = None,
-    lat: Optional[float] = None, 
-    distance: Optional[float] = None
+    results = await asyncio.gather(*(
+        query_collection(position, amenity_type) for position, amenity_type in enumerate(AMENITY_TYPES)
+    ))
+    return dict(zip(AMENITY_TYPES, results))
+
+async def find_nearby_amenities_for_coordinates(
+    longitude: float,
+    latitude: float,
+    max_distance_km: float = 1.0,
+    limit_per_type: Optional[int] = None
 ):
     """
-    Get all amenities, optionally filtered by distance from a given coordinate.
+    Find all amenities within a specified distance from given coordinates.
     
     Args:
-        lon: Longitude coordinate (optional)
-        lat: Latitude coordinate (optional)  
-        distance: Maximum distance in kilometers (optional)
+        longitude: Longitude coordinate
+        latitude: Latitude coordinate
+        max_distance_km: Maximum distance in kilometers
+        limit_per_type: Keep only the nearest `limit_per_type` amenities of each type (optional)
         
     Returns:
-        JSON response with amenities grouped by type and total count
-        
-    Examples:
-        GET /amenities  # All amenities
-        GET /amenities?lon=-123.0911&lat=49.2778&distance=2  # Within 2km
+        dict: Dictionary with amenities grouped by type
     """
-    # Get all collection references
-    collections = {
-        'parks': db.get_collection("parks"),
-        'public_art': db.get_collection("public_art"),
-        'community_centers': db.get_collection("community_centers"),
-        'libraries': db.get_collection("libraries"),
-        'cultural_spaces': db.get_collection("cultural_spaces"),
-        'public_washrooms': db.get_collection("public_washrooms"),
-        'rapid_transit_stations': db.get_collection("rapid_transit_stations"),
-        'schools': db.get_collection("schools"),
-        'fire_halls': db.get_collection("fire_halls")
-    }
+    if not AMENITY_INDEX_ENABLED:
+        with AMENITY_QUERY_DURATION.labels("mongodb").time():
+            return await find_nearby_amenities_in_db(longitude, latitude, max_distance_km, limit_per_type)
     
-    amenities = {
-        'parks': [],
-        'public_art': [],
-        'community_centers': [],
-        'libraries': [],
-        'cultural_spaces': [],
-        'public_washrooms': [],
-        'rapid_transit_stations': [],
-        'schools': [],
-        'fire_halls': []
-    }
+    # Served from the in-memory spatial index; Mongo is not touched on this path
+    with AMENITY_QUERY_DURATION.labels("index").time():
+        nearby_amenities = amenity_index.query_radius(longitude, latitude, max_distance_km, limit_per_type)
     
-    total_count = 0
+    return nearby_amenities
+
+@app.get("/")
+async def root():
+    return {"message": "Hello World"}
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness probe: the process is up and serving requests. Does not touch dependencies.
     
-    # Process each amenity type
-    for amenity_type, collection in collections.items():
-        for amenity in collection.find():
-            # Convert ObjectId to string
-            amenity["_id"] = str(amenity["_id"])
-            
-            # If coordinates and distance are provided, filter by distance
-            if lon is not None and lat is not None and distance is not None:
-                # Extract coordinates from amenity geom field
-                amenity_lon, amenity_lat = extract_coordinates_from_geom(amenity.get('geom'))
-                
-                if amenity_lon is not None and amenity_lat is not None:
-                    # Calculate distance between given coordinates and amenity location
-                    calc_distance = haversine_distance(lon, lat, amenity_lon, amenity_lat)
-                    
-                    if calc_distance is not None and calc_distance <= distance:
-                        amenity["distance_km"] = round(calc_distance, 3)  # Add distance to response
-                        amenities[amenity_type].append(amenity)
-                        total_count += 1
-            else:
-                # Return all amenities if no filtering parameters provided
-                amenities[amenity_type].append(amenity)
-                total_count += 1
+    Examples:
+        GET /healthz
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness probe: warm-up has finished and MongoDB answers a ping.
     
-    # Sort each amenity type by distance if distance filtering was applied
-    if lon is not None and lat is not None and distance is not None:
-        for amenity_type in amenities:
-            amenities[amenity_type].sort(key=lambda x: x.get('distance_km', float('inf')))
+    Load balancers should only route traffic to workers returning 200 here.
     
-    return {
-        "total_count": total_count,
-        "filters_applied": {
-            "longitude": lon,
-            "latitude": lat,
-            "max_distance_km": distance
-        },
-        "amenities": amenities,
+    Returns:
+        JSON with the loaded data version, amenity count and warm-up time
+        
+    Raises:
+        HTTPException: 503 while warming up, shutting down or when MongoDB is unreachable
+        
+    Examples:
+        GET /readyz
+    """
+    if not ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Warming up"
+        )
+    
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), READINESS_PING_TIMEOUT_SECONDS)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"MongoDB unavailable: {str(e) or type(e).__name__}"
+        )
+    
+    return {
+        "status": "ready",
+        "data_version": data_version,
+        "amenities_indexed": len(amenity_index) if AMENITY_INDEX_ENABLED else None,
+        "snapshot": snapshot.path if snapshot else None,
+        "warmup_seconds": warmup_seconds
+    }
+
+async def iter_permit_page(mongo_cursor, limit: Optional[int], by_distance: bool, page: dict):
+    """
+    Yield API-ready permits from a Mongo cursor, stopping after `limit` documents.
+    
+    The cursor is expected to return one document more than `limit`; if it does,
+    `page["next_cursor"]` is set to the position of the last permit yielded.
+    """
+    position = None
+    count = 0
+    
+    async for permit in mongo_cursor:
+        if limit is not None and count == limit:
+            page["next_cursor"] = encode_cursor(position)
+            break
+        
+        permit["_id"] = str(permit["_id"])  # Convert ObjectId to string
+        if by_distance:
+            position = (permit["distance_km"], 0, permit["_id"])
+            permit["distance_km"] = round(permit["distance_km"], 3)
+        else:
+            position = (0, permit["_id"])
+        
+        count += 1
+        yield permit
+
+async def stream_ndjson(documents, page: Optional[dict] = None):
+    """
+    Encode documents as newline-delimited JSON as they are produced.
+    
+    If `page` carries a `next_cursor` once the documents are exhausted, it is sent
+    as a final `{"next_cursor": ...}` line.
+    """
+    async for document in documents:
+        yield dumps(document) + b"\n"
+    
+    if page and page.get("next_cursor"):
+        yield dumps({"next_cursor": page["next_cursor"]}) + b"\n"
+
+async def open_permits_cursor(
+    lon: Optional[float],
+    lat: Optional[float],
+    distance: Optional[float],
+    limit: Optional[int],
+    after: Optional[tuple],
+    bbox: Optional[tuple] = None
+):
+    """
+    Start the Mongo query behind /development-permits.
+    
+    A `bbox` is matched with $geoWithin on the 2dsphere index, in _id order.
+    
+    Returns:
+        Async cursor over the raw permit documents
+    """
+    development_permits_collection = db.get_collection("development_permits")
+    
+    # `has_impact_report` is kept up to date by script_impact_report_generate.py (and backfilled by
+    # script_create_indexes.py), so this is a single indexed filter instead of a join in Python
+    with_reports = {"has_impact_report": True}
+    
+    # Fetch one extra document to know whether there is a next page
+    fetch_limit = limit + 1 if limit is not None else None
+    
+    # If coordinates and distance are provided, let MongoDB filter and sort by distance
+    if lon is not None and lat is not None and distance is not None:
+        return await development_permits_collection.aggregate(
+            geo_near_pipeline(lon, lat, distance, with_reports, after=after, limit=fetch_limit)
+        )
+    
+    query = dict(with_reports)
+    if bbox is not None:
+        query.update(geo_within_bbox(bbox))
+    if after is not None:
+        query["_id"] = {"$gt": ObjectId(after[1])}
+    mongo_cursor = development_permits_collection.find(query, HIDDEN_FIELDS).sort("_id", 1)
+    if fetch_limit is not None:
+        mongo_cursor = mongo_cursor.limit(fetch_limit)
+    
+    return mongo_cursor
+
+async def build_permits_listing(
+    lon: Optional[float],
+    lat: Optional[float],
+    distance: Optional[float],
+    limit: Optional[int] = None,
+    after: Optional[tuple] = None,
+    bbox: Optional[tuple] = None
+):
+    """
+    Build the JSON body of /development-permits.
+    """
+    by_distance = lon is not None and lat is not None and distance is not None
+    mongo_cursor = await open_permits_cursor(lon, lat, distance, limit, after, bbox)
+    
+    page = {"next_cursor": None}
+    permits = [permit async for permit in iter_permit_page(mongo_cursor, limit, by_distance, page)]
+    total_permits_with_reports = await db.get_collection("development_permits").count_documents(
+        {"has_impact_report": True}
+    )
+    
+    return {
+        "total_count": len(permits),
+        "total_permits_with_reports": total_permits_with_reports,
+        "filters_applied": {
+            "longitude": lon,
+            "latitude": lat,
+            "max_distance_km": distance,
+            "bbox": list(bbox) if bbox else None,
+            "only_with_impact_reports": True
+        },
+        "permits": permits,
+        "next_cursor": page["next_cursor"],
+        "truncated": page["next_cursor"] is not None
+    }
+
+async def permits_payload():
+    """
+    The unfiltered /development-permits listing, pre-serialized for the current data version.
+    """
+    return await payload_cache.get_or_build(
+        "development-permits",
+        data_version,
+        lambda: build_permits_listing(None, None, None)
+    )
+
+@app.get("/development-permits")
+async def get_development_permits(
+    request: Request,
+    lon: Optional[float] = None,
+    lat: Optional[float] = None, 
+    distance: Optional[float] = None,
+    bbox: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Get development permits that have corresponding impact reports, optionally filtered by distance from a given coordinate.
+    
+    Args:
+        lon: Longitude coordinate (optional)
+        lat: Latitude coordinate (optional)  
+        distance: Maximum distance in kilometers (optional)
+        bbox: Only permits inside `min_lon,min_lat,max_lon,max_lat`, at most BBOX_MAX_RESULTS
+            unless `limit` is given (optional, not combined with lon/lat/distance)
+        limit: Maximum number of permits per page (optional)
+        cursor: `next_cursor` from the previous page (optional)
+        accept: Send `Accept: application/x-ndjson` to stream one permit per line
+        
+    Returns:
+        JSON response with permits (that have impact reports), total count and the next page cursor;
+        `truncated` is true when more permits match than were returned.
+        The unfiltered listing is served pre-serialized and compressed, with an ETag.
+        
+    Examples:
+        GET /development-permits  # All permits with impact reports
+        GET /development-permits?lon=-123.0911&lat=49.2778&distance=5  # Within 5km with impact reports
+        GET /development-permits?bbox=-123.14,49.26,-123.09,49.29  # Inside the map viewport
+        GET /development-permits?limit=50&cursor=WzAsIjY4ZTFmMzAzIl0=  # Next page of 50
+    """
+    by_distance = lon is not None and lat is not None and distance is not None
+    bounds = parse_viewport(bbox, lon, lat, distance)
+    if bounds is not None and limit is None:
+        limit = BBOX_MAX_RESULTS
+    after = decode_cursor(cursor, by_distance) if cursor else None
+    
+    if wants_ndjson(accept):
+        mongo_cursor = await open_permits_cursor(lon, lat, distance, limit, after, bounds)
+        page = {"next_cursor": None}
+        permits = iter_permit_page(mongo_cursor, limit, by_distance, page)
+        return StreamingResponse(stream_ndjson(permits, page), media_type=NDJSON_MEDIA_TYPE)
+    
+    unfiltered = lon is None and lat is None and distance is None and bounds is None and limit is None and after is None
+    if unfiltered and not wants_msgpack():
+        return payload_cache.response(await permits_payload(), request.headers)
+    
+    return NegotiatedResponse(await build_permits_listing(lon, lat, distance, limit, after, bounds))
+
+def paginate_amenities(amenities: dict, by_distance: bool, limit: Optional[int], after: Optional[tuple]):
+    """
+    Select one page of amenities in a stable (distance, type, _id) or (type, _id) order.
+    
+    Args:
+        amenities: Amenities grouped by type
+        by_distance: Whether the amenities carry `distance_km` and should be ordered by it
+        limit: Maximum number of amenities on the page (None for no limit)
+        after: Keyset position of the last amenity of the previous page (optional)
+        
+    Returns:
+        tuple: (amenities grouped by type for this page, next page cursor or None)
+    """
+    def sort_key(amenity_type, amenity):
+        key = (AMENITY_TYPES.index(amenity_type), amenity["_id"])
+        return (amenity["distance_km"],) + key if by_distance else key
+    
+    entries = (
+        (sort_key(amenity_type, amenity), amenity_type, amenity)
+        for amenity_type, amenity_list in amenities.items()
+        for amenity in amenity_list
+    )
+    if after is not None:
+        entries = (entry for entry in entries if entry[0] > after)
+    
+    # Keep only the smallest `limit + 1` keys instead of sorting the whole listing
+    if limit is None:
+        selected = sorted(entries, key=lambda entry: entry[0])
+    else:
+        selected = heapq.nsmallest(limit + 1, entries, key=lambda entry: entry[0])
+    
+    next_cursor = None
+    if limit is not None and len(selected) > limit:
+        selected = selected[:limit]
+        next_cursor = encode_cursor(selected[-1][0])
+    
+    page = {amenity_type: [] for amenity_type in amenities}
+    for _, amenity_type, amenity in selected:
+        page[amenity_type].append(amenity)
+    
+    return page, next_cursor
+
+async def iter_amenities(amenities: dict):
+    """
+    Yield amenities one by one, tagged with their `amenity_type`.
+    """
+    for amenity_type, amenity_list in amenities.items():
+        for amenity in amenity_list:
+            yield {**amenity, "amenity_type": amenity_type}
+    
+async def select_amenities(
+    lon: Optional[float],
+    lat: Optional[float],
+    distance: Optional[float],
+    limit_per_type: Optional[int] = None
+):
+    """
+    Amenities for /amenities grouped by type: all of them, or those within `distance` of (lon, lat).
+    
+    `limit_per_type` keeps the nearest k of each type, or the first k in listing
+    order when no location is given.
+    """
+    # Served from the in-memory spatial index built at startup unless it is disabled
+    if lon is not None and lat is not None and distance is not None:
+        return await find_nearby_amenities_for_coordinates(lon, lat, distance, limit_per_type)
+    
+    if not AMENITY_INDEX_ENABLED:
+        amenities = await load_all_amenities()
+        for amenity_list in amenities.values():
+            for amenity in amenity_list:
+                amenity["_id"] = str(amenity["_id"])  # Convert ObjectId to string
+        if limit_per_type is not None:
+            amenities = {amenity_type: amenity_list[:limit_per_type] for amenity_type, amenity_list in amenities.items()}
+    else:
+        # Return all amenities if no filtering parameters provided; only the kept ones are built as documents
+        amenities = amenity_index.all_amenities(limit_per_type)
+    
+    return amenities
+
+async def select_amenities_in_bbox(
+    bbox: tuple,
+    limit: int,
+    limit_per_type: Optional[int] = None,
+    after: Optional[tuple] = None
+):
+    """
+    One page of the amenities inside `bbox`, in (type, _id) order.
+    
+    Returns:
+        tuple: (amenities grouped by type, next page cursor or None)
+    """
+    if not AMENITY_INDEX_ENABLED:
+        with AMENITY_QUERY_DURATION.labels("mongodb").time():
+            amenities = await find_amenities_in_bbox_db(bbox, limit, limit_per_type, after)
+        return paginate_amenities(amenities, False, limit, after)
+    
+    # Only the amenities on the page are built as documents
+    with AMENITY_QUERY_DURATION.labels("index").time():
+        amenities, truncated = amenity_index.query_bbox(
+            *bbox, limit=limit, limit_per_type=limit_per_type, after=after
+        )
+    
+    next_cursor = None
+    if truncated:
+        last_type = [amenity_type for amenity_type, amenity_list in amenities.items() if amenity_list][-1]
+        next_cursor = encode_cursor((AMENITY_TYPES.index(last_type), amenities[last_type][-1]["_id"]))
+    return amenities, next_cursor
+
+def build_amenities_listing(
+    lon: Optional[float],
+    lat: Optional[float],
+    distance: Optional[float],
+    amenities: dict,
+    next_cursor: Optional[str] = None,
+    bbox: Optional[tuple] = None
+):
+    """
+    Build the JSON body of /amenities.
+    """
+    total_count = sum(len(amenity_list) for amenity_list in amenities.values())
+    
+    return {
+        "total_count": total_count,
+        "filters_applied": {
+            "longitude": lon,
+            "latitude": lat,
+            "max_distance_km": distance,
+            "bbox": list(bbox) if bbox else None
+        },
+        "amenities": amenities,
         "count_by_type": {
             amenity_type: len(amenity_list) 
             for amenity_type, amenity_list in amenities.items()
-        }
+        },
+        "next_cursor": next_cursor,
+        "truncated": next_cursor is not None
     }
+
+async def amenities_payload():
+    """
+    The unfiltered /amenities listing, pre-serialized for the current data version.
+    """
+    async def build():
+        return build_amenities_listing(None, None, None, await select_amenities(None, None, None))
+    
+    return await payload_cache.get_or_build("amenities", data_version, build)
+
+async def warm_payloads():
+    """
+    Build the pre-serialized unfiltered listings ahead of the first request for them.
+    """
+    await asyncio.gather(amenities_payload(), permits_payload())
+
+@app.get("/amenities")
+async def get_amenities(
+    request: Request,
+    lon: Optional[float] = None,
+    lat: Optional[float] = None, 
+    distance: Optional[float] = None,
+    bbox: Optional[str] = None,
+    limit_per_type: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Get all amenities, optionally filtered by distance from a given coordinate.
+    
+    Args:
+        lon: Longitude coordinate (optional)
+        lat: Latitude coordinate (optional)  
+        distance: Maximum distance in kilometers (optional)
+        bbox: Only amenities inside `min_lon,min_lat,max_lon,max_lat`, at most BBOX_MAX_RESULTS
+            unless `limit` is given (optional, not combined with lon/lat/distance)
+        limit_per_type: Maximum number of amenities of each type, nearest first (optional)
+        limit: Maximum number of amenities per page, across all types (optional)
+        cursor: `next_cursor` from the previous page (optional)
+        accept: Send `Accept: application/x-ndjson` to stream one amenity per line,
+            tagged with its `amenity_type`
+        
+    Returns:
+        JSON response with amenities grouped by type, total count and the next page cursor;
+        `truncated` is true when more amenities match than were returned.
+        The unfiltered listing is served pre-serialized and compressed, with an ETag.
+        
+    Examples:
+        GET /amenities  # All amenities
+        GET /amenities?bbox=-123.14,49.26,-123.09,49.29  # Inside the map viewport
+        GET /amenities?lon=-123.0911&lat=49.2778&distance=2  # Within 2km
+        GET /amenities?lon=-123.0911&lat=49.2778&distance=2&limit=100  # Nearest 100 within 2km
+        GET /amenities?lon=-123.0911&lat=49.2778&distance=2&limit_per_type=5  # Nearest 5 of each type
+    """
+    by_distance = lon is not None and lat is not None and distance is not None
+    bounds = parse_viewport(bbox, lon, lat, distance)
+    if bounds is not None and limit is None:
+        limit = BBOX_MAX_RESULTS
+    after = decode_cursor(cursor, by_distance) if cursor else None
+    paginated = limit is not None or after is not None
+    
+    unfiltered = lon is None and lat is None and distance is None and limit_per_type is None and not paginated
+    if unfiltered and not wants_ndjson(accept) and not wants_msgpack():
+        return payload_cache.response(await amenities_payload(), request.headers)
+    
+    next_cursor = None
+    if bounds is not None:
+        amenities, next_cursor = await select_amenities_in_bbox(bounds, limit, limit_per_type, after)
+    else:
+        amenities = await select_amenities(lon, lat, distance, limit_per_type)
+        if paginated:
+            amenities, next_cursor = paginate_amenities(amenities, by_distance, limit, after)
+    
+    if wants_ndjson(accept):
+        return StreamingResponse(
+            stream_ndjson(iter_amenities(amenities), {"next_cursor": next_cursor}),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    
+    return NegotiatedResponse(build_amenities_listing(lon, lat, distance, amenities, next_cursor, bounds))
+    
+async def find_nearby_amenities_for_sites(sites: List[tuple], k: int):
+    """
+    Counts, nearest distances and the `k` nearest amenities of several sites.
+    
+    Args:
+        sites: (longitude, latitude, max_distance_km) tuples
+        k: Nearest amenities returned per site
+        
+    Returns:
+        list: One result per site (see `AmenityIndex.query_batch`)
+    """
+    if not AMENITY_INDEX_ENABLED:
+        # Without the shared index, read the collections once for the whole batch rather than once per site
+        with AMENITY_QUERY_DURATION.labels("mongodb").time():
+            batch_index = AmenityIndex().build(await load_all_amenities())
+            return batch_index.query_batch(sites, k)
+    
+    with AMENITY_QUERY_DURATION.labels("index").time():
+        return amenity_index.query_batch(sites, k)
+
+def parse_rings(rings: str) -> tuple:
+    """
+    Parse the `rings` query parameter of /amenities/rings.
+    
+    Returns:
+        tuple: Outer radii in kilometers, ascending
+        
+    Raises:
+        HTTPException: 400 unless it holds 1 to MAX_RINGS increasing positive distances
+    """
+    try:
+        radii = tuple(float(value) for value in rings.split(","))
+    except ValueError:
+        radii = ()
+    
+    if (
+        not 1 <= len(radii) <= MAX_RINGS
+        or not all(math.isfinite(radius) for radius in radii)
+        or radii[0] <= 0
+        or any(inner >= outer for inner, outer in zip(radii, radii[1:]))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"rings must be 1 to {MAX_RINGS} increasing positive distances in km, e.g. 0.25,0.5,1,2"
+        )
+    return radii
+
+async def find_amenity_rings_for_coordinates(longitude: float, latitude: float, ring_radii_km: tuple, k: int):
+    """
+    Summarize the amenities in concentric rings around a location, measuring each distance once.
+    
+    Args:
+        longitude: Longitude coordinate
+        latitude: Latitude coordinate
+        ring_radii_km: Ascending outer radii of the rings in kilometers
+        k: Nearest amenities listed per ring
+        
+    Returns:
+        list: One dict per ring (see `ring_statistics`)
+    """
+    if not AMENITY_INDEX_ENABLED:
+        # One $geoNear per collection out to the outer ring, bucketed afterwards on the raw
+        # distances like the index path; ring_statistics rounds them for display
+        with AMENITY_QUERY_DURATION.labels("mongodb").time():
+            amenities = await find_nearby_amenities_in_db(
+                longitude, latitude, ring_radii_km[-1], round_distances=False
+            )
+        documents = [amenity for amenity_list in amenities.values() for amenity in amenity_list]
+        return ring_statistics(
+            AMENITY_TYPES,
+            [AMENITY_TYPES.index(amenity_type) for amenity_type, amenity_list in amenities.items() for _ in amenity_list],
+            [amenity["distance_km"] for amenity in documents],
+            ring_radii_km,
+            k,
+            lambda positions: [documents[position] for position in positions]
+        )
     
+    with AMENITY_QUERY_DURATION.labels("index").time():
+        return amenity_index.query_rings(longitude, latitude, ring_radii_km, k)
+
+@app.get("/amenities/rings")
+async def get_amenity_rings(
+    lon: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    rings: str = ",".join(f"{radius:g}" for radius in AMENITY_RING_RADII_KM),
+    k: int = Query(5, ge=0, le=MAX_PAGE_SIZE)
+):
+    """
+    Get ring statistics of the amenities around a location: what lies within 250 m, 500 m, 1 km and 2 km.
+    
+    Every amenity within the outer ring is measured once and assigned to its ring,
+    instead of one radius query per ring.
+    
+    Args:
+        lon: Longitude coordinate
+        lat: Latitude coordinate
+        rings: Increasing outer radii in kilometers (default 0.25,0.5,1,2)
+        k: Nearest amenities listed per ring, across types
+        
+    Returns:
+        JSON response with one entry per ring, innermost first: its distance range, `total_count`,
+        `cumulative_count`, `count_by_type` and `nearest` amenities with `distance_km` and `amenity_type`
+        
+    Raises:
+        HTTPException: 400 if `rings` is malformed
+        
+    Examples:
+        GET /amenities/rings?lon=-123.1207&lat=49.2827
+        GET /amenities/rings?lon=-123.1207&lat=49.2827&rings=0.1,0.3&k=0  # Counts only
+    """
+    ring_radii_km = parse_rings(rings)
+    results = await find_amenity_rings_for_coordinates(lon, lat, ring_radii_km, k)
+    
+    return NegotiatedResponse({
+        "longitude": lon,
+        "latitude": lat,
+        "total_count": results[-1]["cumulative_count"],
+        "rings": results
+    })
+
+@app.post("/amenities/nearby/batch")
+async def get_nearby_amenities_batch(request: NearbyBatchRequest):
+    """
+    Compare several candidate sites in one request.
+    
+    All sites are measured against the amenity coordinates in one vectorized pass,
+    instead of one /amenities radius query per site.
+    
+    Args:
+        request: Sites (at most MAX_BATCH_SITES), each with its own radius, and `k`
+        
+    Returns:
+        JSON response with one entry per site, in request order: its `total_count`, `count_by_type`,
+        `nearest_distance_km_by_type` and the `k` `nearest` amenities with `distance_km` and `amenity_type`
+        
+    Examples:
+        POST /amenities/nearby/batch
+        {"sites": [{"longitude": -123.1207, "latitude": 49.2827, "max_distance_km": 1.0}], "k": 5}
+    """
+    sites = [(site.longitude, site.latitude, site.max_distance_km) for site in request.sites]
+    results = await find_nearby_amenities_for_sites(sites, request.k)
+    
+    return NegotiatedResponse({
+        "success": True,
+        "sites": [
+            {"longitude": longitude, "latitude": latitude, "max_distance_km": max_distance_km, **result}
+            for (longitude, latitude, max_distance_km), result in zip(sites, results)
+        ]
+    })
+
+@app.get("/clusters")
+async def get_clusters(
+    bbox: str,
+    zoom: float = Query(..., ge=0, le=24),
+    types: Optional[str] = None
+):
+    """
+    Map clusters of amenities and permits with impact reports inside a bounding box.
+    
+    Points are aggregated into 64 px grid cells of the given zoom, from a pyramid
+    built at startup, so the response stays small however many points are in view.
+    Above CLUSTER_MAX_ZOOM the individual points are returned instead.
+    
+    Args:
+        bbox: Visible area as `min_lon,min_lat,max_lon,max_lat`
+        zoom: Map zoom level (Web Mercator, as used by Mapbox)
+        types: Comma-separated amenity types and/or `development_permits` (optional, all by default)
+        
+    Returns:
+        JSON with `clusters` (count, centroid and `count_by_type` of each cell, at `cluster_zoom`,
+        which is lower than `zoom` for boxes much larger than a screen), or `points`
+        (`_id`, `type` and coordinates) past CLUSTER_MAX_ZOOM, with `truncated` set when
+        more than CLUSTER_MAX_POINTS points are in view
+        
+    Raises:
+        HTTPException: 400 for a malformed bbox or an unknown type
+        
+    Examples:
+        GET /clusters?bbox=-123.23,49.2,-123.02,49.32&zoom=12
+        GET /clusters?bbox=-123.12,49.27,-123.1,49.28&zoom=17&types=parks,development_permits
+    """
+    bounds = parse_bbox(bbox)
+    type_names = [name.strip() for name in types.split(",") if name.strip()] if types else None
+    
+    clusters, points, truncated, cluster_zoom = [], [], False, None
+    try:
+        if int(zoom) > cluster_index.max_cluster_zoom:
+            points, truncated = cluster_index.points(bounds, type_names)
+        else:
+            clusters, cluster_zoom = cluster_index.clusters(bounds, zoom, type_names)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return {
+        "bbox": list(bounds),
+        "zoom": zoom,
+        "cluster_zoom": cluster_zoom,
+        "total_count": sum(cluster["count"] for cluster in clusters) + len(points),
+        "clusters": clusters,
+        "points": points,
+        "truncated": truncated
+    }
+
 @app.get("/impact_reports/{permit_id}")
 async def get_impact_reports(permit_id: str):
     """
@@ -382,7 +1459,7 @@ async def get_impact_reports(permit_id: str):
     
     try:
         # Find the report by original_permit_id
-        report = impact_reports_collection.find_one({"original_permit_id": permit_id})
+        report = await impact_reports_collection.find_one({"original_permit_id": permit_id})
         
         if not report:
             raise HTTPException(
@@ -390,41 +1467,12 @@ async def get_impact_reports(permit_id: str):
                 detail=f"Impact report for permit ID '{permit_id}' not found"
             )
         
-        # Convert MongoDB document to JSON-serializable format
-        def convert_mongodb_types(obj):
-            """Recursively convert MongoDB types to JSON-serializable types."""
-            if isinstance(obj, dict):
-                # Handle MongoDB extended JSON types
-                if "$oid" in obj:
-                    return obj["$oid"]
-                elif "$numberInt" in obj:
-                    return int(obj["$numberInt"])
-                elif "$numberDouble" in obj:
-                    return float(obj["$numberDouble"])
-                elif "$date" in obj:
-                    return obj["$date"]
-                else:
-                    # Recursively process dictionary
-                    return {key: convert_mongodb_types(value) for key, value in obj.items()}
-            elif isinstance(obj, list):
-                # Recursively process list items
-                return [convert_mongodb_types(item) for item in obj]
-            else:
-                # Return primitive types as-is
-                return obj
-        
-        # Convert the report using our conversion function
-        converted_report = convert_mongodb_types(report)
-        
-        # Ensure _id is a string
-        if "_id" in converted_report:
-            converted_report["_id"] = str(converted_report["_id"])
-        
-        return {
+        # ObjectIds and dates are encoded by the response class, so the document is returned as read
+        return NegotiatedResponse({
             "success": True,
             "permit_id": permit_id,
-            "report": converted_report
-        }
+            "report": report
+        })
 
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -435,6 +1483,96 @@ async def get_impact_reports(permit_id: str):
             detail=f"Error retrieving impact report: {str(e)}"
         )
 
+@app.post("/impact_reports/batch")
+async def get_impact_reports_batch(request: ImpactReportBatchRequest):
+    """
+    Get the impact reports of several permits with a single query.
+    
+    Args:
+        request: Permit IDs (at most MAX_BATCH_REPORT_IDS) and an optional field projection
+        
+    Returns:
+        JSON response with the reports keyed by permit ID and the IDs without a report
+        
+    Raises:
+        HTTPException: 400 if a projected field name is invalid
+        
+    Examples:
+        POST /impact_reports/batch
+        {"permit_ids": ["68e1f303607bd68421537e47"], "fields": ["AnalysisSummary"]}
+    """
+    permit_ids = list(dict.fromkeys(request.permit_ids))
+    
+    projection = None
+    if request.fields:
+        if any(not field or field.startswith("$") for field in request.fields):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Field names must be non-empty and cannot start with '$'"
+            )
+        # original_permit_id is always read, to key the reports
+        projection = {field: 1 for field in request.fields}
+        projection["original_permit_id"] = 1
+    
+    impact_reports_collection = db.get_collection("impact_reports")
+    
+    try:
+        # One indexed $in query (see script_create_indexes.py) instead of a find_one per permit
+        documents = await impact_reports_collection.find(
+            {"original_permit_id": {"$in": permit_ids}}, projection
+        ).to_list(None)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving impact reports: {str(e)}"
+        )
+    
+    reports = {}
+    for report in documents:
+        # Like GET /impact_reports/{permit_id}, the first report found for a permit wins
+        reports.setdefault(report["original_permit_id"], report)
+    
+    return NegotiatedResponse({
+        "success": True,
+        "reports": reports,
+        "missing": [permit_id for permit_id in permit_ids if permit_id not in reports]
+    })
+
+# OpenAI prompt from the script
+IMPACT_ANALYSIS_PROMPT = """You are an expert urban planning data analyst. Your function is to process a building permit JSON and analyze its impact on EACH nearby infrastructure item by applying a multi-factor, reason-based analytical framework. Your core task is to move beyond simple formulas and apply nuanced, context-aware reasoning. For each item, you must consider both the potential positive and negative impacts, justifying why one may outweigh the other. The justification is the most important field; the impactScore must be a logical conclusion of the justification. Your entire output MUST be a single, valid JSON object. Do not include any text, explanations, or markdown outside of the JSON. OUTPUT JSON FORMAT: JSON { "AnalysisSummary": { "_id": "hypothetical_" + current_timestamp, "title": "A concise summary of the development project.", "description": "A factual, 1-2 sentence description summarizing the 'projectdescription' field.", "overallImportance": "An integer from 1-10, calculated using the rubric below." }, "AnalyzedInfrastructure": [ { "_id": "The original _id of the infrastructure item, for linking.", "name": "The name of the infrastructure item.", "type": "The category of the infrastructure (e.g., 'parks', 'schools').", "impactScore": "An integer from -10 to 10, derived from your reasoned justification. -10 being terrible, 0 neutral, 10 very positive", "quantitativeImpact": "A string representing a plausible numerical impact (e.g., '~5% increase in enrollment' or 'Minor access disruption').", "justification": "A 1-2 sentence explanation of the reasoning that produced the impact score, weighing both positive and negative factors based on the principles below." } ] }"""
+
+IMPACT_ANALYSIS_MODEL = "gpt-4.1-nano"
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def impact_analysis_messages(permit_data: dict):
+    """
+    Chat messages asking the model to analyze one (hypothetical) permit.
+    """
+    # Compact encoding: no geometry or empty fields, one table per amenity type. Prompt sizes are
+    # tracked by openai_tokens_total from each response's usage, and by bench_prompt_encoding.py
+    permit_payload = encode_permit_for_prompt(permit_data)
+    
+    return [
+        {
+            "role": "system",
+            "content": IMPACT_ANALYSIS_PROMPT
+        },
+        {
+            "role": "user", 
+            "content": f"Here is the hypothetical development permit to analyze:\n{permit_payload}"
+        }
+    ]
+
+def add_hypothetical_metadata(parsed_json: dict):
+    """
+    Add the metadata fields every hypothetical analysis carries.
+    """
+    parsed_json["generated_at"] = time.time()
+    parsed_json["hypothetical"] = True
+    parsed_json["original_permit_id"] = f"hypothetical_{int(time.time())}"
+    return parsed_json
+
 async def generate_hypothetical_impact_analysis(permit_data: dict):
     """
     Generate a hypothetical impact analysis using OpenAI based on permit data and nearby amenities.
@@ -444,43 +1582,39 @@ async def generate_hypothetical_impact_analysis(permit_data: dict):
         
     Returns:
         dict: Parsed JSON impact analysis or None if failed
+        
+    Raises:
+        AdmissionRejected: 429/503 if no OpenAI slot is available in time (see `llm_admission`)
     """
-    # OpenAI prompt from the script
-    PROMPT = """You are an expert urban planning data analyst. Your function is to process a building permit JSON and analyze its impact on EACH nearby infrastructure item by applying a multi-factor, reason-based analytical framework. Your core task is to move beyond simple formulas and apply nuanced, context-aware reasoning. For each item, you must consider both the potential positive and negative impacts, justifying why one may outweigh the other. The justification is the most important field; the impactScore must be a logical conclusion of the justification. Your entire output MUST be a single, valid JSON object. Do not include any text, explanations, or markdown outside of the JSON. OUTPUT JSON FORMAT: JSON { "AnalysisSummary": { "_id": "hypothetical_" + current_timestamp, "title": "A concise summary of the development project.", "description": "A factual, 1-2 sentence description summarizing the 'projectdescription' field.", "overallImportance": "An integer from 1-10, calculated using the rubric below." }, "AnalyzedInfrastructure": [ { "_id": "The original _id of the infrastructure item, for linking.", "name": "The name of the infrastructure item.", "type": "The category of the infrastructure (e.g., 'parks', 'schools').", "impactScore": "An integer from -10 to 10, derived from your reasoned justification. -10 being terrible, 0 neutral, 10 very positive", "quantitativeImpact": "A string representing a plausible numerical impact (e.g., '~5% increase in enrollment' or 'Minor access disruption').", "justification": "A 1-2 sentence explanation of the reasoning that produced the impact score, weighing both positive and negative factors based on the principles below." } ] }"""
-
     try:
-        # Convert permit data to JSON string
-        permit_json = json.dumps(permit_data, default=str)
-        
-        # Use the async chat completions API
-        response = await OpenAIClient.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=[
-                {
-                    "role": "system",
-                    "content": PROMPT
-                },
-                {
-                    "role": "user", 
-                    "content": f"Here is the hypothetical development permit JSON to analyze:\n{permit_json}"
-                }
-            ],
-            temperature=0.8,
-            max_tokens=1500,
-            response_format={"type": "json_object"}
-        )
+        # Bounded number of concurrent calls; the excess is shed with 429/503 instead of piling up
+        async with llm_admission.slot():
+            start_time = time.perf_counter()
+            try:
+                # Use the async chat completions API
+                response = await OpenAIClient.chat.completions.create(
+                    model=IMPACT_ANALYSIS_MODEL,
+                    messages=impact_analysis_messages(permit_data),
+                    temperature=0.8,
+                    max_tokens=1500,
+                    response_format={"type": "json_object"}
+                )
+            except Exception:
+                OPENAI_FAILURES.labels(IMPACT_ANALYSIS_MODEL).inc()
+                raise
+            OPENAI_REQUEST_DURATION.labels(IMPACT_ANALYSIS_MODEL, "false").observe(time.perf_counter() - start_time)
+        record_openai_usage(IMPACT_ANALYSIS_MODEL, response.usage)
         
         # Extract and parse the response
         response_text = response.choices[0].message.content
         parsed_json = json.loads(response_text)
         
         # Add metadata
-        parsed_json["generated_at"] = time.time()
-        parsed_json["hypothetical"] = True
-        parsed_json["original_permit_id"] = f"hypothetical_{int(time.time())}"
-        
-        return parsed_json
+        return add_hypothetical_metadata(parsed_json)
         
+    except AdmissionRejected:
+        # Passed on to the client with its Retry-After header
+        raise
     except json.JSONDecodeError as e:
         print(f"JSON parsing error for hypothetical permit: {e}")
         return None
@@ -488,6 +1622,165 @@ async def generate_hypothetical_impact_analysis(permit_data: dict):
         print(f"Error generating hypothetical analysis: {e}")
         return None
 
+async def stream_hypothetical_impact_analysis(permit_data: dict):
+    """
+    Generate a hypothetical impact analysis like `generate_hypothetical_impact_analysis`,
+    yielding the JSON text as the model produces it.
+    
+    Args:
+        permit_data: Dictionary containing the permit information with nearby amenities
+        
+    Yields:
+        str: Successive pieces of the analysis JSON
+        
+    Raises:
+        AdmissionRejected: 429/503 if no OpenAI slot is available in time (see `llm_admission`)
+    """
+    # The slot is held until the last token, since the call is open that long
+    async with llm_admission.slot():
+        start_time = time.perf_counter()
+        first_token = True
+        
+        try:
+            stream = await OpenAIClient.chat.completions.create(
+                model=IMPACT_ANALYSIS_MODEL,
+                messages=impact_analysis_messages(permit_data),
+                temperature=0.8,
+                max_tokens=1500,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True}  # Token counts arrive in a final chunk
+            )
+            
+            async for chunk in stream:
+                record_openai_usage(IMPACT_ANALYSIS_MODEL, getattr(chunk, "usage", None))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        OPENAI_FIRST_TOKEN.labels(IMPACT_ANALYSIS_MODEL).observe(time.perf_counter() - start_time)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            OPENAI_FAILURES.labels(IMPACT_ANALYSIS_MODEL).inc()
+            raise
+        
+        OPENAI_REQUEST_DURATION.labels(IMPACT_ANALYSIS_MODEL, "true").observe(time.perf_counter() - start_time)
+
+def hypothetical_cache_key(request: HypotheticalDevelopmentRequest) -> str:
+    """
+    Normalize a hypothetical report request into a cache key.
+    
+    Coordinates are rounded to HYPOTHETICAL_CACHE_COORD_PRECISION decimals and the
+    description is case- and whitespace-normalized, so requests for the same site
+    and project share one analysis. The address is not part of the key.
+    """
+    description = " ".join(request.project_description.lower().split())
+    normalized = {
+        "coordinates": [
+            round(request.longitude, HYPOTHETICAL_CACHE_COORD_PRECISION),
+            round(request.latitude, HYPOTHETICAL_CACHE_COORD_PRECISION)
+        ],
+        "description_sha256": hashlib.sha256(description.encode()).hexdigest(),
+        "project_value": request.project_value,
+        "property_use": sorted(request.property_use or []),
+        "specific_use_category": sorted(request.specific_use_category or []),
+        "max_distance_km": request.max_distance_km,
+        "limit_per_type": request.limit_per_type
+    }
+    return json.dumps(normalized, sort_keys=True)
+
+def build_hypothetical_permit(request: HypotheticalDevelopmentRequest, nearby_amenities: dict):
+    """
+    Create a permit-like data structure for analysis.
+    """
+    return {
+        "_id": f"hypothetical_{int(time.time())}",
+        "projectvalue": request.project_value,
+        "address": request.address or f"{request.latitude}, {request.longitude}",
+        "projectdescription": request.project_description,
+        "propertyuse": request.property_use,
+        "specificusecategory": request.specific_use_category,
+        "geolocalarea": "Hypothetical Location",
+        "geom": {
+            "type": "Feature",
+            "geometry": {
+                "coordinates": [request.longitude, request.latitude],
+                "type": "Point"
+            },
+            "properties": {}
+        },
+        "permitnumbercreateddate": time.strftime("%Y-%m-%d"),
+        "issuedate": "Hypothetical",
+        "permitelapseddays": 0,
+        "distance_km": 0.0,
+        "buildings_nearby": nearby_amenities
+    }
+
+def summarize_nearby_amenities(request: HypotheticalDevelopmentRequest, nearby_amenities: dict):
+    """
+    Count nearby amenities for the report summary.
+    """
+    total_nearby_amenities = sum(len(amenities) for amenities in nearby_amenities.values())
+    amenities_by_type = {amenity_type: len(amenities) for amenity_type, amenities in nearby_amenities.items()}
+    
+    return {
+        "total_count": total_nearby_amenities,
+        "count_by_type": amenities_by_type,
+        "search_radius_km": request.max_distance_km
+    }
+
+async def analyze_hypothetical_development(request: HypotheticalDevelopmentRequest):
+    """
+    Look up nearby amenities and run the LLM analysis for a hypothetical development.
+    
+    Returns:
+        dict: `nearby_amenities_summary` and `impact_analysis` sections of the report
+        
+    Raises:
+        HTTPException: 500 if the analysis could not be generated
+    """
+    # Find nearby amenities
+    nearby_amenities = await find_nearby_amenities_for_coordinates(
+        request.longitude, 
+        request.latitude, 
+        request.max_distance_km,
+        request.limit_per_type
+    )
+    
+    # Generate impact analysis
+    analysis = await generate_hypothetical_impact_analysis(build_hypothetical_permit(request, nearby_amenities))
+    
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate impact analysis"
+        )
+    
+    return {
+        "nearby_amenities_summary": summarize_nearby_amenities(request, nearby_amenities),
+        "impact_analysis": analysis
+    }
+
+def hypothetical_report_body(request: HypotheticalDevelopmentRequest, result: dict):
+    """
+    Build the JSON body of /hypothetical-impact-report from an analysis result.
+    """
+    return {
+        "success": True,
+        "hypothetical": True,
+        "input_parameters": {
+            "coordinates": [request.longitude, request.latitude],
+            "max_distance_km": request.max_distance_km,
+            "limit_per_type": request.limit_per_type,
+            "project_description": request.project_description,
+            "project_value": request.project_value,
+            "address": request.address,
+            "property_use": request.property_use,
+            "specific_use_category": request.specific_use_category
+        },
+        "nearby_amenities_summary": result["nearby_amenities_summary"],
+        "impact_analysis": result["impact_analysis"]
+    }
+
 @app.post("/hypothetical-impact-report")
 async def generate_hypothetical_impact_report(request: HypotheticalDevelopmentRequest):
     """
@@ -513,69 +1806,13 @@ async def generate_hypothetical_impact_report(request: HypotheticalDevelopmentRe
         }
     """
     try:
-        # Find nearby amenities
-        nearby_amenities = await find_nearby_amenities_for_coordinates(
-            request.longitude, 
-            request.latitude, 
-            request.max_distance_km
+        # Identical requests share one cached (or in-flight) analysis instead of calling the LLM again
+        result = await hypothetical_report_cache.get_or_compute(
+            hypothetical_cache_key(request),
+            lambda: analyze_hypothetical_development(request)
         )
         
-        # Create a permit-like data structure for analysis
-        hypothetical_permit = {
-            "_id": f"hypothetical_{int(time.time())}",
-            "projectvalue": request.project_value,
-            "address": request.address or f"{request.latitude}, {request.longitude}",
-            "projectdescription": request.project_description,
-            "propertyuse": request.property_use,
-            "specificusecategory": request.specific_use_category,
-            "geolocalarea": "Hypothetical Location",
-            "geom": {
-                "type": "Feature",
-                "geometry": {
-                    "coordinates": [request.longitude, request.latitude],
-                    "type": "Point"
-                },
-                "properties": {}
-            },
-            "permitnumbercreateddate": time.strftime("%Y-%m-%d"),
-            "issuedate": "Hypothetical",
-            "permitelapseddays": 0,
-            "distance_km": 0.0,
-            "buildings_nearby": nearby_amenities
-        }
-        
-        # Generate impact analysis
-        analysis = await generate_hypothetical_impact_analysis(hypothetical_permit)
-        
-        if not analysis:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate impact analysis"
-            )
-        
-        # Count nearby amenities for summary
-        total_nearby_amenities = sum(len(amenities) for amenities in nearby_amenities.values())
-        amenities_by_type = {amenity_type: len(amenities) for amenity_type, amenities in nearby_amenities.items()}
-        
-        return {
-            "success": True,
-            "hypothetical": True,
-            "input_parameters": {
-                "coordinates": [request.longitude, request.latitude],
-                "max_distance_km": request.max_distance_km,
-                "project_description": request.project_description,
-                "project_value": request.project_value,
-                "address": request.address,
-                "property_use": request.property_use,
-                "specific_use_category": request.specific_use_category
-            },
-            "nearby_amenities_summary": {
-                "total_count": total_nearby_amenities,
-                "count_by_type": amenities_by_type,
-                "search_radius_km": request.max_distance_km
-            },
-            "impact_analysis": analysis
-        }
+        return NegotiatedResponse(hypothetical_report_body(request, result))
 
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -584,4 +1821,253 @@ async def generate_hypothetical_impact_report(request: HypotheticalDevelopmentRe
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating hypothetical impact report: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+async def run_hypothetical_job(request_data: dict):
+    """
+    Produce the report of one hypothetical job, sharing the cache of POST /hypothetical-impact-report.
+    
+    Args:
+        request_data: The HypotheticalDevelopmentRequest stored with the job
+        
+    Returns:
+        dict: Same body as POST /hypothetical-impact-report
+    """
+    request = HypotheticalDevelopmentRequest.model_validate(request_data)
+    result = await hypothetical_report_cache.get_or_compute(
+        hypothetical_cache_key(request),
+        lambda: analyze_hypothetical_development(request)
+    )
+    return hypothetical_report_body(request, result)
+
+hypothetical_jobs = JobQueue(
+    run=run_hypothetical_job,
+    workers=HYPOTHETICAL_JOB_WORKERS,
+    ttl_seconds=HYPOTHETICAL_JOB_TTL_SECONDS,
+    lease_seconds=HYPOTHETICAL_JOB_LEASE_SECONDS,
+)
+
+def job_body(job: dict):
+    """
+    Build the JSON body describing a job, with its result or error once finished.
+    """
+    body = {
+        "success": True,
+        "job_id": job["_id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['_id']}",
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at")
+    }
+    for field in ("result", "error"):
+        if field in job:
+            body[field] = job[field]
+    return body
+
+@app.post("/hypothetical-impact-report/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_hypothetical_impact_report_job(request: HypotheticalDevelopmentRequest):
+    """
+    Queue a hypothetical impact report and return its job id without waiting for the LLM.
+    
+    The job id is derived from the same normalized key as the report cache, so
+    retried or repeated submissions return the existing job instead of queueing
+    new work. Poll `status_url` (GET /jobs/{job_id}) for the result.
+    
+    Args:
+        request: HypotheticalDevelopmentRequest containing project details and coordinates
+        
+    Returns:
+        JSON response with the job id, status and status URL
+        
+    Examples:
+        POST /hypothetical-impact-report/jobs
+        {
+            "longitude": -123.1207,
+            "latitude": 49.2827,
+            "project_description": "To construct a 6-storey building with 45 dwelling units",
+            "max_distance_km": 1.0
+        }
+    """
+    try:
+        job = await hypothetical_jobs.submit(hypothetical_cache_key(request), request.model_dump())
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error submitting hypothetical impact report job: {str(e)}"
+        )
+    
+    return job_body(job)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get the status of a job and, once it succeeded, its result.
+    
+    Args:
+        job_id: Job id returned when the job was submitted
+        
+    Returns:
+        JSON response with `status` (queued, running, succeeded or failed) and
+        `result` or `error` once the job finished
+        
+    Raises:
+        HTTPException: 404 if the job does not exist or has expired
+        
+    Examples:
+        GET /jobs/3f1c9a0e6b2d4e7f8a9b0c1d2e3f4a5b
+    """
+    try:
+        job = await hypothetical_jobs.get(job_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving job: {str(e)}"
+        )
+    
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job '{job_id}' not found"
+        )
+    
+    return NegotiatedResponse(job_body(job))
+
+def sse_event(event: str, data) -> bytes:
+    """
+    Encode one Server-Sent Event with a JSON payload.
+    """
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+async def stream_hypothetical_report_events(request: HypotheticalDevelopmentRequest):
+    """
+    Produce the Server-Sent Events of /hypothetical-impact-report/stream.
+    
+    Yields:
+        bytes: `amenities`, then one `infrastructure` event per analyzed item, then
+            `report` (or `error`)
+    """
+    cache_key = hypothetical_cache_key(request)
+    cached = hypothetical_report_cache.get(cache_key)
+    
+    if cached is not None:
+        yield sse_event("amenities", cached["nearby_amenities_summary"])
+        for item in cached["impact_analysis"].get("AnalyzedInfrastructure", []):
+            yield sse_event("infrastructure", item)
+        yield sse_event("report", hypothetical_report_body(request, cached))
+        return
+    
+    nearby_amenities = await find_nearby_amenities_for_coordinates(
+        request.longitude, 
+        request.latitude, 
+        request.max_distance_km,
+        request.limit_per_type
+    )
+    nearby_amenities_summary = summarize_nearby_amenities(request, nearby_amenities)
+    
+    # Sent before the LLM is called, so the first byte only waits for the amenity lookup
+    yield sse_event("amenities", nearby_amenities_summary)
+    
+    parser = ArrayItemParser("AnalyzedInfrastructure")
+    response_text = []
+    
+    try:
+        async for text in stream_hypothetical_impact_analysis(build_hypothetical_permit(request, nearby_amenities)):
+            response_text.append(text)
+            for item in parser.feed(text):
+                try:
+                    item = AnalyzedInfrastructure.model_validate(item).model_dump(by_alias=True)
+                except ValidationError:
+                    continue  # Reported by the validation of the full analysis below
+                yield sse_event("infrastructure", item)
+        
+        analysis = ImpactAnalysis.model_validate_json("".join(response_text)).model_dump(by_alias=True)
+    except AdmissionRejected as e:
+        # The 200 and the amenities are already sent, so the rejection travels as an event
+        yield sse_event("error", {"detail": e.detail, "retry_after": e.retry_after})
+        return
+    except ValidationError as e:
+        print(f"Invalid impact analysis for hypothetical permit: {e}")
+        yield sse_event("error", {"detail": "Failed to generate impact analysis"})
+        return
+    except Exception as e:
+        print(f"Error generating hypothetical analysis: {e}")
+        yield sse_event("error", {"detail": "Failed to generate impact analysis"})
+        return
+    
+    result = {
+        "nearby_amenities_summary": nearby_amenities_summary,
+        "impact_analysis": add_hypothetical_metadata(analysis)
+    }
+    hypothetical_report_cache.set(cache_key, result)
+    
+    yield sse_event("report", hypothetical_report_body(request, result))
+
+@app.post("/hypothetical-impact-report/stream")
+async def stream_hypothetical_impact_report(request: HypotheticalDevelopmentRequest):
+    """
+    Generate a hypothetical impact report, streamed as Server-Sent Events while the LLM writes it.
+    
+    Events:
+        amenities: `nearby_amenities_summary`, sent as soon as the amenity lookup is done
+        infrastructure: One validated `AnalyzedInfrastructure` item, as soon as it is complete
+        report: The full validated report, same body as POST /hypothetical-impact-report
+        error: `{"detail": ...}` if the analysis could not be generated, with `retry_after`
+            (seconds) when it was shed because too many analyses were running
+        
+    Args:
+        request: HypotheticalDevelopmentRequest containing project details and coordinates
+        
+    Examples:
+        POST /hypothetical-impact-report/stream
+        {
+            "longitude": -123.1207,
+            "latitude": 49.2827,
+            "project_description": "To construct a 6-storey building with 45 dwelling units",
+            "max_distance_km": 1.0
+        }
+    """
+    return StreamingResponse(
+        stream_hypothetical_report_events(request),
+        media_type=SSE_MEDIA_TYPE,
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Keep reverse proxies from buffering the stream
+        }
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics: per-route latency, MongoDB command durations and documents
+    returned per collection, OpenAI latency and token usage, and cache hit ratios.
+    
+    Examples:
+        GET /metrics
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """
+    Concurrency, queue depth and rejection counters of the OpenAI admission controller
+    and of this process's hypothetical report job queue.
+    
+    Examples:
+        GET /admission/stats
+    """
+    return {"openai": llm_admission.stats(), "hypothetical_jobs": hypothetical_jobs.stats()}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Hit/miss counters of the in-process response caches.
+    
+    Examples:
+        GET /cache/stats
+    """
+    return {
+        "data_version": data_version,
+        "hypothetical_impact_report": hypothetical_report_cache.stats(),
+        "payloads": payload_cache.stats()
+    }
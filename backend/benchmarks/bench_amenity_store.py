@@ -0,0 +1,105 @@
+"""
+Measure the memory the amenity index holds per amenity, before and after AmenityStore.
+
+"Before" is what AmenityIndex kept until it stored amenities in columns: one dict per
+amenity with a string `_id` and nested GeoJSON, plus a PointArray with precomputed
+terms. "After" is a built AmenityIndex, its AmenityStore columns included. Both are
+measured with tracemalloc over the same synthetic Vancouver documents as microbench.py,
+in separate phases so only one set is alive at a time; 1M amenities need about 5 GB.
+
+Usage (from backend/):
+    python benchmarks/bench_amenity_store.py [--amenities 1000000] [--min-ratio 10]
+"""
+import os
+import sys
+import gc
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from amenity_index import AmenityIndex
+from geo import PointArray
+from microbench import synthetic_documents, split_by_type
+
+
+def traced(function):
+    """
+    Call `function` under tracemalloc and return (its result, bytes still allocated after it, peak bytes).
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+
+def document_index(count):
+    documents = synthetic_documents(count)
+    for document in documents:
+        document["_id"] = str(document["_id"])
+    return documents, PointArray.from_documents(documents)
+
+
+def store_index(documents_by_type):
+    return AmenityIndex().build(documents_by_type)
+
+
+def column_bytes(index):
+    """
+    Bytes of each array the index holds, largest first.
+    """
+    store = index.store
+    arrays = {
+        **{f"points.{name}": array for name, array in store.points.arrays().items()},
+        "ids": store.ids,
+        "type_codes": store.type_codes,
+        "schema_codes": store._schema_codes,
+        "value_offsets": store._value_offsets,
+        "value_codes": store._value_codes,
+        "values.offsets": store._values.offsets,
+        "listing_order": index._listing_order,
+    }
+    sizes = {name: array.nbytes for name, array in arrays.items()}
+    sizes["values.buffer"] = len(store._values.buffer)
+    return sorted(sizes.items(), key=lambda item: -item[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--amenities", type=int, default=1_000_000)
+    parser.add_argument("--min-ratio", type=float, default=10.0, help="Exit 1 if before/after is smaller than this")
+    args = parser.parse_args()
+    count = args.amenities
+
+    before, before_bytes, _ = traced(lambda: document_index(count))
+    del before
+
+    documents_by_type = split_by_type(synthetic_documents(count))
+    # The documents were allocated before tracing started, so freeing them is not counted
+    index, after_bytes, build_peak = traced(lambda: store_index(documents_by_type))
+    del documents_by_type
+    gc.collect()
+
+    ratio = before_bytes / after_bytes
+    print(f"{count:,} amenities")
+    print(f"  before: documents + PointArray  {before_bytes / count:8.1f} B/amenity  {before_bytes / 2**20:9.1f} MiB")
+    print(
+        f"  after:  AmenityIndex            {after_bytes / count:8.1f} B/amenity  {after_bytes / 2**20:9.1f} MiB"
+        f"  (build peak {build_peak / 2**20:.1f} MiB)"
+    )
+    for name, size in column_bytes(index):
+        print(f"    {name:22} {size / count:8.1f} B/amenity")
+    print(f"  {ratio:.2f}x smaller (target {args.min_ratio:g}x)")
+
+    if ratio < args.min_ratio:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
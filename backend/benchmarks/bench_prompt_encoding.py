@@ -0,0 +1,140 @@
+"""
+Measure the prompt payload of the compact encoding in prompt_encoding.py against plain json.dumps.
+
+By default the stored EXAMPLE permit from script_impact_report_generate.py is
+surrounded with synthetic amenities shaped like the City of Vancouver records
+(same fields, GeoJSON `geom`, null values), at 1 km and 2 km radii. With
+--from-db, permits are read from `enhanced_development_permits` instead.
+
+Usage (from backend/):
+    python benchmarks/bench_prompt_encoding.py [--radius-km 1.0 2.0]
+    python benchmarks/bench_prompt_encoding.py --from-db 20
+"""
+import os
+import sys
+import ast
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amenity_index import AmenityIndex, AMENITY_TYPES
+from geo import extract_coordinates_from_geom
+from prompt_encoding import encode_permit_for_prompt, count_tokens
+
+# Rough bounding box of the City of Vancouver
+VANCOUVER_BBOX = (-123.23, 49.19, -123.02, 49.32)
+
+# script_create_db.py fetches two pages of 100 records per dataset
+AMENITIES_PER_TYPE = 200
+
+# Fields selected for each dataset in script_create_db.py, besides `geom`
+AMENITY_FIELDS = {
+    'parks': ('name', 'streetnumber', 'streetname', 'neighbourhoodname', 'hectare', 'googlemapdest'),
+    'public_art': ('title_of_work', 'type', 'status', 'sitename', 'siteaddress', 'neighbourhood', 'geo_local_area'),
+    'community_centers': ('name', 'address', 'geo_local_area'),
+    'libraries': ('address', 'name', 'geo_local_area'),
+    'cultural_spaces': ('cultural_space_name', 'active_space', 'primary_use', 'address', 'local_area', 'square_feet'),
+    'public_washrooms': ('park_name', 'location', 'geo_local_area'),
+    'rapid_transit_stations': ('station', 'geo_local_area'),
+    'schools': ('address', 'school_name'),
+    'fire_halls': ('name', 'address'),
+}
+
+
+def load_example_permit():
+    """
+    Read the EXAMPLE permit from script_impact_report_generate.py without running its setup code.
+    """
+    script_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "script_impact_report_generate.py")
+    with open(script_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == "EXAMPLE" for target in node.targets):
+            # The example keeps the raw line breaks of the description
+            return json.loads(ast.literal_eval(node.value), strict=False)
+    raise RuntimeError("EXAMPLE permit not found")
+
+
+def synthetic_amenities(seed=0):
+    """
+    AMENITIES_PER_TYPE records per type with the dataset's fields, some of them null.
+    """
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = VANCOUVER_BBOX
+    amenities_by_type = {}
+    for amenity_type in AMENITY_TYPES:
+        amenities = []
+        for number in range(AMENITIES_PER_TYPE):
+            lon = float(rng.uniform(min_lon, max_lon))
+            lat = float(rng.uniform(min_lat, max_lat))
+            amenity = {"_id": f"{amenity_type[:4]}{number:020d}"}
+            for field in AMENITY_FIELDS[amenity_type]:
+                # About one value in six is missing in the open data
+                amenity[field] = None if rng.random() < 0.16 else f"{field.replace('_', ' ').title()} {number}"
+            amenity["geom"] = {
+                "type": "Feature",
+                "geometry": {"coordinates": [lon, lat], "type": "Point"},
+                "properties": {}
+            }
+            amenities.append(amenity)
+        amenities_by_type[amenity_type] = amenities
+    return amenities_by_type
+
+
+def example_permits(radii):
+    permit = load_example_permit()
+    lon, lat = extract_coordinates_from_geom(permit["geom"])
+    index = AmenityIndex().build(synthetic_amenities())
+    for radius_km in radii:
+        yield f"EXAMPLE within {radius_km} km", {**permit, "buildings_nearby": index.query_radius(lon, lat, radius_km)}
+
+
+def stored_permits(count):
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGODB_URL"))
+    for permit in client.stormhacks2025.get_collection("enhanced_development_permits").find().limit(count):
+        yield str(permit["_id"]), permit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--radius-km", type=float, nargs="+", default=[1.0, 2.0])
+    parser.add_argument("--from-db", type=int, metavar="N", help="Measure N stored enhanced permits instead")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    args = parser.parse_args()
+
+    permits = stored_permits(args.from_db) if args.from_db else example_permits(args.radius_km)
+
+    before_total = after_total = 0
+    exact = True
+    for label, permit in permits:
+        amenity_count = sum(len(amenities) for amenities in (permit.get("buildings_nearby") or {}).values())
+        before, exact = count_tokens(json.dumps(permit, default=str), args.model)
+
+        start = time.perf_counter()
+        payload = encode_permit_for_prompt(permit)
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        after, _ = count_tokens(payload, args.model)
+        before_total += before
+        after_total += after
+        print(
+            f"{label}: {amenity_count} amenities, {before} -> {after} tokens "
+            f"({100 * (1 - after / before):.0f}% fewer), encoded in {encode_ms:.2f} ms"
+        )
+
+    if before_total:
+        print(f"total: {before_total} -> {after_total} tokens ({100 * (1 - after_total / before_total):.0f}% fewer)")
+        if not exact:
+            print("token counts are estimated; install tiktoken (with network access to its encodings) for exact counts")
+
+
+if __name__ == "__main__":
+    main()
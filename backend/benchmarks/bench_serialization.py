@@ -0,0 +1,135 @@
+"""
+Benchmark serializing an impact report with serialization.py against the previous response path.
+
+The previous path walked the report with `convert_mongodb_types`, ran FastAPI's
+`jsonable_encoder` over the result and encoded it with the standard json module.
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py [--items 60] [--repeat 2000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amenity_index import AMENITY_TYPES
+from serialization import dumps, dumps_msgpack, msgpack
+
+
+def convert_mongodb_types(obj):
+    """The recursive walker previously run by GET /impact_reports/{permit_id}."""
+    if isinstance(obj, dict):
+        if "$oid" in obj:
+            return obj["$oid"]
+        elif "$numberInt" in obj:
+            return int(obj["$numberInt"])
+        elif "$numberDouble" in obj:
+            return float(obj["$numberDouble"])
+        elif "$date" in obj:
+            return obj["$date"]
+        else:
+            return {key: convert_mongodb_types(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_mongodb_types(item) for item in obj]
+    else:
+        return obj
+
+
+def synthetic_report(items, seed=0):
+    """
+    An impact report shaped like those written by script_impact_report_generate.py.
+    """
+    rng = random.Random(seed)
+    words = (
+        "the development adds residents within walking distance increasing use of the facility "
+        "while construction traffic may temporarily disrupt access during excavation and shoring"
+    ).split()
+
+    def sentence(length):
+        return " ".join(rng.choice(words) for _ in range(length)).capitalize() + "."
+
+    return {
+        "_id": ObjectId(),
+        "AnalysisSummary": {
+            "_id": "68e1f303607bd68421537e47",
+            "title": "7-storey community care facility with 165 dwelling units",
+            "description": sentence(30),
+            "overallImportance": 7
+        },
+        "AnalyzedInfrastructure": [
+            {
+                "_id": str(ObjectId()),
+                "name": f"{rng.choice(words).title()} {rng.choice(words).title()} Park",
+                "type": rng.choice(AMENITY_TYPES),
+                "impactScore": rng.randint(-10, 10),
+                "quantitativeImpact": f"~{rng.randint(1, 20)}% increase in daily visitors",
+                "justification": sentence(40)
+            }
+            for _ in range(items)
+        ],
+        "original_permit_id": "68e1f303607bd68421537e47"
+    }
+
+
+def previous_path(report, permit_id):
+    converted_report = convert_mongodb_types(report)
+    if "_id" in converted_report:
+        converted_report["_id"] = str(converted_report["_id"])
+    content = jsonable_encoder({"success": True, "permit_id": permit_id, "report": converted_report})
+    # What starlette's JSONResponse.render does
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(report, permit_id):
+    return dumps({"success": True, "permit_id": permit_id, "report": report})
+
+
+def msgpack_path(report, permit_id):
+    return dumps_msgpack({"success": True, "permit_id": permit_id, "report": report})
+
+
+def best_of(repeat, function):
+    """
+    Run `function` `repeat` times and return (best wall time in seconds, last result).
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=60, help="Analyzed infrastructure items per report")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    report = synthetic_report(args.items)
+    permit_id = report["original_permit_id"]
+
+    previous_time, previous_body = best_of(args.repeat, lambda: previous_path(report, permit_id))
+    fast_time, fast_body = best_of(args.repeat, lambda: fast_path(report, permit_id))
+
+    assert json.loads(previous_body) == json.loads(fast_body)
+
+    print(f"report:            {args.items} items, {len(fast_body)} bytes of JSON")
+    print(f"previous path:     {previous_time * 1e6:.1f} us")
+    print(f"orjson path:       {fast_time * 1e6:.1f} us  ({previous_time / fast_time:.1f}x)")
+
+    if msgpack is not None:
+        msgpack_time, msgpack_body = best_of(args.repeat, lambda: msgpack_path(report, permit_id))
+        print(f"msgpack path:      {msgpack_time * 1e6:.1f} us  ({previous_time / msgpack_time:.1f}x), {len(msgpack_body)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""
+In-process stand-ins for MongoDB and OpenAI, for benchmarks that drive the API without external services.
+
+FakeMongoClient implements the subset of the async PyMongo API that app.py uses:
+find/find_one/count_documents/aggregate/insert/update/find_one_and_update on plain Python lists, with
+$geoNear evaluated by the vectorized kernel in geo.py. StubOpenAI answers chat
+completions with a canned impact analysis after a configurable delay.
+"""
+import os
+import sys
+import json
+import time
+import copy
+import random
+import asyncio
+import types
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amenity_index import AMENITY_TYPES
+from geo import GEO_POINT_FIELD, PointArray
+
+# Rough bounding box of the City of Vancouver
+VANCOUVER_BBOX = (-123.23, 49.19, -123.02, 49.32)
+
+# Radius MongoDB uses for spherical $geoNear distances
+MONGO_EARTH_RADIUS_KM = 6378.1
+
+
+def _get(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _compare(value, operator, operand):
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if operator == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return False
+    if operator == "$geoWithin":
+        # Polygons are treated as lon/lat rectangles (their extent), as built for bbox queries
+        ring = operand["$geometry"]["coordinates"][0]
+        lon, lat = value["coordinates"]
+        lons, lats = [corner[0] for corner in ring], [corner[1] for corner in ring]
+        return min(lons) <= lon <= max(lons) and min(lats) <= lat <= max(lats)
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise NotImplementedError(f"Query operator {operator} is not supported by the fake")
+
+
+def matches(document, query):
+    """
+    Evaluate a MongoDB filter against a document (equality, comparisons, $in, $or, $and).
+    """
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            value = _get(document, key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif _get(document, key) != condition:
+            return False
+    return True
+
+
+def project(document, projection):
+    """
+    Apply an inclusion or exclusion projection.
+    """
+    if not projection:
+        return dict(document)
+    if any(value for key, value in projection.items() if key != "_id"):
+        included = {key: document[key] for key, value in projection.items() if value and key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            included["_id"] = document["_id"]
+        return included
+    return {key: value for key, value in document.items() if projection.get(key, 1)}
+
+
+class FakeCursor:
+    """
+    Async cursor over a list of documents.
+    """
+
+    def __init__(self, documents, latency):
+        self._documents = documents
+        self._latency = latency
+        self._iterator = None
+
+    def sort(self, key, direction=1):
+        self._documents.sort(key=lambda document: document.get(key), reverse=direction == -1)
+        return self
+
+    def limit(self, count):
+        if count:
+            self._documents = self._documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        await self._latency()
+        return self._documents if length is None else self._documents[:length]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            await self._latency()
+            self._iterator = iter(self._documents)
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self, name, latency):
+        self.name = name
+        self.documents = []
+        self._latency = latency
+        self._points = None
+
+    def _snapshot(self, query=None, projection=None):
+        return [project(document, projection) for document in self.documents if matches(document, query)]
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(self._snapshot(query, projection), self._latency)
+
+    async def find_one(self, query=None, projection=None):
+        await self._latency()
+        for document in self.documents:
+            if matches(document, query):
+                return project(document, projection)
+        return None
+
+    async def count_documents(self, query):
+        await self._latency()
+        return sum(1 for document in self.documents if matches(document, query))
+
+    async def insert_one(self, document):
+        await self._latency()
+        document.setdefault("_id", ObjectId())
+        self.documents.append(copy.deepcopy(document))
+        self._points = None
+        return types.SimpleNamespace(inserted_id=document["_id"])
+
+    def _update(self, query, update, upsert):
+        """
+        Apply $set/$unset (and $setOnInsert on upsert) to the first match; returns (document, upserted).
+        """
+        for document in self.documents:
+            if matches(document, query):
+                document.update(copy.deepcopy(update.get("$set", {})))
+                for key in update.get("$unset", {}):
+                    document.pop(key, None)
+                return document, False
+        if not upsert:
+            return None, False
+        document = {key: value for key, value in query.items() if not key.startswith("$")}
+        document.update(copy.deepcopy(update.get("$set", {})))
+        document.update(copy.deepcopy(update.get("$setOnInsert", {})))
+        document.setdefault("_id", ObjectId())
+        self.documents.append(document)
+        self._points = None
+        return document, True
+
+    async def update_one(self, query, update, upsert=False):
+        await self._latency()
+        document, upserted = self._update(query, update, upsert)
+        return types.SimpleNamespace(
+            matched_count=int(document is not None and not upserted),
+            modified_count=int(document is not None and not upserted),
+            upserted_id=document["_id"] if upserted else None
+        )
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=ReturnDocument.BEFORE):
+        await self._latency()
+        before = None
+        for document in self.documents:
+            if matches(document, query):
+                before = copy.deepcopy(document)
+                break
+        document, _ = self._update(query, update, upsert)
+        if document is None:
+            return None
+        return copy.deepcopy(document) if return_document == ReturnDocument.AFTER else before
+
+    async def create_index(self, keys, **kwargs):
+        return "_".join(f"{key}_{direction}" for key, direction in keys)
+
+    def _geo_near(self, stage):
+        if self._points is None:
+            coordinates = [
+                (point["coordinates"][0], point["coordinates"][1]) if point else (np.nan, np.nan)
+                for point in (document.get(stage.get("key", GEO_POINT_FIELD)) for document in self.documents)
+            ]
+            self._points = PointArray(*np.array(coordinates, dtype=np.float64).reshape(-1, 2).T)
+
+        lon, lat = stage["near"]["coordinates"]
+        # geo.py measures on a 6371 km sphere; rescale to MongoDB's radius
+        max_km = stage.get("maxDistance", float("inf")) / 1000
+        positions, distances_km = self._points.within(lon, lat, max_km * 6371 / MONGO_EARTH_RADIUS_KM)
+        distances_m = distances_km * MONGO_EARTH_RADIUS_KM / 6371 * 1000
+
+        multiplier = stage.get("distanceMultiplier", 1)
+        min_distance = stage.get("minDistance", 0)
+        results = []
+        for position, distance in zip(positions.tolist(), distances_m.tolist()):
+            document = self.documents[position]
+            if distance < min_distance or not matches(document, stage.get("query")):
+                continue
+            results.append({**document, stage["distanceField"]: distance * multiplier})
+
+        results.sort(key=lambda document: document[stage["distanceField"]])
+        return results
+
+    async def aggregate(self, pipeline):
+        await self._latency()
+        documents = None
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == "$geoNear":
+                documents = self._geo_near(spec)
+                continue
+            if documents is None:
+                documents = [dict(document) for document in self.documents]
+            if operator == "$match":
+                documents = [document for document in documents if matches(document, spec)]
+            elif operator == "$sort":
+                for key, direction in reversed(list(spec.items())):
+                    documents.sort(key=lambda document: document.get(key), reverse=direction == -1)
+            elif operator == "$limit":
+                documents = documents[:spec]
+            elif operator == "$project":
+                documents = [project(document, spec) for document in documents]
+            elif operator == "$set":
+                for document in documents:
+                    for key, expression in spec.items():
+                        if isinstance(expression, dict) and "$toString" in expression:
+                            document[key] = str(_get(document, expression["$toString"].lstrip("$")))
+                        else:
+                            document[key] = expression
+            else:
+                raise NotImplementedError(f"Aggregation stage {operator} is not supported by the fake")
+        return FakeCursor(documents or [], self._latency)
+
+
+class FakeDatabase:
+    def __init__(self, latency):
+        self._latency = latency
+        self._collections = {}
+
+    def get_collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name, self._latency)
+        return self._collections[name]
+
+    __getitem__ = get_collection
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    async def command(self, name, *args, **kwargs):
+        await self._latency()
+        return {"ok": 1}
+
+
+class FakeMongoClient:
+    """
+    Stand-in for AsyncMongoClient holding every database in memory.
+
+    Args:
+        latency_ms: Simulated round-trip time added to every operation
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_seconds = latency_ms / 1000
+        self._databases = {}
+
+    async def _latency(self):
+        # Always yield to the event loop, like a real network call would
+        await asyncio.sleep(self.latency_seconds)
+
+    def get_database(self, name):
+        if name not in self._databases:
+            self._databases[name] = FakeDatabase(self._latency)
+        return self._databases[name]
+
+    __getitem__ = get_database
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_database(name)
+
+    async def close(self):
+        pass
+
+
+def _random_point(rng):
+    min_lon, min_lat, max_lon, max_lat = VANCOUVER_BBOX
+    lon = float(rng.uniform(min_lon, max_lon))
+    lat = float(rng.uniform(min_lat, max_lat))
+    geom = {"type": "Feature", "geometry": {"coordinates": [lon, lat], "type": "Point"}, "properties": {}}
+    return geom, {"type": "Point", "coordinates": [lon, lat]}
+
+
+def synthetic_report(permit_id, rng, items=12):
+    """
+    An impact report shaped like those written by script_impact_report_generate.py.
+    """
+    return {
+        "_id": ObjectId(),
+        "AnalysisSummary": {
+            "_id": permit_id,
+            "title": "6-storey mixed-use building with 45 dwelling units",
+            "description": "Construction of a residential building with ground floor commercial space.",
+            "overallImportance": int(rng.integers(1, 11))
+        },
+        "AnalyzedInfrastructure": [
+            {
+                "_id": str(ObjectId()),
+                "name": f"Nearby amenity {number}",
+                "type": AMENITY_TYPES[number % len(AMENITY_TYPES)],
+                "impactScore": int(rng.integers(-10, 11)),
+                "quantitativeImpact": "~5% increase in daily visitors",
+                "justification": "More residents within walking distance outweigh temporary construction disruption."
+            }
+            for number in range(items)
+        ],
+        "generated_at": time.time(),
+        "original_permit_id": permit_id
+    }
+
+
+def seed_database(db, permits=500, amenities_per_type=200, report_ratio=0.5, seed=0):
+    """
+    Fill a FakeDatabase with synthetic permits, amenities and impact reports.
+
+    Documents carry both the source `geom` and the migrated GEO_POINT_FIELD, as after
+    script_create_indexes.py.
+
+    Returns:
+        list: Permit ids (as strings) that have an impact report
+    """
+    rng = np.random.default_rng(seed)
+
+    for amenity_type in AMENITY_TYPES:
+        collection = db.get_collection(amenity_type)
+        for number in range(amenities_per_type):
+            geom, point = _random_point(rng)
+            collection.documents.append({
+                "_id": ObjectId(),
+                "name": f"{amenity_type.replace('_', ' ').title()} {number}",
+                "address": f"{number} Main Street",
+                "geo_local_area": "Mount Pleasant",
+                "geom": geom,
+                GEO_POINT_FIELD: point
+            })
+
+    permits_collection = db.get_collection("development_permits")
+    reports_collection = db.get_collection("impact_reports")
+    reported_ids = []
+    for number in range(permits):
+        geom, point = _random_point(rng)
+        permit = {
+            "_id": ObjectId(),
+            "projectvalue": float(rng.integers(500_000, 60_000_000)),
+            "address": f"{number} Arbutus Street, Vancouver, BC",
+            "propertyuse": ["Dwelling Uses"],
+            "specificusecategory": ["Multiple Dwelling"],
+            "geolocalarea": "Arbutus Ridge",
+            "geom": geom,
+            GEO_POINT_FIELD: point,
+            "permitnumbercreateddate": "2024-10-04",
+            "issuedate": "2025-09-17",
+            "permitelapseddays": int(rng.integers(30, 400))
+        }
+        if rng.random() < report_ratio:
+            permit["has_impact_report"] = True
+            reports_collection.documents.append(synthetic_report(str(permit["_id"]), rng))
+            reported_ids.append(str(permit["_id"]))
+        permits_collection.documents.append(permit)
+
+    return reported_ids
+
+
+class _Completions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        owner = self._owner
+        owner.calls += 1
+        content = json.dumps(owner.analysis)
+        usage = types.SimpleNamespace(
+            prompt_tokens=sum(len(message["content"]) for message in messages) // 4,
+            completion_tokens=len(content) // 4,
+            total_tokens=0
+        )
+
+        if stream:
+            return self._stream(content, usage)
+
+        await asyncio.sleep(owner.sample_latency())
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+    async def _stream(self, content, usage, chunks=50):
+        delay = self._owner.sample_latency() / chunks
+        size = max(1, -(-len(content) // chunks))
+        for start in range(0, len(content), size):
+            await asyncio.sleep(delay)
+            delta = types.SimpleNamespace(content=content[start:start + size])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+        yield types.SimpleNamespace(choices=[], usage=usage)
+
+
+class StubOpenAI:
+    """
+    Stand-in for AsyncOpenAI answering every chat completion with a fixed impact analysis.
+
+    Args:
+        latency_ms: Mean time a completion takes
+        jitter: Relative spread of the latency (0.2 = +/-20%)
+    """
+
+    def __init__(self, latency_ms: float = 2000.0, jitter: float = 0.2, seed: int = 0):
+        self.latency_seconds = latency_ms / 1000
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+        self.analysis = synthetic_report("hypothetical", np.random.default_rng(seed))
+        self.analysis.pop("_id")
+        self.chat = types.SimpleNamespace(completions=_Completions(self))
+
+    def sample_latency(self):
+        return max(0.0, self.latency_seconds * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    async def close(self):
+        pass
@@ -0,0 +1,240 @@
+"""
+Reproducible HTTP load test of the API against in-process MongoDB and OpenAI stand-ins.
+
+The app runs in this process (through its lifespan, so warm-up and caches behave as
+in production) with `create_mongo_client` and `create_openai_client` replaced by the
+fakes in benchmarks/fakes.py, seeded with synthetic permits, amenities and reports.
+Requests go through httpx's ASGI transport, so the numbers measure the app itself:
+routing, queries, serialization, caching and awaiting the (simulated) LLM.
+
+Each scenario is run at every concurrency level for a fixed duration; throughput
+and p50/p95/p99 latencies of the successful requests are printed and saved as JSON,
+stamped with the git commit, so runs can be compared across commits. Requests shed
+with 429/503 are counted apart and their client waits out `Retry-After`.
+
+Usage (from backend/):
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --concurrency 1 8 32 --duration 10 --llm-latency-ms 1500
+    python benchmarks/loadtest.py --scenarios impact-report amenities-nearby --output before.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import contextlib
+import argparse
+import platform
+import subprocess
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# app.py reads its configuration at import time; the fakes make the real values unnecessary
+os.environ.setdefault("MONGODB_URL", "mongodb://loadtest.invalid")
+os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+
+import httpx
+
+import app as backend
+from fakes import FakeMongoClient, StubOpenAI, seed_database, VANCOUVER_BBOX
+
+
+def random_location(rng):
+    min_lon, min_lat, max_lon, max_lat = VANCOUVER_BBOX
+    return round(rng.uniform(min_lon, max_lon), 5), round(rng.uniform(min_lat, max_lat), 5)
+
+
+def permits_listing(rng, context):
+    return "GET", "/development-permits", {}
+
+
+def permits_nearby(rng, context):
+    lon, lat = random_location(rng)
+    return "GET", "/development-permits", {"params": {"lon": lon, "lat": lat, "distance": 2}}
+
+
+def amenities_listing(rng, context):
+    return "GET", "/amenities", {}
+
+
+def amenities_nearby(rng, context):
+    lon, lat = random_location(rng)
+    return "GET", "/amenities", {"params": {"lon": lon, "lat": lat, "distance": 1}}
+
+
+def impact_report(rng, context):
+    return "GET", f"/impact_reports/{rng.choice(context['reported_ids'])}", {}
+
+
+def impact_reports_batch(rng, context):
+    # A map view prefetching the summaries of its visible markers
+    body = {"permit_ids": rng.sample(context["reported_ids"], 20), "fields": ["AnalysisSummary"]}
+    return "POST", "/impact_reports/batch", {"json": body}
+
+
+def hypothetical_report(rng, context):
+    # Random coordinates, so every request misses the report cache and reaches the LLM
+    lon, lat = random_location(rng)
+    body = {
+        "longitude": lon,
+        "latitude": lat,
+        "project_description": "To construct a 6-storey building with 45 dwelling units and ground floor commercial space",
+        "project_value": 15000000,
+        "property_use": ["Residential Uses"],
+        "max_distance_km": 1.0,
+    }
+    return "POST", "/hypothetical-impact-report", {"json": body}
+
+
+SCENARIOS = {
+    "development-permits": permits_listing,
+    "development-permits-nearby": permits_nearby,
+    "amenities": amenities_listing,
+    "amenities-nearby": amenities_nearby,
+    "impact-report": impact_report,
+    "impact-reports-batch": impact_reports_batch,
+    "hypothetical-impact-report": hypothetical_report,
+}
+
+
+async def run_level(http, scenario, concurrency, duration, context, seed):
+    """
+    Keep `concurrency` requests in flight for `duration` seconds.
+
+    Returns:
+        dict: Request count, errors, throughput and latency percentiles
+    """
+    make_request = SCENARIOS[scenario]
+    latencies = []
+    errors = 0
+    rejected = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(number):
+        nonlocal errors, rejected
+        rng = random.Random(f"{seed}-{scenario}-{concurrency}-{number}")
+        while time.perf_counter() < deadline:
+            method, path, kwargs = make_request(rng, context)
+            start_time = time.perf_counter()
+            try:
+                response = await http.request(method, path, **kwargs)
+                failed = response.status_code >= 400
+            except Exception as e:
+                print(f"{scenario}: {e}")
+                response = None
+                failed = True
+            if response is not None and response.status_code in (429, 503):
+                # Shed by the admission controller (see admission.py); back off like a real client
+                rejected += 1
+                retry_after = float(response.headers.get("Retry-After", 1))
+                await asyncio.sleep(min(retry_after, max(0.0, deadline - time.perf_counter())))
+            elif failed:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    result = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies) + errors + rejected,
+        "errors": errors,
+        "rejected": rejected,
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+    for percentile in (50, 95, 99):
+        value = np.percentile(latencies, percentile) * 1000 if latencies else float("nan")
+        result[f"p{percentile}_ms"] = round(float(value), 2)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    mongo = FakeMongoClient(latency_ms=args.mongo_latency_ms)
+    reported_ids = seed_database(
+        mongo.stormhacks2025, permits=args.permits, amenities_per_type=args.amenities_per_type, seed=args.seed
+    )
+    llm = StubOpenAI(latency_ms=args.llm_latency_ms, seed=args.seed)
+
+    backend.create_mongo_client = lambda: mongo
+    backend.create_openai_client = lambda: llm
+
+    context = {"reported_ids": reported_ids}
+    results = []
+    devnull = open(os.devnull, "w")
+    async with backend.lifespan(backend.app):
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as http:
+            # The app prints per request; keep its output out of the table unless asked
+            app_output = sys.stdout if args.verbose else devnull
+            for scenario in args.scenarios:
+                # Unmeasured request, so lazy imports and first-use setup do not land in the numbers
+                method, path, kwargs = SCENARIOS[scenario](random.Random(args.seed), context)
+                with contextlib.redirect_stdout(app_output):
+                    await http.request(method, path, **kwargs)
+
+                for concurrency in args.concurrency:
+                    with contextlib.redirect_stdout(app_output):
+                        result = await run_level(http, scenario, concurrency, args.duration, context, args.seed)
+                    results.append(result)
+                    print(
+                        f"{scenario:28} c={concurrency:<4} {result['requests']:>7} req {result['errors']:>4} err "
+                        f"{result['rejected']:>5} shed "
+                        f"{result['rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f}  "
+                        f"p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms"
+                    )
+
+    devnull.close()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "llm_calls": llm.calls,
+            "params": {
+                key: value for key, value in vars(args).items() if key not in ("output", "verbose")
+            },
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario and concurrency level")
+    parser.add_argument("--permits", type=int, default=2000)
+    parser.add_argument("--amenities-per-type", type=int, default=200)
+    parser.add_argument("--llm-latency-ms", type=float, default=2000.0)
+    parser.add_argument("--mongo-latency-ms", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output during measurements")
+    parser.add_argument("--output", default=os.path.join(BACKEND_DIR, "benchmarks", "loadtest-results.json"))
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Microbenchmarks of the geo and serialization hot paths, with regression checks against a saved baseline.
+
+Every case runs over synthetic Vancouver data at each dataset size (1k to 1M points
+by default) and reports throughput in the case's unit (calls, documents, queries or
+permits per second) and the peak memory allocated by the call, measured with
+tracemalloc in a separate run so tracing does not skew the timings.
+
+Large sizes of the cases that hold one Python document per point are skipped unless
+--full is given; they need several GB of memory.
+
+Usage (from backend/):
+    python benchmarks/microbench.py --save-baseline
+    python benchmarks/microbench.py --threshold 0.15       # exits 1 on a regression
+    python benchmarks/microbench.py --cases haversine_distance --sizes 1000 1000000
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import asyncio
+import argparse
+import platform
+import tracemalloc
+
+import numpy as np
+from bson import ObjectId
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# app.py and script_enchance_permits.py read their configuration at import time;
+# neither client connects unless a query is sent, and the cases never send one
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "microbench")
+
+from amenity_index import AMENITY_TYPES
+from geo import haversine_distance, extract_coordinates_from_geom
+from serialization import dumps
+from bench_serialization import convert_mongodb_types
+from fakes import VANCOUVER_BBOX
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "microbench-baseline.json")
+
+# Distinct documents generated for per-item cases; larger sizes cycle through them
+DOCUMENT_POOL_SIZE = 10_000
+
+# Radius and query count of the nearby-amenity case, as sent by the hypothetical report
+QUERY_RADIUS_KM = 1.0
+QUERIES_PER_CALL = 100
+
+# The real data has about 200 amenities per type; the enrichment case scales the permits
+ENRICHMENT_AMENITIES_PER_TYPE = 200
+
+# Peak memory changes below this are noise from the allocator and interpreter caches
+MEMORY_NOISE_BYTES = 1 << 20
+
+
+def synthetic_coordinates(count, seed=0):
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = VANCOUVER_BBOX
+    return rng.uniform(min_lon, max_lon, count), rng.uniform(min_lat, max_lat, count)
+
+
+def synthetic_documents(count, seed=0, prefix="Amenity"):
+    """
+    Documents shaped like the City of Vancouver records: an ObjectId, a few text fields and a GeoJSON `geom`.
+    """
+    lons, lats = synthetic_coordinates(count, seed)
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"{prefix} {number}",
+            "address": f"{number} Main Street",
+            "geo_local_area": "Mount Pleasant",
+            "geom": {
+                "type": "Feature",
+                "geometry": {"coordinates": [lon, lat], "type": "Point"},
+                "properties": {}
+            }
+        }
+        for number, (lon, lat) in enumerate(zip(lons.tolist(), lats.tolist()))
+    ]
+
+
+def split_by_type(documents):
+    return {
+        amenity_type: documents[position::len(AMENITY_TYPES)]
+        for position, amenity_type in enumerate(AMENITY_TYPES)
+    }
+
+
+def case_haversine_distance(size):
+    lons, lats = synthetic_coordinates(size)
+    pairs = list(zip(lons.tolist(), lats.tolist(), lons[::-1].tolist(), lats[::-1].tolist()))
+
+    def run():
+        for lon1, lat1, lon2, lat2 in pairs:
+            haversine_distance(lon1, lat1, lon2, lat2)
+
+    return run, size
+
+
+def case_extract_coordinates_from_geom(size):
+    pool = [document["geom"] for document in synthetic_documents(min(size, DOCUMENT_POOL_SIZE))]
+    geoms = [pool[position % len(pool)] for position in range(size)]
+
+    def run():
+        for geom in geoms:
+            extract_coordinates_from_geom(geom)
+
+    return run, size
+
+
+def case_convert_mongodb_types(size):
+    # The walker GET /impact_reports/{permit_id} used before serialization.py
+    listing = {"success": True, "amenities": split_by_type(synthetic_documents(size))}
+    return lambda: convert_mongodb_types(listing), size
+
+
+def case_serialization_dumps(size):
+    # The orjson path that replaced convert_mongodb_types, on the /amenities payload
+    listing = {"success": True, "amenities": split_by_type(synthetic_documents(size))}
+    return lambda: dumps(listing), size
+
+
+def case_find_nearby_amenities_for_coordinates(size):
+    import app
+
+    app.amenity_index.build(split_by_type(synthetic_documents(size)))
+    lons, lats = synthetic_coordinates(QUERIES_PER_CALL, seed=1)
+    locations = list(zip(lons.tolist(), lats.tolist()))
+    loop = asyncio.new_event_loop()
+
+    async def queries():
+        for lon, lat in locations:
+            await app.find_nearby_amenities_for_coordinates(lon, lat, QUERY_RADIUS_KM)
+
+    return lambda: loop.run_until_complete(queries()), QUERIES_PER_CALL
+
+
+def case_find_nearby_amenities_for_sites(size):
+    import app
+
+    # The same queries as above, answered as one POST /amenities/nearby/batch
+    app.amenity_index.build(split_by_type(synthetic_documents(size)))
+    lons, lats = synthetic_coordinates(QUERIES_PER_CALL, seed=1)
+    sites = [(lon, lat, QUERY_RADIUS_KM) for lon, lat in zip(lons.tolist(), lats.tolist())]
+    loop = asyncio.new_event_loop()
+
+    return lambda: loop.run_until_complete(app.find_nearby_amenities_for_sites(sites, 5)), QUERIES_PER_CALL
+
+
+class ListCollection:
+    """
+    Synchronous collection stand-in: `find()` hands out the documents.
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, *args, **kwargs):
+        return iter(self.documents)
+
+
+def case_analyze_development_permits_with_nearby_amenities(size):
+    import script_enchance_permits
+
+    amenities = split_by_type(
+        synthetic_documents(ENRICHMENT_AMENITIES_PER_TYPE * len(AMENITY_TYPES), seed=1)
+    )
+    for amenity_type, documents in amenities.items():
+        setattr(script_enchance_permits, f"{amenity_type}_collection", ListCollection(documents))
+    script_enchance_permits.development_permits_collection = ListCollection(
+        synthetic_documents(size, seed=2, prefix="Permit")
+    )
+
+    return lambda: script_enchance_permits.analyze_development_permits_with_nearby_amenities(0.5, 20), size
+
+
+# name -> (setup, unit, largest size run without --full)
+CASES = {
+    "haversine_distance": (case_haversine_distance, "calls", 1_000_000),
+    "extract_coordinates_from_geom": (case_extract_coordinates_from_geom, "geoms", 1_000_000),
+    "convert_mongodb_types": (case_convert_mongodb_types, "documents", 100_000),
+    "serialization.dumps": (case_serialization_dumps, "documents", 100_000),
+    "find_nearby_amenities_for_coordinates": (case_find_nearby_amenities_for_coordinates, "queries", 100_000),
+    "find_nearby_amenities_for_sites": (case_find_nearby_amenities_for_sites, "queries", 100_000),
+    "analyze_development_permits_with_nearby_amenities": (
+        case_analyze_development_permits_with_nearby_amenities, "permits", 10_000
+    ),
+}
+
+
+def measure(name, size, repeat):
+    """
+    Time one case at one size, then measure its peak allocation.
+
+    Returns:
+        dict: Throughput, best time per call and peak memory
+    """
+    setup, unit, _ = CASES[name]
+    run, operations = setup(size)
+
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "case": name,
+        "size": size,
+        "unit": unit,
+        "ops_per_sec": round(operations / best, 1),
+        "seconds_per_call": best,
+        "peak_memory_bytes": peak,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Regressions of `results` against `baseline`: throughput or peak memory worse by more than `threshold`.
+
+    Returns:
+        list: One message per regression
+    """
+    previous = {(result["case"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["case"], result["size"]))
+        if before is None:
+            continue
+        label = f"{result['case']} @ {result['size']}"
+        if result["ops_per_sec"] < before["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{label}: {before['ops_per_sec']:.0f} -> {result['ops_per_sec']:.0f} {result['unit']}/s"
+            )
+        growth = result["peak_memory_bytes"] - before["peak_memory_bytes"]
+        if growth > MEMORY_NOISE_BYTES and result["peak_memory_bytes"] > before["peak_memory_bytes"] * (1 + threshold):
+            regressions.append(
+                f"{label}: peak memory {before['peak_memory_bytes'] / 2**20:.1f} -> "
+                f"{result['peak_memory_bytes'] / 2**20:.1f} MiB"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--full", action="store_true", help="Also run the sizes that need several GB of memory")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per measurement; the best is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Tolerated slowdown or memory growth (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.cases:
+        largest = CASES[name][2]
+        for size in args.sizes:
+            if size > largest and not args.full:
+                print(f"{name:50} {size:>9,}  skipped (--full)")
+                continue
+            result = measure(name, size, args.repeat)
+            results.append(result)
+            print(
+                f"{name:50} {size:>9,}  {result['ops_per_sec']:>14,.0f} {result['unit']}/s  "
+                f"peak {result['peak_memory_bytes'] / 2**20:>9.2f} MiB"
+            )
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "machine": platform.machine(),
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
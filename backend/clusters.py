@@ -0,0 +1,300 @@
+import math
+
+import numpy as np
+
+# Web Mercator cannot represent the poles; map clients clip latitudes to this
+MAX_LATITUDE = 85.05112878
+
+# Clusters are grid cells of a quarter of a 256 px map tile, i.e. 64 px on screen at every zoom
+CELLS_PER_TILE_BITS = 2
+
+# Above this zoom, /clusters returns the individual points in view instead
+DEFAULT_MAX_CLUSTER_ZOOM = 16
+
+# Individual points returned by one query at most
+DEFAULT_MAX_POINTS = 2000
+
+# Grid cells one query may span (64 x 64, a 4096 px square viewport); wider boxes use a coarser level
+DEFAULT_MAX_CELLS = 4096
+
+
+def mercator(lons, lats):
+    """
+    Project lon/lat degrees to Web Mercator coordinates in [0, 1), y growing southwards.
+
+    Examples:
+        >>> x, y = mercator(np.array([0.0]), np.array([0.0]))
+        >>> float(x[0]), float(y[0])
+        (0.5, 0.5)
+    """
+    x = (np.asarray(lons, dtype=np.float64) + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return np.clip(x, 0.0, np.nextafter(1.0, 0.0)), np.clip(y, 0.0, np.nextafter(1.0, 0.0))
+
+
+class ClusterLevel:
+    """
+    Point counts and coordinate sums of one zoom level, per (grid cell, type) pair.
+
+    Pairs are sorted by key, `((cell_x << shift) | cell_y) * type_count + type_code`,
+    so the cells of a column range of the map are one contiguous slice.
+    """
+
+    __slots__ = ("shift", "keys", "counts", "sum_lons", "sum_lats")
+
+    def __init__(self, shift, keys, counts, sum_lons, sum_lats):
+        self.shift = shift
+        self.keys = keys
+        self.counts = counts
+        self.sum_lons = sum_lons
+        self.sum_lats = sum_lats
+
+    @classmethod
+    def aggregate(cls, shift, keys, counts, sum_lons, sum_lats):
+        """
+        Merge entries sharing a key.
+        """
+        keys, inverse = np.unique(keys, return_inverse=True)
+        return cls(
+            shift,
+            keys,
+            np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64),
+            np.bincount(inverse, weights=sum_lons, minlength=len(keys)),
+            np.bincount(inverse, weights=sum_lats, minlength=len(keys)),
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class ClusterIndex:
+    """
+    Grid pyramid over point layers, for map clustering at any zoom in time independent of the point count.
+
+    Level z holds, for every occupied 64 px cell of the Web Mercator grid at zoom z,
+    the number of points of each type and the sum of their coordinates, so a query
+    only aggregates the cells in view into clusters with a count, centroid and per-type
+    breakdown. The finest level is built from the points and every coarser one from
+    the level below it. Points are also kept sorted by longitude, to return them
+    individually past `max_cluster_zoom`.
+
+    Args:
+        max_cluster_zoom: Highest zoom answered with clusters
+        max_points: Points returned at most by one query past `max_cluster_zoom`
+        max_cells: Grid cells one query may span before a coarser level is used
+    """
+
+    def __init__(
+        self,
+        max_cluster_zoom: int = DEFAULT_MAX_CLUSTER_ZOOM,
+        max_points: int = DEFAULT_MAX_POINTS,
+        max_cells: int = DEFAULT_MAX_CELLS
+    ):
+        self.max_cluster_zoom = max_cluster_zoom
+        self.max_points = max_points
+        self.max_cells = max_cells
+        self.types = ()
+        self._type_count = 1
+        self._levels = []
+        self._id_lookups = []
+        self._type_layers = np.empty(0, dtype=np.int64)
+        # Points sorted by longitude, with their type and position in their layer
+        self._lons = np.empty(0)
+        self._lats = np.empty(0)
+        self._type_codes = np.empty(0, dtype=np.int64)
+        self._positions = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._lons)
+
+    def build(self, layers):
+        """
+        Build the pyramid from point layers.
+
+        Args:
+            layers: Iterable of (types, type_codes, lons, lats, ids) tuples: the type names of the
+                layer, the type code and coordinates of each point, and a function returning the id
+                strings of points given their positions in the layer
+
+        Returns:
+            ClusterIndex: The index itself, for chaining
+        """
+        types = []
+        type_layers = []
+        id_lookups = []
+        columns = []
+        for layer, (layer_types, type_codes, lons, lats, ids) in enumerate(layers):
+            lons = np.asarray(lons, dtype=np.float64)
+            lats = np.asarray(lats, dtype=np.float64)
+            # Points without coordinates are left out of the map
+            located = np.flatnonzero(~np.isnan(lons) & ~np.isnan(lats))
+            columns.append((
+                lons[located],
+                lats[located],
+                np.asarray(type_codes, dtype=np.int64)[located] + len(types),
+                located,
+            ))
+            types.extend(layer_types)
+            type_layers.extend([layer] * len(layer_types))
+            id_lookups.append(ids)
+
+        lons, lats, type_codes, positions = (
+            np.concatenate([column[field] for column in columns]) if columns else np.empty(0)
+            for field in range(4)
+        )
+        type_codes = type_codes.astype(np.int64)
+        type_count = max(len(types), 1)
+
+        levels = [None] * (self.max_cluster_zoom + 1)
+        shift = self.max_cluster_zoom + CELLS_PER_TILE_BITS
+        x, y = mercator(lons, lats)
+        cell_x = np.floor(x * (1 << shift)).astype(np.int64)
+        cell_y = np.floor(y * (1 << shift)).astype(np.int64)
+        keys = ((cell_x << shift) | cell_y) * type_count + type_codes
+        level = ClusterLevel.aggregate(shift, keys, np.ones(len(keys)), lons, lats)
+        levels[self.max_cluster_zoom] = level
+
+        for zoom in range(self.max_cluster_zoom - 1, -1, -1):
+            cells, type_codes_of_keys = np.divmod(level.keys, type_count)
+            cell_x = cells >> level.shift
+            cell_y = cells & ((1 << level.shift) - 1)
+            shift = level.shift - 1
+            keys = (((cell_x >> 1) << shift) | (cell_y >> 1)) * type_count + type_codes_of_keys
+            level = ClusterLevel.aggregate(shift, keys, level.counts, level.sum_lons, level.sum_lats)
+            levels[zoom] = level
+
+        by_lon = np.argsort(lons, kind="stable")
+        self.types = tuple(types)
+        self._type_count = type_count
+        self._levels = levels
+        self._id_lookups = id_lookups
+        self._type_layers = np.array(type_layers, dtype=np.int64)
+        self._lons = lons[by_lon]
+        self._lats = lats[by_lon]
+        self._type_codes = type_codes[by_lon]
+        self._positions = positions.astype(np.int64)[by_lon]
+
+        return self
+
+    def type_codes_for(self, types=None):
+        """
+        Type codes of the given type names, or of every type.
+
+        Raises:
+            ValueError: If a name is not a type of the index
+        """
+        if types is None:
+            return np.arange(len(self.types))
+        unknown = [name for name in types if name not in self.types]
+        if unknown:
+            raise ValueError(f"Unknown types: {', '.join(unknown)}. Valid types: {', '.join(self.types)}")
+        return np.array([self.types.index(name) for name in types], dtype=np.int64)
+
+    def clusters(self, bbox, zoom: float, types=None):
+        """
+        Aggregate the points of `types` in the grid cells of `zoom` overlapping `bbox`.
+
+        A box spanning more than `max_cells` cells at `zoom` (larger than any screen)
+        is answered from the coarsest level below it that fits, so the response size
+        stays bounded.
+
+        Args:
+            bbox: (min_lon, min_lat, max_lon, max_lat) in degrees
+            zoom: Map zoom level; fractional zooms use the cells of the level below
+            types: Type names to include (all if None)
+
+        Returns:
+            tuple: (one dict per non-empty cell with `count`, centroid `longitude`/`latitude`
+                and `count_by_type`, zoom level of the cells)
+        """
+        type_count = self._type_count
+        min_lon, min_lat, max_lon, max_lat = bbox
+        # Mercator y grows southwards, so the north edge gives the smallest row
+        corners = mercator([min_lon, max_lon], [max_lat, min_lat])
+
+        cluster_zoom = min(max(int(zoom), 0), self.max_cluster_zoom)
+        while True:
+            level = self._levels[cluster_zoom]
+            (x0, x1), (y0, y1) = (
+                np.floor(coordinate * (1 << level.shift)).astype(np.int64).tolist() for coordinate in corners
+            )
+            if cluster_zoom == 0 or (x1 - x0 + 1) * (y1 - y0 + 1) <= self.max_cells:
+                break
+            cluster_zoom -= 1
+
+        start, end = np.searchsorted(level.keys, [(x0 << level.shift) * type_count, ((x1 + 1) << level.shift) * type_count])
+
+        cells, type_codes = np.divmod(level.keys[start:end], type_count)
+        cell_y = cells & ((1 << level.shift) - 1)
+        selected = np.flatnonzero(
+            (cell_y >= y0) & (cell_y <= y1) & np.isin(type_codes, self.type_codes_for(types))
+        ) + start
+
+        clusters = {}
+        for cell, type_code, count, sum_lon, sum_lat in zip(
+            cells[selected - start].tolist(),
+            type_codes[selected - start].tolist(),
+            level.counts[selected].tolist(),
+            level.sum_lons[selected].tolist(),
+            level.sum_lats[selected].tolist(),
+        ):
+            cluster = clusters.get(cell)
+            if cluster is None:
+                cluster = clusters[cell] = {"count": 0, "sum_lon": 0.0, "sum_lat": 0.0, "count_by_type": {}}
+            cluster["count"] += count
+            cluster["sum_lon"] += sum_lon
+            cluster["sum_lat"] += sum_lat
+            cluster["count_by_type"][self.types[type_code]] = count
+
+        return [
+            {
+                "count": cluster["count"],
+                "longitude": round(cluster["sum_lon"] / cluster["count"], 6),
+                "latitude": round(cluster["sum_lat"] / cluster["count"], 6),
+                "count_by_type": cluster["count_by_type"],
+            }
+            for cluster in clusters.values()
+        ], cluster_zoom
+
+    def points(self, bbox, types=None, limit: int = None):
+        """
+        The individual points of `types` inside `bbox`, in longitude order.
+
+        Args:
+            bbox: (min_lon, min_lat, max_lon, max_lat) in degrees
+            types: Type names to include (all if None)
+            limit: Points returned at most (defaults to `max_points`)
+
+        Returns:
+            tuple: (list of dicts with `_id`, `type`, `longitude` and `latitude`, whether points were left out)
+        """
+        limit = self.max_points if limit is None else limit
+        min_lon, min_lat, max_lon, max_lat = bbox
+        start, end = int(np.searchsorted(self._lons, min_lon, side="left")), int(np.searchsorted(self._lons, max_lon, side="right"))
+
+        lats = self._lats[start:end]
+        type_codes = self._type_codes[start:end]
+        selected = np.flatnonzero(
+            (lats >= min_lat) & (lats <= max_lat) & np.isin(type_codes, self.type_codes_for(types))
+        ) + start
+        truncated = len(selected) > limit
+        selected = selected[:limit]
+
+        # Ids are looked up layer by layer, then put back in point order
+        ids = np.empty(len(selected), dtype=object)
+        layers = self._type_layers[self._type_codes[selected]]
+        for layer in np.unique(layers).tolist():
+            members = np.flatnonzero(layers == layer)
+            ids[members] = self._id_lookups[layer](self._positions[selected[members]].tolist())
+
+        points = [
+            {"_id": point_id, "type": self.types[type_code], "longitude": longitude, "latitude": latitude}
+            for point_id, type_code, longitude, latitude in zip(
+                ids.tolist(),
+                self._type_codes[selected].tolist(),
+                self._lons[selected].tolist(),
+                self._lats[selected].tolist(),
+            )
+        ]
+        return points, truncated
@@ -0,0 +1,41 @@
+import time
+
+# Single document recording when the ingest scripts last changed served data
+DATA_VERSION_COLLECTION = "metadata"
+DATA_VERSION_ID = "data_version"
+
+
+def bump_data_version(db):
+    """
+    Record that permits, amenities or impact reports changed.
+
+    Called by the ingest scripts after they write; running API workers notice the
+    new version and rebuild their in-memory index and cached payloads.
+
+    Args:
+        db: Synchronous pymongo Database
+
+    Returns:
+        float: The new data version
+    """
+    version = time.time()
+    db.get_collection(DATA_VERSION_COLLECTION).update_one(
+        {"_id": DATA_VERSION_ID},
+        {"$set": {"version": version}},
+        upsert=True
+    )
+    return version
+
+
+async def fetch_data_version(db):
+    """
+    Read the current data version.
+
+    Args:
+        db: Async pymongo Database
+
+    Returns:
+        float: The current data version, or 0 if the ingest scripts never recorded one
+    """
+    document = await db.get_collection(DATA_VERSION_COLLECTION).find_one({"_id": DATA_VERSION_ID})
+    return document.get("version", 0) if document else 0
@@ -0,0 +1,358 @@
+import math
+
+import numpy as np
+
+# Mean radius of Earth in kilometers
+EARTH_RADIUS_KM = 6371
+
+# Top-level GeoJSON point copied from `geom` for the 2dsphere indexes (see script_create_indexes.py).
+# Not `location`: the public washrooms dataset already uses that name for a text description.
+GEO_POINT_FIELD = "geo_point"
+
+
+def haversine_distance(lon1, lat1, lon2, lat2):
+    """
+    Calculate the great circle distance between two points on Earth using the Haversine formula.
+
+    Args:
+        lon1, lat1: Coordinates of first point in decimal degrees
+        lon2, lat2: Coordinates of second point in decimal degrees
+
+    Returns:
+        float: Distance in kilometers
+    """
+    if None in [lon1, lat1, lon2, lat2]:
+        return None
+
+    # Convert decimal degrees to radians
+    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
+
+    # Haversine formula
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+
+    return c * EARTH_RADIUS_KM
+
+
+def extract_coordinates_from_geom(geom_field):
+    """
+    Extract longitude and latitude from a geom field.
+
+    Args:
+        geom_field: Can be a dict with geometry.coordinates or a simple dict with lon/lat
+
+    Returns:
+        tuple: (longitude, latitude) or (None, None) if extraction fails
+    """
+    if not geom_field or not isinstance(geom_field, dict):
+        return None, None
+
+    # Handle GeoJSON format: geom.geometry.coordinates
+    if 'geometry' in geom_field and isinstance(geom_field['geometry'], dict):
+        coords = geom_field['geometry'].get('coordinates')
+        if coords and isinstance(coords, list) and len(coords) >= 2:
+            return coords[0], coords[1]  # [lon, lat]
+
+    # Handle simple coordinate format: {lon: x, lat: y}
+    if 'lon' in geom_field and 'lat' in geom_field:
+        return geom_field['lon'], geom_field['lat']
+
+    return None, None
+
+
+def bounding_box(longitude, latitude, radius_km):
+    """
+    Compute a lon/lat bounding box that fully contains a circle of the given radius.
+
+    Args:
+        longitude, latitude: Center of the circle in decimal degrees
+        radius_km: Radius of the circle in kilometers
+
+    Returns:
+        tuple: (min_lon, min_lat, max_lon, max_lat)
+    """
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+
+    # Longitude degrees shrink towards the poles; clamp to avoid dividing by ~0
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    lon_delta = min(lat_delta / cos_lat, 180.0)
+
+    return (
+        longitude - lon_delta,
+        max(latitude - lat_delta, -90.0),
+        longitude + lon_delta,
+        min(latitude + lat_delta, 90.0),
+    )
+
+
+def coordinates_to_arrays(documents):
+    """
+    Pack the `geom` coordinates of documents into contiguous float64 arrays.
+
+    Documents without usable coordinates are kept in place as NaN so that array
+    positions line up with the input order; distance kernels propagate the NaN and
+    never report such documents as within range.
+
+    Args:
+        documents: Iterable of documents with a `geom` field
+
+    Returns:
+        tuple: (longitudes, latitudes) as np.ndarray of dtype float64
+    """
+    coordinates = [extract_coordinates_from_geom(document.get('geom')) for document in documents]
+    packed = np.array(
+        [(np.nan, np.nan) if lon is None or lat is None else (lon, lat) for lon, lat in coordinates],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    return np.ascontiguousarray(packed[:, 0]), np.ascontiguousarray(packed[:, 1])
+
+
+def _haversine_term(lon_rad, lat_rad, cos_lat, longitude, latitude):
+    """
+    The `a` term of the Haversine formula from one point to many, computed in place.
+
+    Monotonic in distance, so radius checks can compare it against a threshold and
+    skip the arcsin/sqrt for points that are out of range.
+    """
+    lat1 = math.radians(latitude)
+
+    a = lat_rad - lat1
+    a *= 0.5
+    np.sin(a, out=a)
+    a *= a
+
+    b = lon_rad - math.radians(longitude)
+    b *= 0.5
+    np.sin(b, out=b)
+    b *= b
+    b *= cos_lat
+    b *= math.cos(lat1)
+
+    a += b
+    return a
+
+
+def _term_to_km(a):
+    # Rounding can push `a` just above 1 for antipodal points
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class PointArray:
+    """
+    Contiguous float64 lon/lat arrays with the radians and cos(lat) the Haversine kernel needs.
+
+    Missing coordinates are stored as NaN; they never match a radius query and
+    report NaN distances.
+
+    With `precompute=False` only the lon/lat arrays are kept and the other terms are
+    computed for the points a query touches, which saves 24 bytes per point for
+    callers that always query a few candidates (see AmenityStore).
+    """
+
+    __slots__ = ("lons", "lats", "_lon_rad", "_lat_rad", "_cos_lat")
+
+    def __init__(self, lons, lats, precompute: bool = True):
+        self.lons = np.ascontiguousarray(lons, dtype=np.float64)
+        self.lats = np.ascontiguousarray(lats, dtype=np.float64)
+        self._lon_rad = self._lat_rad = self._cos_lat = None
+        if precompute:
+            self._lon_rad, self._lat_rad, self._cos_lat = self._terms()
+
+    @classmethod
+    def from_documents(cls, documents, precompute: bool = True):
+        """
+        Build a PointArray from the `geom` fields of documents, preserving their order.
+        """
+        return cls(*coordinates_to_arrays(documents), precompute=precompute)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        """
+        Wrap the arrays returned by `arrays()` without copying or recomputing them.
+
+        Memory-mapped arrays stay memory-mapped, so processes sharing a file share the pages.
+        """
+        points = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(points, name, arrays.get(name.lstrip("_")))
+        return points
+
+    def arrays(self):
+        """
+        The coordinate arrays and the precomputed terms that are kept, keyed by name, for saving.
+        """
+        return {name.lstrip("_"): getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+    def __len__(self):
+        return len(self.lons)
+
+    def _terms(self, indices=None):
+        """
+        Radians and cos(lat) of every point (or of `indices`), from the kept arrays if there are any.
+        """
+        if self._cos_lat is not None:
+            if indices is None:
+                return self._lon_rad, self._lat_rad, self._cos_lat
+            return self._lon_rad[indices], self._lat_rad[indices], self._cos_lat[indices]
+        lons, lats = (self.lons, self.lats) if indices is None else (self.lons[indices], self.lats[indices])
+        lat_rad = np.radians(lats)
+        return np.radians(lons), lat_rad, np.cos(lat_rad)
+
+    def take(self, indices):
+        """
+        Return a new PointArray holding only (and ordered by) `indices`.
+        """
+        return PointArray(self.lons[indices], self.lats[indices], precompute=self._cos_lat is not None)
+
+    def distances_from(self, longitude, latitude, indices=None):
+        """
+        Haversine distance in kilometers from one point to every point (or to `indices`).
+        """
+        return _term_to_km(_haversine_term(*self._terms(indices), longitude, latitude))
+
+    def within(self, longitude, latitude, max_distance_km, indices=None):
+        """
+        Points within `max_distance_km` of a location, in one vectorized pass.
+
+        Args:
+            longitude, latitude: Query location in decimal degrees
+            max_distance_km: Search radius in kilometers
+            indices: Restrict the search to these positions (optional)
+
+        Returns:
+            tuple: (positions of matching points, their distances in km), in array order
+        """
+        a = _haversine_term(*self._terms(indices), longitude, latitude)
+
+        # Compare in `a` space so distances are only computed for the matches
+        threshold = math.sin(min(max_distance_km / (2 * EARTH_RADIUS_KM), math.pi / 2)) ** 2
+        with np.errstate(invalid='ignore'):
+            matches = np.flatnonzero(a <= threshold)
+
+        positions = matches if indices is None else np.asarray(indices)[matches]
+        return positions, _term_to_km(a[matches])
+
+    def within_each(self, longitudes, latitudes, max_distances_km, indices=None):
+        """
+        Distances from several locations to every point (or to `indices`), in one broadcast pass.
+
+        Args:
+            longitudes, latitudes: Arrays of N query locations in decimal degrees
+            max_distances_km: Search radius of each location in kilometers (array of N, or one value)
+            indices: Restrict the search to these M positions (optional)
+
+        Returns:
+            np.ndarray: N x M distances in km; inf where a point is beyond that location's radius or missing
+        """
+        lon_rad, lat_rad, cos_lat = self._terms(indices)
+        lat1 = np.radians(np.asarray(latitudes, dtype=np.float64))[:, None]
+        lon1 = np.radians(np.asarray(longitudes, dtype=np.float64))[:, None]
+
+        a = lat_rad[None, :] - lat1
+        a *= 0.5
+        np.sin(a, out=a)
+        a *= a
+
+        b = lon_rad[None, :] - lon1
+        b *= 0.5
+        np.sin(b, out=b)
+        b *= b
+        b *= cos_lat[None, :]
+        b *= np.cos(lat1)
+
+        a += b
+
+        # Same `a` space threshold as `within`, so both agree on points at the edge of a radius
+        radii = np.minimum(np.asarray(max_distances_km, dtype=np.float64) / (2 * EARTH_RADIUS_KM), math.pi / 2)
+        thresholds = np.sin(radii) ** 2
+        with np.errstate(invalid='ignore'):
+            outside = ~(a <= np.reshape(thresholds, (-1, 1)))
+        distances = _term_to_km(a)
+        distances[outside] = np.inf
+        return distances
+
+
+def haversine_distances(longitude, latitude, longitudes, latitudes):
+    """
+    Vectorized Haversine distance from one point to many points.
+
+    Args:
+        longitude, latitude: Coordinates of the origin in decimal degrees
+        longitudes, latitudes: float64 arrays of target coordinates in decimal degrees
+
+    Returns:
+        np.ndarray: Distances in kilometers; NaN where a target coordinate is missing
+    """
+    lat_rad = np.radians(latitudes)
+    a = _haversine_term(np.radians(longitudes), lat_rad, np.cos(lat_rad), longitude, latitude)
+    return _term_to_km(a)
+
+
+def haversine_distance_matrix(longitudes1, latitudes1, longitudes2, latitudes2):
+    """
+    Vectorized Haversine distances between every pair of two point sets.
+
+    Args:
+        longitudes1, latitudes1: Arrays of N origin coordinates in decimal degrees
+        longitudes2, latitudes2: Arrays of M target coordinates in decimal degrees
+
+    Returns:
+        np.ndarray: N x M matrix of distances in kilometers (NaN where either point is missing)
+    """
+    lat1 = np.radians(np.asarray(latitudes1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(longitudes1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(latitudes2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(longitudes2, dtype=np.float64))[None, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+
+    return _term_to_km(a)
+
+
+def nearest(distances, k=None):
+    """
+    Positions of the `k` smallest distances, nearest first.
+
+    Uses a linear-time partial selection, so only the `k` survivors are sorted
+    instead of every candidate.
+
+    Args:
+        distances: 1-D array of distances (without NaN)
+        k: Number of positions to return (None for all of them)
+
+    Returns:
+        np.ndarray: Positions into `distances`, ordered by distance
+    """
+    if k is not None and k < len(distances):
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        candidates = np.argpartition(distances, k - 1)[:k]
+        candidates.sort()  # Position order, so the stable sort below breaks ties like a full sort would
+        return candidates[np.argsort(distances[candidates], kind='stable')]
+    return np.argsort(distances, kind='stable')
+
+
+def ring_index(distances, ring_radii_km):
+    """
+    Ring of each distance, given ascending outer radii: ring i holds (radii[i - 1], radii[i]].
+
+    Distances beyond the last radius, and NaN, get `len(ring_radii_km)`.
+
+    Examples:
+        >>> ring_index(np.array([0.0, 0.25, 0.3, 2.5, np.nan]), [0.25, 0.5, 1.0, 2.0]).tolist()
+        [0, 0, 1, 4, 4]
+    """
+    return np.searchsorted(np.asarray(ring_radii_km, dtype=np.float64), distances, side='left')
+
+
+def within_radius(distances, max_distance_km):
+    """
+    Mask of distances that are known and no greater than `max_distance_km`.
+
+    Comparisons with NaN are False, so missing coordinates are excluded without a
+    separate validity check.
+    """
+    with np.errstate(invalid='ignore'):
+        return distances <= max_distance_km
@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+
+from admission import AdmissionRejected
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def job_id_for(key: str) -> str:
+    """
+    Stable job id for a normalized request key, so retried submissions map to the same job.
+
+    Examples:
+        >>> job_id_for("same request") == job_id_for("same request")
+        True
+        >>> len(job_id_for("same request"))
+        32
+    """
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """
+    Background jobs persisted in a MongoDB collection and run by a pool of in-process workers.
+
+    Submitting returns at once; workers pick queued jobs up in order and store their
+    result (or error) on the job document, which expires `ttl_seconds` after its last
+    update through a TTL index. A worker claims a job with an atomic status change and
+    a lease, so with several API processes each job runs once. Jobs left running by a
+    process that died are picked up again once their lease has expired, and jobs left
+    queued by it once they have waited a lease period: by a periodic sweep in every
+    process, or at once when the same request is submitted again.
+
+    Args:
+        run: Coroutine function computing a job's result from its stored `request`
+        workers: Number of jobs run concurrently by this process
+        ttl_seconds: How long finished jobs stay readable
+        lease_seconds: How long a job may run before another worker may take it over
+    """
+
+    def __init__(self, run, workers: int = 4, ttl_seconds: float = 86400, lease_seconds: float = 300):
+        self.run = run
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.collection = None
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self.submitted = 0
+        self.deduplicated = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    async def start(self, collection):
+        """
+        Ensure the indexes, requeue unfinished jobs and start the workers.
+        """
+        self.collection = collection
+        await collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+        await collection.create_index([("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+
+        # Jobs queued before a restart, or abandoned by a worker that stopped mid-run
+        pending = await collection.find(self._claimable(), {"_id": 1}).sort("created_at", 1).to_list(None)
+        for job in pending:
+            self._queue.put_nowait(job["_id"])
+
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self):
+        """
+        Cancel the workers; their running jobs are resumed after the lease by any process.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _claimable(self):
+        return {
+            "$or": [
+                {"status": QUEUED},
+                {"status": RUNNING, "lease_expires_at": {"$lt": _now()}}
+            ]
+        }
+
+    def _stale(self):
+        # Claimable jobs no live worker is known to hold: abandoned mid-run, or queued by a process that stopped
+        now = _now()
+        return [
+            {"status": RUNNING, "lease_expires_at": {"$lt": now}},
+            {"status": QUEUED, "updated_at": {"$lt": now - timedelta(seconds=self.lease_seconds)}}
+        ]
+
+    def _expiry(self, now):
+        return now + timedelta(seconds=self.ttl_seconds)
+
+    async def submit(self, key: str, request: dict):
+        """
+        Queue a job for `request` unless one for the same key exists.
+
+        A failed job is queued again, and so is a stale one (running past its lease, or
+        queued for longer than a lease period); other jobs are returned as they are.
+
+        Args:
+            key: Normalized request key the job id is derived from
+            request: JSON-compatible input handed to `run`
+
+        Returns:
+            dict: The job document
+        """
+        job_id = job_id_for(key)
+        now = _now()
+        self.submitted += 1
+
+        job = {
+            "status": QUEUED,
+            "request": request,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": self._expiry(now)
+        }
+        result = await self.collection.update_one({"_id": job_id}, {"$setOnInsert": job}, upsert=True)
+        if result.upserted_id is not None:
+            self._queue.put_nowait(job_id)
+            return {"_id": job_id, **job}
+
+        # Only one of several concurrent retries of a failed or stale job moves it back to the queue
+        requeued = await self.collection.find_one_and_update(
+            {"_id": job_id, "$or": [{"status": FAILED}, *self._stale()]},
+            {
+                "$set": {"status": QUEUED, "request": request, "updated_at": now, "expires_at": self._expiry(now)},
+                "$unset": {"error": "", "lease_expires_at": ""}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if requeued is not None:
+            self._queue.put_nowait(job_id)
+            return requeued
+
+        self.deduplicated += 1
+        return await self.collection.find_one({"_id": job_id}) or {"_id": job_id, **job}
+
+    async def get(self, job_id: str):
+        """
+        Return the job document, or None if it does not exist or has expired.
+        """
+        return await self.collection.find_one({"_id": job_id})
+
+    async def _claim(self, job_id):
+        now = _now()
+        return await self.collection.find_one_and_update(
+            {"_id": job_id, **self._claimable()},
+            {"$set": {
+                "status": RUNNING,
+                "started_at": now,
+                "updated_at": now,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds)
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _finish(self, job_id, status, **fields):
+        now = _now()
+        await self.collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {"status": status, "updated_at": now, "expires_at": self._expiry(now), **fields},
+                "$unset": {"lease_expires_at": ""}
+            }
+        )
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                # Another process may have claimed it, or it finished before a restart
+                job = await self._claim(job_id)
+                if job is None:
+                    continue
+
+                try:
+                    result = await self.run(job["request"])
+                except AdmissionRejected as e:
+                    # Capacity is shared with the synchronous endpoints; try again later rather than fail,
+                    # without holding this worker while waiting
+                    await self.collection.update_one(
+                        {"_id": job_id},
+                        {"$set": {"status": QUEUED, "updated_at": _now()}, "$unset": {"lease_expires_at": ""}}
+                    )
+                    asyncio.get_running_loop().call_later(e.retry_after, self._queue.put_nowait, job_id)
+                    continue
+                except Exception as e:
+                    print(f"Job {job_id} failed: {e}")
+                    self.failed += 1
+                    await self._finish(job_id, FAILED, error=getattr(e, "detail", None) or str(e))
+                    continue
+
+                try:
+                    await self._finish(job_id, SUCCEEDED, result=result)
+                except Exception as e:
+                    # e.g. a result MongoDB rejects; fail the job rather than leave it running until the lease ends
+                    print(f"Job {job_id} result could not be stored: {e}")
+                    self.failed += 1
+                    await self._finish(job_id, FAILED, error=f"Result could not be stored: {e}")
+                    continue
+                self.succeeded += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Mongo errors: the lease lets another worker retry the job later
+                print(f"Job {job_id} could not be updated: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _sweep(self):
+        """
+        Every lease period, queue the stale jobs of any process so they are not stuck until a restart.
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                stale = await self.collection.find({"$or": self._stale()}, {"_id": 1}).to_list(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stale job sweep failed: {e}")
+                continue
+            # Claiming is atomic, so a job also queued elsewhere still runs once
+            for job in stale:
+                self._queue.put_nowait(job["_id"])
+
+    def stats(self):
+        """
+        Queue depth and job counters of this process, for monitoring.
+        """
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "succeeded": self.succeeded,
+            "failed": self.failed
+        }
@@ -0,0 +1,86 @@
+import json
+
+
+class ArrayItemParser:
+    """
+    Incrementally pick complete items out of one array of a JSON object being streamed.
+
+    Feed the text of a JSON object chunk by chunk, for example as an LLM generates
+    it; every element of the top-level `key` array is returned as soon as its
+    closing brace has arrived. The scan is a single pass over each character, so
+    the whole buffer is never re-parsed.
+
+    Examples:
+        >>> parser = ArrayItemParser("AnalyzedInfrastructure")
+        >>> parser.feed('{"AnalyzedInfrastructure": [{"name": "Par')
+        []
+        >>> parser.feed('k"}, {"name": "Library"}]}')
+        [{'name': 'Park'}, {'name': 'Library'}]
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._buffer = []  # Characters of the item currently being read
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string = []  # Characters of the current string at object depth 1
+        self._last_key = None
+        self._array_depth = None  # Depth of the target array while it is being read
+        self._done = False
+
+    def feed(self, chunk: str):
+        """
+        Consume the next piece of JSON text.
+
+        Args:
+            chunk: Next piece of the streamed JSON text
+
+        Returns:
+            list: Items of the target array completed by this chunk, decoded
+        """
+        items = []
+
+        for char in chunk:
+            in_item = self._array_depth is not None and self._depth > self._array_depth
+            if in_item:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = "".join(self._string)
+                elif self._depth == 1:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string = []
+            elif char in "{[":
+                if self._array_depth is not None and self._depth == self._array_depth:
+                    # A new element of the target array starts here
+                    self._buffer = [char]
+                if char == "[" and self._depth == 1 and self._last_key == self.key and not self._done:
+                    self._array_depth = self._depth + 1
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if self._depth == self._array_depth and in_item:
+                        try:
+                            items.append(json.loads("".join(self._buffer)))
+                        except json.JSONDecodeError:
+                            pass  # Left to the final validation of the full document
+                        self._buffer = []
+                    elif self._depth < self._array_depth:
+                        # The target array is closed; ignore anything after it
+                        self._array_depth = None
+                        self._done = True
+
+        return items
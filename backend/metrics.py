@@ -0,0 +1,244 @@
+import os
+import time
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+# Requests to the API: from ~1 ms (cached listings) to tens of seconds (LLM calls)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Routes that did not match any endpoint share one label, so scanners cannot explode the series count
+UNMATCHED_ROUTE = "unmatched"
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds",
+    "Duration of MongoDB commands as reported by the driver",
+    ["command", "collection"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total",
+    "MongoDB commands that failed",
+    ["command", "collection"],
+)
+MONGO_DOCUMENTS_RETURNED = Counter(
+    "mongo_documents_returned_total",
+    "Documents returned by find, aggregate and getMore batches",
+    ["command", "collection"],
+)
+OPENAI_REQUEST_DURATION = Histogram(
+    "openai_request_duration_seconds",
+    "Duration of OpenAI chat completion calls, until the last token for streamed calls",
+    ["model", "stream"],
+    buckets=LATENCY_BUCKETS,
+)
+OPENAI_FIRST_TOKEN = Histogram(
+    "openai_first_token_seconds",
+    "Time until the first token of streamed OpenAI calls",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total",
+    "Tokens reported in the `usage` of OpenAI responses",
+    ["model", "kind"],
+)
+OPENAI_FAILURES = Counter(
+    "openai_failures_total",
+    "OpenAI calls that raised an error",
+    ["model"],
+)
+AMENITY_QUERY_DURATION = Histogram(
+    "amenity_query_duration_seconds",
+    "Duration of nearby-amenity lookups (in-memory index or $geoNear)",
+    ["source"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request per route template.
+
+    Routes are labelled by their path template (e.g. `/impact_reports/{permit_id}`),
+    so per-permit URLs do not create separate series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                str(status_code),
+            ).observe(time.perf_counter() - start_time)
+
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """
+    pymongo command listener recording durations and returned documents per collection.
+
+    Pass it in `event_listeners` when creating the client.
+    """
+
+    def __init__(self):
+        self._collections = {}  # (connection_id, request_id) -> collection name
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+        cursor = event.reply.get("cursor")
+        if isinstance(cursor, dict):
+            batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+            if batch:
+                MONGO_DOCUMENTS_RETURNED.labels(event.command_name, collection).inc(len(batch))
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+
+def record_openai_usage(model: str, usage):
+    """
+    Count the prompt and completion tokens of an OpenAI response's `usage`.
+    """
+    if usage is None:
+        return
+    OPENAI_TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    OPENAI_TOKENS.labels(model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+class CacheStatsCollector:
+    """
+    Expose the counters of in-process caches (anything with a `stats()` dict) at scrape time.
+
+    Reading the stats only when Prometheus scrapes keeps the cache hot paths untouched.
+    """
+
+    def __init__(self):
+        self._caches = {}
+
+    def register(self, name: str, cache):
+        self._caches[name] = cache
+
+    def collect(self):
+        counters = {
+            key: CounterMetricFamily(f"cache_{key}", f"Cache {key}", labels=["cache"])
+            for key in ("hits", "misses", "coalesced", "evictions")
+        }
+        gauges = {
+            "size": GaugeMetricFamily("cache_entries", "Entries currently cached", labels=["cache"]),
+            "in_flight": GaugeMetricFamily("cache_in_flight", "Computations currently in flight", labels=["cache"]),
+            "hit_ratio": GaugeMetricFamily(
+                "cache_hit_ratio", "Share of lookups answered without a new computation", labels=["cache"]
+            ),
+        }
+
+        for name, cache in self._caches.items():
+            stats = cache.stats()
+            for key, family in {**counters, **gauges}.items():
+                if key in stats:
+                    family.add_metric([name], stats[key])
+
+        yield from counters.values()
+        yield from gauges.values()
+
+
+class AdmissionStatsCollector:
+    """
+    Expose the queue depth and rejections of admission controllers (see admission.py) at scrape time.
+    """
+
+    def __init__(self):
+        self._controllers = {}
+
+    def register(self, name: str, controller):
+        self._controllers[name] = controller
+
+    def collect(self):
+        active = GaugeMetricFamily("admission_active", "Calls currently holding a slot", labels=["backend"])
+        waiting = GaugeMetricFamily("admission_waiting", "Calls currently queued for a slot", labels=["backend"])
+        admitted = CounterMetricFamily("admission_admitted", "Calls that got a slot", labels=["backend"])
+        rejected = CounterMetricFamily(
+            "admission_rejected", "Calls shed because the queue was full or too slow", labels=["backend", "reason"]
+        )
+
+        for name, controller in self._controllers.items():
+            stats = controller.stats()
+            active.add_metric([name], stats["active"])
+            waiting.add_metric([name], stats["waiting"])
+            admitted.add_metric([name], stats["admitted"])
+            rejected.add_metric([name, "queue_full"], stats["rejected_queue_full"])
+            rejected.add_metric([name, "deadline"], stats["rejected_deadline"])
+
+        yield from (active, waiting, admitted, rejected)
+
+
+cache_stats_collector = CacheStatsCollector()
+REGISTRY.register(cache_stats_collector)
+
+admission_stats_collector = AdmissionStatsCollector()
+REGISTRY.register(admission_stats_collector)
+
+
+def render_metrics():
+    """
+    Metrics in the Prometheus text format.
+
+    With PROMETHEUS_MULTIPROC_DIR set (several workers), the request, Mongo and
+    OpenAI metrics of all workers are aggregated; cache and admission metrics are per worker.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(cache_stats_collector)
+        registry.register(admission_stats_collector)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,136 @@
+import asyncio
+import gzip
+import hashlib
+
+from fastapi.responses import Response
+
+from response_cache import ResponseCache
+from serialization import dumps, JSON_MEDIA_TYPE
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+
+
+class CachedPayload:
+    """
+    A JSON body serialized once, with its compressed variants and a strong ETag.
+    """
+
+    __slots__ = ("body", "gzip_body", "brotli_body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        self.brotli_body = brotli.compress(body, quality=BROTLI_QUALITY) if brotli else None
+        # Derived from the bytes, so every worker serving the same data agrees on it
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+    def etag_for(self, encoding: str) -> str:
+        """
+        Strong ETag of one representation; each content-coding gets its own.
+        """
+        return f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+
+
+def preferred_encoding(accept_encoding: str) -> str:
+    """
+    Pick the best content-coding we have pre-compressed for an Accept-Encoding header.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    if brotli and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return "identity"
+
+
+class PayloadCache:
+    """
+    Pre-serialized, pre-compressed payloads of read-mostly responses.
+
+    Entries are keyed by name and data version, so a new data version (see
+    data_version.py) naturally misses; concurrent requests for a payload that is
+    still being built wait for the same build.
+    """
+
+    def __init__(self, max_age_seconds: int = 300, max_entries: int = 8):
+        self.max_age_seconds = max_age_seconds
+        self._cache = ResponseCache(max_entries=max_entries, ttl_seconds=float("inf"))
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def stats(self):
+        stats = self._cache.stats()
+        # Entries never expire on their own; they are dropped when the data version changes
+        del stats["ttl_seconds"]
+        stats["max_age_seconds"] = self.max_age_seconds
+        return stats
+
+    async def get_or_build(self, name: str, version, build) -> CachedPayload:
+        """
+        Return the payload for `name` at `version`, building it at most once.
+
+        Args:
+            name: Payload name, e.g. the route it backs
+            version: Current data version
+            build: Zero-argument coroutine function returning the JSON-serializable content
+        """
+        async def build_payload():
+            content = await build()
+            body = dumps(content)
+            # Compression is CPU-bound; keep it off the event loop
+            return await asyncio.to_thread(CachedPayload, body)
+
+        return await self._cache.get_or_compute((name, version), build_payload)
+
+    def response(self, payload: CachedPayload, headers) -> Response:
+        """
+        Serve a cached payload, honouring If-None-Match and Accept-Encoding.
+
+        Args:
+            payload: CachedPayload to serve
+            headers: Incoming request headers
+        """
+        encoding = preferred_encoding(headers.get("accept-encoding"))
+        response_headers = {
+            "ETag": payload.etag_for(encoding),
+            "Cache-Control": f"public, max-age={self.max_age_seconds}",
+            "Vary": "Accept, Accept-Encoding"
+        }
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            known = {payload.etag_for(coding) for coding in ("identity", "gzip", "br")}
+            if "*" in candidates or candidates & known:
+                return Response(status_code=304, headers=response_headers)
+
+        if encoding == "br":
+            body = payload.brotli_body
+        elif encoding == "gzip":
+            body = payload.gzip_body
+        else:
+            body = payload.body
+
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type=JSON_MEDIA_TYPE, headers=response_headers)
@@ -0,0 +1,233 @@
+import json
+
+from geo import GEO_POINT_FIELD
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts fall back to an estimate
+    tiktoken = None
+
+# Geometry is summarized by `distance_km`; GEO_POINT_FIELD only exists for the 2dsphere index
+PROMPT_DROPPED_FIELDS = {"geom", GEO_POINT_FIELD, "googlemapdest"}
+
+# Permit fields encoded as their own sections rather than as permit JSON
+SECTION_FIELDS = {"buildings_nearby", "amenity_rings"}
+
+# Fields naming an amenity in the source datasets, in the order they are tried
+AMENITY_NAME_FIELDS = ("name", "school_name", "title_of_work", "cultural_space_name", "park_name", "station")
+
+# 0.01 km (10 m) is finer than any impact the model reasons about
+PROMPT_DISTANCE_DECIMALS = 2
+
+# Separates the columns of the amenity tables
+COLUMN_SEPARATOR = "|"
+
+# Rough characters per token for English/JSON, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _compact_value(value):
+    """
+    Strip carriage returns, which the source data uses inside free-text fields.
+    """
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n").strip()
+    return value
+
+
+def _cell(value):
+    """
+    Render one table cell on a single line without the column separator.
+    """
+    if isinstance(value, float):
+        value = round(value, 6)
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, default=str, separators=(",", ":"))
+    return " ".join(str(value).split()).replace(COLUMN_SEPARATOR, "/")
+
+
+def compact_permit_fields(permit_data: dict):
+    """
+    The permit fields worth sending to the model: no geometry, no empty values.
+
+    Args:
+        permit_data: Permit document, with or without `buildings_nearby` and `amenity_rings`
+
+    Returns:
+        dict: A copy without SECTION_FIELDS, dropped fields and empty values
+    """
+    return {
+        key: _compact_value(value)
+        for key, value in permit_data.items()
+        if key not in SECTION_FIELDS and key not in PROMPT_DROPPED_FIELDS and not _is_empty(value)
+    }
+
+
+def encode_amenity_table(amenity_type: str, amenities: list):
+    """
+    Lay out one amenity type as a header row plus one row per amenity.
+
+    Columns are the union of the non-empty fields of the amenities, with `_id`
+    first and `distance_km` (rounded) last; missing values are left blank.
+
+    Args:
+        amenity_type: Collection name, e.g. 'schools'
+        amenities: Amenity documents, typically with a `distance_km` field
+
+    Returns:
+        str: The table, headed by `## <type>`
+    """
+    columns = []
+    for amenity in amenities:
+        for key, value in amenity.items():
+            if key in PROMPT_DROPPED_FIELDS or _is_empty(value) or key in columns:
+                continue
+            columns.append(key)
+
+    columns.sort(key=lambda column: (column != "_id", column == "distance_km"))
+
+    rows = [COLUMN_SEPARATOR.join(columns)]
+    for amenity in amenities:
+        cells = []
+        for column in columns:
+            value = amenity.get(column)
+            if column == "distance_km" and isinstance(value, (int, float)):
+                value = round(value, PROMPT_DISTANCE_DECIMALS)
+            cells.append("" if _is_empty(value) else _cell(value))
+        rows.append(COLUMN_SEPARATOR.join(cells))
+
+    return f"## {amenity_type}\n" + "\n".join(rows)
+
+
+def _amenity_label(amenity: dict):
+    for field in AMENITY_NAME_FIELDS:
+        if not _is_empty(amenity.get(field)):
+            return amenity[field]
+    return amenity.get("amenity_type", "")
+
+
+def encode_amenity_rings(rings: list):
+    """
+    Lay out ring statistics as one row per ring: its counts by type and its nearest amenities.
+
+    Only types counted in some ring get a column; nearest amenities are listed by name.
+
+    Args:
+        rings: Ring dicts as built by `amenity_index.ring_statistics`
+
+    Returns:
+        str: The table, headed by `## amenity_rings`
+
+    Examples:
+        >>> print(encode_amenity_rings([
+        ...     {"max_distance_km": 0.25, "total_count": 1, "count_by_type": {"parks": 0, "schools": 1},
+        ...      "nearest": [{"school_name": "Lord Byng", "amenity_type": "schools", "distance_km": 0.123}]},
+        ...     {"max_distance_km": 0.5, "total_count": 0, "count_by_type": {"parks": 0, "schools": 0}, "nearest": []},
+        ... ]))
+        ## amenity_rings
+        max_distance_km|total_count|schools|nearest
+        0.25|1|1|Lord Byng (schools, 0.12)
+        0.5|0|0|
+    """
+    types = []
+    for ring in rings:
+        for amenity_type, count in ring["count_by_type"].items():
+            if count and amenity_type not in types:
+                types.append(amenity_type)
+
+    rows = [COLUMN_SEPARATOR.join(["max_distance_km", "total_count", *types, "nearest"])]
+    for ring in rings:
+        nearest = "; ".join(
+            f"{_amenity_label(amenity)} ({amenity.get('amenity_type')}, "
+            f"{round(amenity['distance_km'], PROMPT_DISTANCE_DECIMALS)})"
+            for amenity in ring["nearest"]
+        )
+        cells = [ring["max_distance_km"], ring["total_count"], *(ring["count_by_type"].get(t, 0) for t in types)]
+        rows.append(COLUMN_SEPARATOR.join([*(_cell(cell) for cell in cells), _cell(nearest)]))
+
+    return "## amenity_rings\n" + "\n".join(rows)
+
+
+def encode_permit_for_prompt(permit_data: dict):
+    """
+    Encode a permit and its nearby amenities compactly for the LLM.
+
+    The permit itself stays JSON (without geometry or empty fields); `buildings_nearby`
+    becomes one `|`-separated table per amenity type, so field names are sent once
+    per type instead of once per amenity, and `amenity_rings` one row per ring.
+
+    Args:
+        permit_data: Permit document with `buildings_nearby` grouped by amenity type
+
+    Returns:
+        str: Prompt payload
+
+    Examples:
+        >>> print(encode_permit_for_prompt({
+        ...     "_id": "p1", "address": "1 Main St", "geom": {"type": "Feature"},
+        ...     "buildings_nearby": {"schools": [
+        ...         {"_id": "s1", "school_name": "Lord Byng", "geom": {}, "distance_km": 0.4567}
+        ...     ]}
+        ... }))
+        {"_id":"p1","address":"1 Main St"}
+        buildings_nearby (one table per type, distance_km rounded):
+        ## schools
+        _id|school_name|distance_km
+        s1|Lord Byng|0.46
+    """
+    sections = [json.dumps(compact_permit_fields(permit_data), default=str, separators=(",", ":"), ensure_ascii=False)]
+
+    buildings_nearby = permit_data.get("buildings_nearby") or {}
+    tables = [
+        encode_amenity_table(amenity_type, amenities)
+        for amenity_type, amenities in buildings_nearby.items()
+        if amenities
+    ]
+    if tables:
+        sections.append(
+            "buildings_nearby (one table per type, distance_km rounded):\n" + "\n".join(tables)
+        )
+
+    if permit_data.get("amenity_rings"):
+        sections.append(encode_amenity_rings(permit_data["amenity_rings"]))
+
+    return "\n".join(sections)
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini"):
+    """
+    Number of tokens `text` takes for `model`.
+
+    Exact when tiktoken is installed, otherwise estimated from the text length.
+
+    Returns:
+        tuple: (token count, whether the count is exact)
+    """
+    if model not in _encodings:
+        _encodings[model] = _load_encoding(model)
+
+    encoding = _encodings[model]
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN), False
+
+    return len(encoding.encode(text)), True
+
+
+def _load_encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its encodings on first use, which fails offline
+        print(f"Token counting falls back to an estimate: {e}")
+        return None
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    LRU cache with per-entry TTL for the results of expensive coroutines.
+
+    Concurrent requests for a key that is still being computed wait for that
+    computation instead of starting their own, so a burst of identical requests
+    costs a single call. Failed computations are not cached, and neither are those
+    that were running when the cache was cleared.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}  # key -> asyncio.Task
+        # Bumped by `clear`, so computations started before it do not store their results
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return the cached value for `key`, or None if it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """
+        Store `value` under `key`, evicting the least recently used entries when full.
+        """
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Drop every entry; computations still running finish for their callers but are not stored,
+        and later requests start new ones.
+        """
+        self._entries.clear()
+        self._in_flight.clear()
+        self._generation += 1
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return the cached value for `key`, computing it at most once at a time.
+
+        Args:
+            key: Hashable cache key
+            compute: Zero-argument coroutine function producing the value
+
+        Returns:
+            The cached or freshly computed value
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._compute_and_store(key, compute))
+            self._in_flight[key] = task
+
+        # Shield the shared computation so one caller disconnecting does not cancel it for the others
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key, compute):
+        generation = self._generation
+        task = asyncio.current_task()
+        try:
+            value = await compute()
+            if generation == self._generation:
+                self.set(key, value)
+            return value
+        finally:
+            # After a clear, the key may belong to a newer computation
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+
+    def stats(self):
+        """
+        Hit/miss counters and current size, for monitoring.
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0
+        }
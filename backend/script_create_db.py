@@ -6,6 +6,8 @@ from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
 from pymongo import MongoClient
 
+from data_version import bump_data_version
+
 DEVELOPMENT_PERMITS_URL = (
     'https://opendata.vancouver.ca/api/explore/v2.1/catalog/datasets/issued-building-permits/records?select=projectvalue%2C%20address%2C%20propertyuse%2C%20specificusecategory%2C%20geolocalarea%2C%20geom%2C%20permitnumbercreateddate%2C%20issuedate%2C%20permitelapseddays&where=issueyear%20%3D%202025%20AND%20typeofwork%20like%20"New%20Building"%20AND%20projectvalue%20>%20500000&order_by=issuedate%20DESC&limit=100&lang=en'
 )
@@ -285,4 +287,7 @@ if __name__ == "__main__":
     insert_records_to_collection(schools_collection, get_data(SCHOOLS_URL))
     insert_records_to_collection(fire_halls_collection, get_data(FIRE_HALLS_URL))
 
-    insert_records_to_collection(parks_collection, get_data(PARKS_URL))
\ No newline at end of file
+    insert_records_to_collection(parks_collection, get_data(PARKS_URL))
+
+    # Tell running API workers to reload amenities and drop cached payloads
+    bump_data_version(db)
\ No newline at end of file
@@ -0,0 +1,152 @@
+import os
+from dotenv import load_dotenv
+import time
+from pymongo import MongoClient, GEOSPHERE, ASCENDING
+from bson import ObjectId
+
+from amenity_index import AMENITY_TYPES
+from geo import GEO_POINT_FIELD
+from data_version import bump_data_version
+
+load_dotenv()
+
+mongodb_url = os.getenv("MONGODB_URL")
+if not mongodb_url:
+    raise RuntimeError(
+        "MONGODB_URL not found. Set it in a .env file or export it in your environment."
+    )
+
+client = MongoClient(mongodb_url)
+db = client.stormhacks2025
+
+# Every collection whose documents carry a nested `geom.geometry.coordinates` point
+GEO_COLLECTIONS = ("development_permits",) + AMENITY_TYPES
+
+
+# Field name used by earlier versions of this migration, which clobbered the
+# washrooms' own `location` description
+LEGACY_GEO_FIELD = "location"
+
+
+def add_geo_point_field(collection):
+    """
+    Store a canonical GeoJSON point taken from `geom.geometry.coordinates`.
+
+    The City of Vancouver records nest the point inside a GeoJSON Feature, which a
+    2dsphere index cannot use directly. This copies the first two coordinates
+    ([lon, lat]) into a top-level GEO_POINT_FIELD. Safe to run repeatedly.
+
+    Args:
+        collection: pymongo Collection to migrate
+
+    Returns:
+        int: Number of documents updated
+    """
+    result = collection.update_many(
+        {"geom.geometry.coordinates.1": {"$exists": True}},
+        [
+            {
+                "$set": {
+                    GEO_POINT_FIELD: {
+                        "type": "Point",
+                        "coordinates": {"$slice": ["$geom.geometry.coordinates", 2]}
+                    }
+                }
+            }
+        ]
+    )
+    return result.modified_count
+
+
+def create_geo_index(collection):
+    """
+    Create the 2dsphere index used by `$geoNear` / `$nearSphere` queries.
+
+    Args:
+        collection: pymongo Collection to index
+
+    Returns:
+        str: Name of the created (or already existing) index
+    """
+    return collection.create_index([(GEO_POINT_FIELD, GEOSPHERE)])
+
+
+def remove_legacy_geo_field(collection):
+    """
+    Drop the GeoJSON `location` points and index written by earlier versions of this migration.
+
+    Only GeoJSON objects are removed; text `location` values from the source data are kept.
+
+    Args:
+        collection: pymongo Collection to clean up
+
+    Returns:
+        int: Number of documents updated
+    """
+    legacy_index = f"{LEGACY_GEO_FIELD}_2dsphere"
+    if legacy_index in collection.index_information():
+        collection.drop_index(legacy_index)
+
+    result = collection.update_many(
+        {f"{LEGACY_GEO_FIELD}.type": "Point"},
+        {"$unset": {LEGACY_GEO_FIELD: ""}}
+    )
+    return result.modified_count
+
+
+def backfill_has_impact_report():
+    """
+    Flag every development permit that already has an impact report.
+
+    script_impact_report_generate.py keeps the flag up to date for new reports;
+    this covers reports written before the flag existed. Safe to run repeatedly.
+
+    Returns:
+        int: Number of permits updated
+    """
+    permit_ids = [
+        ObjectId(permit_id)
+        for permit_id in db.get_collection("impact_reports").distinct("original_permit_id")
+        if ObjectId.is_valid(permit_id)
+    ]
+    result = db.get_collection("development_permits").update_many(
+        {"_id": {"$in": permit_ids}, "has_impact_report": {"$ne": True}},
+        {"$set": {"has_impact_report": True}}
+    )
+    return result.modified_count
+
+
+def migrate_impact_reports():
+    """
+    Index the permit <-> report link and backfill the `has_impact_report` flag.
+    """
+    db.get_collection("impact_reports").create_index([("original_permit_id", ASCENDING)])
+    db.get_collection("development_permits").create_index([("has_impact_report", ASCENDING)])
+    updated = backfill_has_impact_report()
+    print(f"development_permits: {updated} permits flagged with has_impact_report")
+
+
+def migrate_geo_collections():
+    """
+    Add GeoJSON point fields and 2dsphere indexes to permits and all nine amenity collections.
+    """
+    for collection_name in GEO_COLLECTIONS:
+        collection = db.get_collection(collection_name)
+        removed = remove_legacy_geo_field(collection)
+        if removed:
+            print(f"{collection_name}: removed legacy '{LEGACY_GEO_FIELD}' points from {removed} documents")
+        updated = add_geo_point_field(collection)
+        index_name = create_geo_index(collection)
+        print(f"{collection_name}: {updated} documents updated, index '{index_name}' ready")
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+
+    migrate_geo_collections()
+    migrate_impact_reports()
+
+    # Tell running API workers to reload amenities and drop cached payloads
+    bump_data_version(db)
+
+    print("execution_time_seconds:", round(time.time() - start_time, 2))
@@ -7,6 +7,19 @@ from urllib.error import URLError, HTTPError
 from pymongo import MongoClient
 import math
 import time
+import numpy as np
+
+from amenity_index import AMENITY_RING_RADII_KM, ring_statistics
+from geo import (
+    GEO_POINT_FIELD,
+    haversine_distance,
+    extract_coordinates_from_geom,
+    coordinates_to_arrays,
+    haversine_distances,
+    haversine_distance_matrix,
+    within_radius,
+    nearest,
+)
 
 load_dotenv()
 
@@ -31,61 +44,6 @@ schools_collection = db.get_collection("schools")
 fire_halls_collection = db.get_collection("fire_halls")
 
 
-def extract_coordinates_from_geom(geom_field):
-    """
-    Extract longitude and latitude from a geom field.
-    
-    Args:
-        geom_field: Can be a dict with geometry.coordinates or a simple dict with lon/lat
-        
-    Returns:
-        tuple: (longitude, latitude) or (None, None) if extraction fails
-    """
-    if not geom_field or not isinstance(geom_field, dict):
-        return None, None
-    
-    # Handle GeoJSON format: geom.geometry.coordinates
-    if 'geometry' in geom_field and isinstance(geom_field['geometry'], dict):
-        coords = geom_field['geometry'].get('coordinates')
-        if coords and isinstance(coords, list) and len(coords) >= 2:
-            return coords[0], coords[1]  # [lon, lat]
-    
-    # Handle simple coordinate format: {lon: x, lat: y}
-    if 'lon' in geom_field and 'lat' in geom_field:
-        return geom_field['lon'], geom_field['lat']
-    
-    return None, None
-
-
-def haversine_distance(lon1, lat1, lon2, lat2):
-    """
-    Calculate the great circle distance between two points on Earth using the Haversine formula.
-    
-    Args:
-        lon1, lat1: Coordinates of first point in decimal degrees
-        lon2, lat2: Coordinates of second point in decimal degrees
-        
-    Returns:
-        float: Distance in kilometers
-    """
-    if None in [lon1, lat1, lon2, lat2]:
-        return None
-    
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    # Radius of Earth in kilometers
-    r = 6371
-    
-    return c * r
-
-
 def euclidean_distance(lon1, lat1, lon2, lat2):
     """
     Calculate simple Euclidean distance between two points.
@@ -168,6 +126,56 @@ def calculate_distance_between_geojson_points(dict1, dict2):
     return haversine_distance(lon1, lat1, lon2, lat2)
 
 
+# Ring entries name the nearest amenities by distance; their geometry and ids stay out of the enriched permit
+RING_DROPPED_FIELDS = {"_id", "geom", GEO_POINT_FIELD}
+
+# Permit x amenity distances per block (2 MB of float64), i.e. ~145 permits against ~1,800 amenities
+DISTANCE_MATRIX_ELEMENTS = 1 << 18
+
+
+def load_amenities(collection):
+    """
+    Read an amenity collection once and pack its coordinates for the vectorized kernel.
+    
+    Args:
+        collection: MongoDB collection to read
+        
+    Returns:
+        tuple: (list of documents, longitudes array, latitudes array)
+    """
+    # GEO_POINT_FIELD duplicates `geom` for the 2dsphere index; the enriched documents do not need it
+    amenities = list(collection.find({}, {GEO_POINT_FIELD: 0}))
+    lons, lats = coordinates_to_arrays(amenities)
+    return amenities, lons, lats
+
+
+def select_nearby_amenities(amenities, distances, max_distance_km, limit):
+    """
+    Pick the closest amenities within range given their precomputed distances.
+    
+    Args:
+        amenities: List of amenity documents
+        distances: Distances in km aligned with `amenities` (NaN for missing coordinates)
+        max_distance_km: Maximum distance in kilometers
+        limit: Maximum number of results to return
+        
+    Returns:
+        list: Copies of the nearby records with calculated distances, nearest first
+    """
+    # distance > 0 skips the record itself when a collection is searched against its own members
+    matches = np.flatnonzero(within_radius(distances, max_distance_km) & (distances > 0))
+    # Partial selection of the `limit` closest instead of sorting every match
+    closest = matches[nearest(distances[matches], limit)]
+    
+    nearby_amenities = []
+    for index in closest.tolist():
+        record_with_distance = amenities[index].copy()
+        record_with_distance['distance_km'] = round(float(distances[index]), 3)
+        nearby_amenities.append(record_with_distance)
+    
+    return nearby_amenities
+
+
 def find_nearby_amenities(target_record, collection, max_distance_km=1.0, limit=10):
     """
     Find amenities within a certain distance of a target location.
@@ -186,79 +194,99 @@ def find_nearby_amenities(target_record, collection, max_distance_km=1.0, limit=
     if target_lon is None or target_lat is None:
         return []
     
-    nearby_amenities = []
+    amenities, lons, lats = load_amenities(collection)
+    distances = haversine_distances(target_lon, target_lat, lons, lats)
     
-    # Fetch all records from the collection
-    for record in collection.find():
-        distance = calculate_distance_between_records(target_record, record, 'haversine')
-        
-        if distance is not None and distance <= max_distance_km and distance > 0:
-            record_with_distance = record.copy()
-            record_with_distance['distance_km'] = round(distance, 3)
-            nearby_amenities.append(record_with_distance)
-    
-    # Sort by distance and limit results
-    nearby_amenities.sort(key=lambda x: x['distance_km'])
-    return nearby_amenities[:limit]
+    return select_nearby_amenities(amenities, distances, max_distance_km, limit)
 
 
-def analyze_development_permits_with_nearby_amenities(max_distance_km=2.0, limit_per_type=10):
+def analyze_development_permits_with_nearby_amenities(
+    max_distance_km=2.0,
+    limit_per_type=10,
+    ring_radii_km=None,
+    limit_per_ring=5
+):
     """
     For each development permit, find all nearby amenities and return permits with nearby buildings.
     
+    Each amenity collection is read once and the distances from every permit to every
+    amenity are computed in one vectorized pass per block of permits. With
+    `ring_radii_km`, the same distances are also bucketed into rings, so ring
+    statistics need no extra scan per radius.
+    
     Args:
         max_distance_km: Maximum distance to search for amenities (default 2km)
         limit_per_type: Maximum number of each amenity type to include
+        ring_radii_km: Ascending outer radii of the `amenity_rings` to add, e.g. AMENITY_RING_RADII_KM (optional)
+        limit_per_ring: Nearest amenities listed per ring, across types
         
     Returns:
-        list: List of development permits with nearby amenities added
+        list: List of development permits with nearby amenities (and their `amenity_rings`) added
     """
-    enhanced_permits = []
+    amenity_collections = {
+        'parks': parks_collection,
+        'public_art': public_art_collection,
+        'community_centers': community_centers_collection,
+        'libraries': libraries_collection,
+        'cultural_spaces': cultural_spaces_collection,
+        'public_washrooms': public_washrooms_collection,
+        'rapid_transit_stations': rapid_transit_stations_collection,
+        'schools': schools_collection,
+        'fire_halls': fire_halls_collection
+    }
     
     # Get all development permits
     permits = list(development_permits_collection.find())
+    permit_lons, permit_lats = coordinates_to_arrays(permits)
     
-    for i, permit in enumerate(permits):
+    enhanced_permits = []
+    for permit in permits:
         # Create enhanced permit with original data
         enhanced_permit = permit.copy()
-        
-        # Initialize buildings_nearby structure
-        enhanced_permit['buildings_nearby'] = {
-            'parks': [],
-            'public_art': [],
-            'community_centers': [],
-            'libraries': [],
-            'cultural_spaces': [],
-            'public_washrooms': [],
-            'rapid_transit_stations': [],
-            'schools': [],
-            'fire_halls': []
-        }
-        
-        # Find nearby amenities for each type
-        amenity_collections = {
-            'parks': parks_collection,
-            'public_art': public_art_collection,
-            'community_centers': community_centers_collection,
-            'libraries': libraries_collection,
-            'cultural_spaces': cultural_spaces_collection,
-            'public_washrooms': public_washrooms_collection,
-            'rapid_transit_stations': rapid_transit_stations_collection,
-            'schools': schools_collection,
-            'fire_halls': fire_halls_collection
-        }
-        
-        for amenity_type, collection in amenity_collections.items():
-            nearby = find_nearby_amenities(
-                permit, 
-                collection, 
-                max_distance_km=max_distance_km, 
-                limit=limit_per_type
-            )
-            enhanced_permit['buildings_nearby'][amenity_type] = nearby
-        
+        enhanced_permit['buildings_nearby'] = {amenity_type: [] for amenity_type in amenity_collections}
         enhanced_permits.append(enhanced_permit)
     
+    # Read every collection once; each type is a contiguous column range of the distance matrix
+    amenity_types = list(amenity_collections)
+    amenities, lons, lats, type_codes, type_ranges = [], [], [], [], {}
+    for type_code, (amenity_type, collection) in enumerate(amenity_collections.items()):
+        type_amenities, type_lons, type_lats = load_amenities(collection)
+        type_ranges[amenity_type] = (len(amenities), len(amenities) + len(type_amenities))
+        amenities.extend(type_amenities)
+        lons.append(type_lons)
+        lats.append(type_lats)
+        type_codes.append(np.full(len(type_amenities), type_code))
+    lons, lats, type_codes = (np.concatenate(arrays) for arrays in (lons, lats, type_codes))
+    
+    permit_chunk_size = max(1, DISTANCE_MATRIX_ELEMENTS // max(len(amenities), 1))
+    for start in range(0, len(permits), permit_chunk_size):
+        end = start + permit_chunk_size
+        distances = haversine_distance_matrix(permit_lons[start:end], permit_lats[start:end], lons, lats)
+        
+        for row, enhanced_permit in enumerate(enhanced_permits[start:end]):
+            for amenity_type, (first, last) in type_ranges.items():
+                enhanced_permit['buildings_nearby'][amenity_type] = select_nearby_amenities(
+                    amenities[first:last],
+                    distances[row, first:last],
+                    max_distance_km=max_distance_km,
+                    limit=limit_per_type
+                )
+            
+            if ring_radii_km:
+                # Same rule as select_nearby_amenities: in range, and not the permit's own location
+                hits = np.flatnonzero(within_radius(distances[row], ring_radii_km[-1]) & (distances[row] > 0))
+                enhanced_permit['amenity_rings'] = ring_statistics(
+                    amenity_types,
+                    type_codes[hits],
+                    distances[row, hits],
+                    ring_radii_km,
+                    limit_per_ring,
+                    lambda positions: [
+                        {key: value for key, value in amenities[hits[position]].items() if key not in RING_DROPPED_FIELDS}
+                        for position in positions
+                    ]
+                )
+    
     return enhanced_permits
 
 
@@ -291,7 +319,8 @@ if __name__ == "__main__":
     # Analyze permits with nearby amenities (within 2km radius)
     enhanced_permits = analyze_development_permits_with_nearby_amenities(
         max_distance_km=0.5,  # Search within 2km
-        limit_per_type=20      # Max 20 of each amenity type
+        limit_per_type=20,      # Max 20 of each amenity type
+        ring_radii_km=AMENITY_RING_RADII_KM  # Counts within 250 m, 500 m, 1 km and 2 km
     )
     
     # Save to new collection
@@ -11,6 +11,9 @@ import asyncio
 import aiohttp
 from openai import AsyncOpenAI
 
+from data_version import bump_data_version
+from prompt_encoding import encode_permit_for_prompt, count_tokens
+
 load_dotenv()
 
 PROMPT = """You are an expert urban planning data analyst. Your function is to process a building permit JSON and analyze its impact on EACH nearby infrastructure item by applying a multi-factor, reason-based analytical framework. Your core task is to move beyond simple formulas and apply nuanced, context-aware reasoning. For each item, you must consider both the potential positive and negative impacts, justifying why one may outweigh the other. The justification is the most important field; the impactScore must be a logical conclusion of the justification. Your entire output MUST be a single, valid JSON object. Do not include any text, explanations, or markdown outside of the JSON. OUTPUT JSON FORMAT: JSON { "AnalysisSummary": { "_id": "The original _id of the main building permit.", "title": "A concise summary of the development project.", "description": "A factual, 1-2 sentence description summarizing the 'projectdescription' field.", "overallImportance": "An integer from 1-10, calculated using the rubric below." }, "AnalyzedInfrastructure": [ { "_id": "The original _id of the infrastructure item, for linking.", "name": "The name of the infrastructure item.", "type": "The category of the infrastructure (e.g., 'parks', 'schools').", "impactScore": "An integer from -10 to 10, derived from your reasoned justification. -10 being terrible, 0 neutral, 10 very positive", "quantitativeImpact": "A string representing a plausible numerical impact (e.g., '~5% increase in enrollment' or 'Minor access disruption').", "justification": "A 1-2 sentence explanation of the reasoning that produced the impact score, weighing both positive and negative factors based on the principles below." } ] }"""
@@ -31,11 +34,14 @@ if not mongodb_url:
 
 OpenAIClient = AsyncOpenAI()
 
+IMPACT_ANALYSIS_MODEL = "gpt-4o-mini"
+
 client = MongoClient(mongodb_url)
 db = client.stormhacks2025
 
 enhanced_development_permits_collection = db.get_collection("enhanced_development_permits")
 impact_reports_collection = db.get_collection("impact_reports")
+development_permits_collection = db.get_collection("development_permits")
 
 
 async def generate_impact_analysis(permit_data):
@@ -49,12 +55,14 @@ async def generate_impact_analysis(permit_data):
         dict: Parsed JSON impact analysis or None if failed
     """
     try:
-        # Convert permit data to JSON string
-        permit_json = json.dumps(permit_data, default=str)
+        # Compact encoding: no geometry or empty fields, one table per amenity type
+        permit_payload = encode_permit_for_prompt(permit_data)
+        prompt_tokens, exact = count_tokens(permit_payload, IMPACT_ANALYSIS_MODEL)
+        print(f"Prompt payload for permit {permit_data.get('_id', 'unknown')}: {prompt_tokens} tokens{'' if exact else ' (estimated)'}")
         
         # Use the async chat completions API
         response = await OpenAIClient.chat.completions.create(
-            model="gpt-4o-mini",
+            model=IMPACT_ANALYSIS_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -62,7 +70,7 @@ async def generate_impact_analysis(permit_data):
                 },
                 {
                     "role": "user", 
-                    "content": f"Here is the development permit JSON to analyze:\n{permit_json}"
+                    "content": f"Here is the development permit to analyze:\n{permit_payload}"
                 }
             ],
             temperature=0.8,
@@ -164,6 +172,12 @@ async def process_all_permits():
                     # Save to impact_reports collection
                     impact_reports_collection.insert_one(analysis.copy())
                     
+                    # Flag the original permit so the API can filter on an index instead of joining
+                    development_permits_collection.update_one(
+                        {"_id": permit.get("_id")},
+                        {"$set": {"has_impact_report": True}}
+                    )
+                    
                     # Add to list for JSON file (create a copy to avoid MongoDB ObjectId issues)
                     json_analysis = analysis.copy()
                     all_analyses.append(json_analysis)
@@ -186,6 +200,10 @@ async def process_all_permits():
         if batch_num < total_batches - 1:  # Don't sleep after the last batch
             await asyncio.sleep(1)
     
+    # Tell running API workers that permits gained impact reports
+    if successful_count:
+        bump_data_version(db)
+    
     # Save all analyses to JSON file
     try:
         print(f"\nSaving {len(all_analyses)} analyses to JSON file: {json_filename}")
@@ -0,0 +1,162 @@
+import contextvars
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import orjson
+from bson import ObjectId, Decimal128
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional; without it every client gets JSON
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Media types clients use to ask for MessagePack
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+# datetime, UUID and numpy values are encoded natively by orjson
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Media type negotiated for the current request (see NegotiationMiddleware)
+_response_media_type = contextvars.ContextVar("response_media_type", default=JSON_MEDIA_TYPE)
+
+
+def _default(obj):
+    """
+    Encode the BSON and pydantic values orjson does not know about.
+    """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _msgpack_default(obj):
+    """
+    Encode values MessagePack has no native type for, matching their JSON form.
+    """
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return _default(obj)
+
+
+def dumps(content) -> bytes:
+    """
+    Serialize content to compact JSON bytes.
+
+    MongoDB documents can be passed as read: ObjectId becomes its hex string and
+    datetimes become ISO 8601 strings, without walking the document in Python first.
+
+    Args:
+        content: JSON-like value (dicts, lists, scalars, BSON types)
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def dumps_msgpack(content) -> bytes:
+    """
+    Serialize content to MessagePack, with the same value mapping as `dumps`.
+    """
+    return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def negotiate_media_type(accept: str) -> str:
+    """
+    Pick the response media type for an Accept header.
+
+    MessagePack is only chosen when the client lists it (with a non-zero quality)
+    and the msgpack package is installed; everything else gets JSON.
+    """
+    if msgpack is None or not accept:
+        return JSON_MEDIA_TYPE
+
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip().lower() not in MSGPACK_MEDIA_TYPES:
+            continue
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        return MSGPACK_MEDIA_TYPE
+
+    return JSON_MEDIA_TYPE
+
+
+def wants_msgpack() -> bool:
+    """
+    Whether the current request negotiated a MessagePack response.
+    """
+    return _response_media_type.get() == MSGPACK_MEDIA_TYPE
+
+
+class NegotiationMiddleware:
+    """
+    Pure ASGI middleware recording the negotiated response media type for the request.
+
+    Kept out of BaseHTTPMiddleware so streaming responses are not buffered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1")
+                break
+
+        token = _response_media_type.set(negotiate_media_type(accept))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _response_media_type.reset(token)
+
+
+class NegotiatedResponse(Response):
+    """
+    Default response class: orjson-encoded JSON, or MessagePack if the client asked for it.
+
+    Endpoints that return this directly (rather than a dict) also skip FastAPI's
+    `jsonable_encoder` pass over the content.
+    """
+
+    media_type = JSON_MEDIA_TYPE
+
+    def __init__(self, content=None, status_code: int = 200, headers=None, media_type=None, background=None):
+        super().__init__(content, status_code, headers, media_type, background)
+        if msgpack is not None:
+            # The body depends on the Accept header, so shared caches must key on it
+            self.headers.add_vary_header("Accept")
+
+    def render(self, content) -> bytes:
+        if wants_msgpack():
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return dumps_msgpack(content)
+        return dumps(content)
@@ -0,0 +1,168 @@
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from amenity_index import AmenityIndex
+from geo import PointArray
+
+# Name of the file holding the directory name of the newest snapshot; replaced atomically
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+METADATA_FILE = "snapshot.json"
+
+# Snapshots kept besides the current one, for workers still attached to an older version
+KEEP_PREVIOUS_SNAPSHOTS = 1
+
+SNAPSHOT_FORMAT = 2
+
+# ObjectId hex strings
+PERMIT_ID_DTYPE = "S24"
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of one snapshot directory.
+
+    Attributes:
+        data_version: Data version the snapshot was built from
+        amenity_index: AmenityIndex over memory-mapped arrays
+        permit_ids: ObjectId strings of the listed permits, as a bytes array
+        permit_points: PointArray of the permits, aligned with `permit_ids`
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, METADATA_FILE), encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        self.path = path
+        self.data_version = metadata["data_version"]
+        self.created_at = metadata["created_at"]
+        self.amenity_index = AmenityIndex.load(path)
+        self.permit_ids = np.load(os.path.join(path, "permit_ids.npy"), mmap_mode="r")
+        self.permit_points = PointArray.from_arrays({
+            name: np.load(os.path.join(path, f"permit_{name}.npy"), mmap_mode="r")
+            for name in ("lons", "lats", "lon_rad", "lat_rad", "cos_lat")
+        })
+
+    def __len__(self):
+        return len(self.amenity_index) + len(self.permit_ids)
+
+
+def snapshot_name(data_version: float) -> str:
+    return f"v{data_version:.6f}".replace(".", "_")
+
+
+def read_current(root: str):
+    """
+    Return the data version of the current snapshot in `root`, or None if there is none.
+
+    A snapshot written in another SNAPSHOT_FORMAT counts as none, so it is rebuilt
+    instead of being misread.
+    """
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+        with open(os.path.join(root, name, METADATA_FILE), encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("format") != SNAPSHOT_FORMAT:
+            return None
+        return metadata["data_version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def open_current(root: str) -> Snapshot:
+    with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+        return Snapshot(os.path.join(root, f.read().strip()))
+
+
+def write_snapshot(root: str, data_version: float, amenity_index: AmenityIndex, permit_ids, permit_points):
+    """
+    Write a snapshot and make it current.
+
+    Files are written to a temporary directory that is renamed into place, then
+    CURRENT is replaced with `os.replace`, so readers only ever see complete
+    snapshots. Older snapshots beyond KEEP_PREVIOUS_SNAPSHOTS are removed; workers
+    still mapping them keep their pages until they switch.
+
+    Args:
+        root: Snapshot directory shared by the workers
+        data_version: Data version the contents were read at
+        amenity_index: Built AmenityIndex
+        permit_ids: Permit ObjectId strings
+        permit_points: PointArray aligned with `permit_ids`
+
+    Returns:
+        str: Path of the new snapshot
+    """
+    name = snapshot_name(data_version)
+    path = os.path.join(root, name)
+    staging = os.path.join(root, f".{name}.{os.getpid()}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    amenity_index.save(staging)
+    np.save(os.path.join(staging, "permit_ids.npy"), np.array(permit_ids, dtype=PERMIT_ID_DTYPE))
+    for array_name, array in permit_points.arrays().items():
+        np.save(os.path.join(staging, f"permit_{array_name}.npy"), array)
+    with open(os.path.join(staging, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump({"format": SNAPSHOT_FORMAT, "data_version": data_version, "created_at": time.time()}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(staging, path)
+
+    current_staging = os.path.join(root, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(current_staging, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_staging, os.path.join(root, CURRENT_FILE))
+
+    snapshots = sorted(
+        (entry for entry in os.listdir(root) if entry.startswith("v") and entry != name),
+        key=lambda entry: os.path.getmtime(os.path.join(root, entry))
+    )
+    for entry in snapshots[:max(0, len(snapshots) - KEEP_PREVIOUS_SNAPSHOTS)]:
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+    return path
+
+
+async def attach_snapshot(root: str, data_version: float, build) -> Snapshot:
+    """
+    Attach to the current snapshot, building it first if it is older than `data_version`.
+
+    Several workers may call this at once: a file lock lets the first one build the
+    snapshot while the others wait and then attach to it, so the data is read from
+    MongoDB once per version rather than once per worker.
+
+    Args:
+        root: Snapshot directory shared by the workers
+        data_version: Data version the caller has seen
+        build: Coroutine function returning (amenity_index, permit_ids, permit_points)
+
+    Returns:
+        Snapshot: The current snapshot, at `data_version` or newer
+    """
+    current = read_current(root)
+    if current is not None and current >= data_version:
+        return open_current(root)
+
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), "w") as lock:
+        # Waiting for the lock blocks, so it happens off the event loop
+        await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+        try:
+            current = read_current(root)
+            if current is None or current < data_version:
+                amenity_index, permit_ids, permit_points = await build()
+                await asyncio.to_thread(write_snapshot, root, data_version, amenity_index, permit_ids, permit_points)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return open_current(root)